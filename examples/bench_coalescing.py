@@ -0,0 +1,267 @@
+"""
+通道写入合并(coalescing)基准
+
+在子进程中启动替身 SSH 服务器和目标服务，主进程中的 LocalForwarder 经由替身服务器转发，
+分别在关闭和开启写入合并时测量:
+    stream    客户端以小批次(每批 --burst 条，批间隔 --gap 秒)写入大量小消息(类似 RPC 流水线/日志推送)，
+              目标收齐后统计主进程 CPU 时间
+    pingpong  客户端逐条发送小消息并等待回显(请求-应答)，统计往返延迟，验证单次写入不会被延迟
+主进程 CPU 时间包含转发器两侧和客户端线程，客户端部分在两种模式下相同。
+
+用法:
+    python examples/bench_coalescing.py --messages 100000 --message-size 64 --burst 1 --gap 0.00005
+"""
+import argparse
+import logging
+import multiprocessing
+import resource
+import select
+import socket
+import statistics
+import threading
+import time
+
+import paramiko
+
+from sshforwarder.config import SSHConfig, ForwardConfig
+from sshforwarder.fowarder import LocalForwarder
+from sshforwarder.manager import TransportManager
+
+
+class StandInServer(paramiko.ServerInterface):
+    """
+    替身 SSH 服务器：接受任意公钥，direct-tcpip 请求直接连接本机目标
+    """
+    def __init__(self):
+        self.targets = {}
+
+    def get_allowed_auths(self, username):
+        return 'publickey'
+
+    def check_auth_publickey(self, username, key):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_direct_tcpip_request(self, chanid, origin, destination):
+        try:
+            self.targets[chanid] = socket.create_connection(destination, timeout=1)
+        except OSError:
+            return paramiko.OPEN_FAILED_CONNECT_FAILED
+        return paramiko.OPEN_SUCCEEDED
+
+
+def relay(a, b):
+    """
+    在通道和套接字之间双向转发，任一端关闭即结束
+    """
+    try:
+        while True:
+            r, _, _ = select.select([a, b], [], [], 5)
+            if not r: continue
+            for src, dst in ((a, b), (b, a)):
+                if src in r:
+                    data = src.recv(65536)
+                    if not data: return
+                    dst.sendall(data)
+    except OSError:
+        pass
+    finally:
+        a.close()
+        b.close()
+
+
+def start_ssh_server(host_key: paramiko.PKey) -> int:
+    """
+    启动替身 SSH 服务器
+
+    Returns:
+        int: 监听端口
+    """
+    listener = socket.create_server(('127.0.0.1', 0))
+
+    def serve_transport(sock):
+        transport = paramiko.Transport(sock)
+        transport.add_server_key(host_key)
+        server = StandInServer()
+        transport.start_server(server=server)
+        while transport.is_active():
+            channel = transport.accept(1)
+            if channel is None: continue
+            target = server.targets.pop(channel.get_id(), None)
+            if target is None:
+                channel.close()
+                continue
+            threading.Thread(target=relay, args=(channel, target), daemon=True).start()
+
+    def serve():
+        while True:
+            sock, _ = listener.accept()
+            threading.Thread(target=serve_transport, args=(sock,), daemon=True).start()
+
+    threading.Thread(target=serve, name='StandInSSH', daemon=True).start()
+    return listener.getsockname()[1]
+
+
+def start_echo_server() -> int:
+    """
+    启动回显服务
+
+    Returns:
+        int: 监听端口
+    """
+    listener = socket.create_server(('127.0.0.1', 0), backlog=1024)
+
+    def echo(conn):
+        try:
+            while data := conn.recv(65536):
+                conn.sendall(data)
+        except OSError:
+            pass
+        finally:
+            conn.close()
+
+    def serve():
+        while True:
+            conn, _ = listener.accept()
+            threading.Thread(target=echo, args=(conn,), daemon=True).start()
+
+    threading.Thread(target=serve, name='Echo', daemon=True).start()
+    return listener.getsockname()[1]
+
+
+def closed_port() -> int:
+    """
+    获取一个当前没有监听的端口
+    """
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_sink_server() -> int:
+    """
+    启动计数服务：读取并丢弃数据，每收齐客户端首行声明的字节数后应答一个字节
+
+    Returns:
+        int: 监听端口
+    """
+    listener = socket.create_server(('127.0.0.1', 0))
+
+    def sink(conn):
+        with conn, conn.makefile('rb') as reader:
+            while header := reader.readline():
+                remaining = int(header)
+                while remaining > 0:
+                    remaining -= len(reader.read1(min(remaining, 65536)))
+                conn.sendall(b'.')
+
+    def serve():
+        while True:
+            conn, _ = listener.accept()
+            threading.Thread(target=sink, args=(conn,), daemon=True).start()
+
+    threading.Thread(target=serve, name='Sink', daemon=True).start()
+    return listener.getsockname()[1]
+
+
+def serve_targets(pipe):
+    """
+    子进程：启动替身 SSH 服务器、回显服务和计数服务，把端口发回主进程后一直运行
+    """
+    logging.basicConfig(level=logging.CRITICAL)
+    pipe.send((start_ssh_server(paramiko.RSAKey.generate(2048)), start_echo_server(), start_sink_server()))
+    threading.Event().wait()
+
+
+def cpu_time() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def bench_stream(port: int, messages: int, size: int, burst: int, gap: float) -> tuple[float, float]:
+    """
+    分批写入小消息直到目标收齐
+
+    Returns:
+        tuple: (耗时(秒), 主进程CPU时间(秒))
+    """
+    payload = b'x' * size
+    with socket.create_connection(('127.0.0.1', port)) as conn:
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        start, cpu = time.perf_counter(), cpu_time()
+        conn.sendall(b'%d\n' % (messages * size))
+        for i in range(messages):
+            conn.sendall(payload)
+            if gap and (i + 1) % burst == 0: time.sleep(gap)
+        conn.recv(1)
+        return time.perf_counter() - start, cpu_time() - cpu
+
+
+def bench_pingpong(port: int, rounds: int, size: int) -> list[float]:
+    """
+    逐条发送并等待回显
+
+    Returns:
+        list: 各次往返延迟(秒)
+    """
+    payload = b'x' * size
+    rtts = []
+    with socket.create_connection(('127.0.0.1', port)) as conn:
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        for _ in range(rounds):
+            start = time.perf_counter()
+            conn.sendall(payload)
+            received = 0
+            while received < size:
+                received += len(conn.recv(65536))
+            rtts.append(time.perf_counter() - start)
+    return rtts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=100000, help='stream 测试的消息数')
+    parser.add_argument('--burst', type=int, default=1, help='stream 测试每批连续写入的消息数')
+    parser.add_argument('--gap', type=float, default=0.00005, help='stream 测试的批间隔(秒)，0表示不间断写入')
+    parser.add_argument('--message-size', type=int, default=64, help='消息字节数')
+    parser.add_argument('--rounds', type=int, default=2000, help='pingpong 测试的往返次数')
+    parser.add_argument('--coalesce-bytes', type=int, default=32768, help='开启合并时的字节上限')
+    parser.add_argument('--coalesce-delay', type=float, default=0.001, help='开启合并时的等待时间(秒)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.CRITICAL)
+    parent, child = multiprocessing.Pipe()
+    multiprocessing.Process(target=serve_targets, args=(child,), daemon=True).start()
+    ssh_port, echo_port, sink_port = parent.recv()
+
+    transport_manager = TransportManager()
+    ssh = SSHConfig('127.0.0.1', 'bench', paramiko.RSAKey.generate(2048), None, ssh_port)
+    forwarders = {}
+    for target, target_port in (('sink', sink_port), ('echo', echo_port)):
+        forwarder = LocalForwarder(ForwardConfig(closed_port(), target_port, ssh, '127.0.0.1', '127.0.0.1'),
+                                   transport_manager=transport_manager)
+        threading.Thread(target=forwarder.forward, daemon=True).start()
+        forwarders[target] = forwarder
+
+    size = args.message_size
+    print(f'stream: {args.messages} x {size} B (burst {args.burst}, gap {args.gap * 1e6:.0f} us), '
+          f'pingpong: {args.rounds} x {size} B')
+    for mode, coalesce_bytes in (('off', 0), ('on', args.coalesce_bytes)):
+        for forwarder in forwarders.values():
+            forwarder.coalesce_bytes, forwarder.coalesce_delay = coalesce_bytes, args.coalesce_delay
+        bench_stream(forwarders['sink'].local_socket.getsockname()[1], 1000, size, args.burst, args.gap)  # 预热
+        elapsed, cpu = bench_stream(forwarders['sink'].local_socket.getsockname()[1], args.messages, size,
+                                    args.burst, args.gap)
+        mib = args.messages * size / 2 ** 20
+        rtts = bench_pingpong(forwarders['echo'].local_socket.getsockname()[1], args.rounds, size)
+        print(f'coalesce {mode:<3}  stream {args.messages / elapsed:9.0f} msg/s  cpu {cpu * 1000 / mib:7.1f} ms/MiB  '
+              f'pingpong p50 {statistics.median(rtts) * 1e6:6.0f} us  p99 {sorted(rtts)[int(len(rtts) * 0.99) - 1] * 1e6:6.0f} us')
+
+    for forwarder in forwarders.values():
+        forwarder.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""
+SSH 传输通道重连耗时基准
+
+在本进程内启动一个同时提供 RSA 和 ed25519 主机密钥的替身 SSH 服务器，分别测量单跳和三跳(经两个跳板，
+跳板均为同一替身服务器)配置在默认协商与 FAST_PROFILE 下的重连耗时，并按跳输出 TCP、密钥交换、认证
+各阶段的平均耗时。客户端密钥类型可选 RSA 或 ed25519。
+
+用法:
+    python examples/bench_handshake.py --rounds 20 --client-key ed25519
+"""
+import argparse
+import io
+import logging
+import select
+import socket
+import statistics
+import threading
+import time
+
+import paramiko
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519
+
+from sshforwarder.config import SSHConfig, FAST_PROFILE
+from sshforwarder.manager import TransportManager
+
+
+class StandInServer(paramiko.ServerInterface):
+    """
+    替身 SSH 服务器：接受任意公钥，direct-tcpip 请求直接连接本机目标
+    """
+    def __init__(self):
+        self.targets = {}
+
+    def get_allowed_auths(self, username):
+        return 'publickey'
+
+    def check_auth_publickey(self, username, key):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_direct_tcpip_request(self, chanid, origin, destination):
+        try:
+            self.targets[chanid] = socket.create_connection(destination, timeout=1)
+        except OSError:
+            return paramiko.OPEN_FAILED_CONNECT_FAILED
+        return paramiko.OPEN_SUCCEEDED
+
+
+def relay(a, b):
+    """
+    在通道和套接字之间双向转发，任一端关闭即结束
+    """
+    try:
+        while True:
+            r, _, _ = select.select([a, b], [], [], 5)
+            if not r: continue
+            for src, dst in ((a, b), (b, a)):
+                if src in r:
+                    data = src.recv(65536)
+                    if not data: return
+                    dst.sendall(data)
+    except OSError:
+        pass
+    finally:
+        a.close()
+        b.close()
+
+
+def ed25519_key() -> paramiko.Ed25519Key:
+    """
+    生成 ed25519 密钥(paramiko 不提供 ed25519 密钥生成)
+    """
+    pem = ed25519.Ed25519PrivateKey.generate().private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.OpenSSH, serialization.NoEncryption())
+    return paramiko.Ed25519Key(file_obj=io.StringIO(pem.decode()))
+
+
+def start_ssh_server(host_keys: list[paramiko.PKey]) -> int:
+    """
+    启动提供多个主机密钥的替身 SSH 服务器
+
+    Returns:
+        int: 监听端口
+    """
+    listener = socket.create_server(('127.0.0.1', 0), backlog=128)
+
+    def serve_transport(sock):
+        transport = paramiko.Transport(sock)
+        for key in host_keys: transport.add_server_key(key)
+        server = StandInServer()
+        try:
+            transport.start_server(server=server)
+        except paramiko.SSHException:
+            return
+        while transport.is_active():
+            channel = transport.accept(1)
+            if channel is None: continue
+            target = server.targets.pop(channel.get_id(), None)
+            if target is None:
+                channel.close()
+                continue
+            threading.Thread(target=relay, args=(channel, target), daemon=True).start()
+
+    def serve():
+        while True:
+            sock, _ = listener.accept()
+            threading.Thread(target=serve_transport, args=(sock,), daemon=True).start()
+
+    threading.Thread(target=serve, name='StandInSSH', daemon=True).start()
+    return listener.getsockname()[1]
+
+
+def bench(name: str, config: SSHConfig, rounds: int):
+    """
+    反复断开并重建传输通道，输出总耗时和各跳各阶段的平均耗时
+    """
+    transport_manager = TransportManager()
+    transport_manager.get(config)  # 预热：首次连接包含导入和算法初始化开销
+    totals, hops = [], []
+    for _ in range(rounds):
+        transport_manager.get(config).close()
+        start = time.perf_counter()
+        transport_manager.get(config)
+        totals.append(time.perf_counter() - start)
+        hops.append(transport_manager.handshake_stats(config))
+    transport_manager.close()
+
+    print(f'{name:<28} mean {statistics.mean(totals) * 1000:7.1f} ms  '
+          f'median {statistics.median(totals) * 1000:7.1f} ms  p90 {sorted(totals)[int(rounds * 0.9) - 1] * 1000:7.1f} ms')
+    for i in range(len(hops[0])):
+        phases = {phase: statistics.mean(run[i][phase] for run in hops) * 1000 for phase in ('tcp', 'kex', 'auth')}
+        print(f'    hop {i + 1}: tcp {phases["tcp"]:6.1f} ms  kex {phases["kex"]:6.1f} ms  auth {phases["auth"]:6.1f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, default=20, help='每种配置的重连次数')
+    parser.add_argument('--client-key', choices=('rsa', 'ed25519'), default='rsa', help='客户端密钥类型')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.CRITICAL)
+    ssh_port = start_ssh_server([paramiko.RSAKey.generate(2048), ed25519_key()])
+    client_key = paramiko.RSAKey.generate(2048) if args.client_key == 'rsa' else ed25519_key()
+
+    for profile_name, profile in (('default', None), ('fast', FAST_PROFILE)):
+        hop = SSHConfig('127.0.0.1', 'bench', client_key, None, ssh_port, handshake_profile=profile)
+        bench(f'1 hop  / {profile_name}', hop, args.rounds)
+        chain = SSHConfig('127.0.0.1', 'bench', client_key, [hop, hop], ssh_port, handshake_profile=profile)
+        bench(f'3 hops / {profile_name}', chain, args.rounds)
+
+
+if __name__ == '__main__':
+    main()
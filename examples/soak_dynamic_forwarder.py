@@ -0,0 +1,334 @@
+"""
+DynamicForwarder 连接抖动浸泡测试
+
+在本进程内启动一个基于 paramiko 的替身 SSH 服务器和一个回显服务，让 DynamicForwarder 经由替身服务器
+承接大量短 SOCKS5 连接，其中混入握手中止、目标拒绝连接和传输中途 RST 等异常情况。
+测试过程中定期采样线程数、打开的文件描述符数、RSS 以及各 Manager._kv 的大小，
+预热结束后的采样作为基线。以下任一情况判定为泄漏，以非零状态码退出：
+    - 最终采样超出基线容差
+    - 基线之后的采样分段取中位数作为检查点，检查点逐段上升且累计增长超过容差的一半(持续增长的慢泄漏
+      在总量超限之前即可发现，单次抖动不会被误判)
+tests/test_soak.py 以较小规模运行同样的检查(标记为 slow)。
+
+用法:
+    python examples/soak_dynamic_forwarder.py --connections 200000 --concurrency 32
+"""
+import argparse
+import logging
+import os
+import random
+import resource
+import socket
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import paramiko
+
+from sshforwarder.fowarder import DynamicForwarder
+from sshforwarder.manager import SocketManager, TransportManager
+
+
+class StandInServer(paramiko.ServerInterface):
+    """
+    替身 SSH 服务器：接受任意公钥，direct-tcpip 请求直接连接本机目标
+    """
+    def __init__(self):
+        self.targets = {}
+
+    def get_allowed_auths(self, username):
+        return 'publickey'
+
+    def check_auth_publickey(self, username, key):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_direct_tcpip_request(self, chanid, origin, destination):
+        try:
+            self.targets[chanid] = socket.create_connection(destination, timeout=1)
+        except OSError:
+            return paramiko.OPEN_FAILED_CONNECT_FAILED
+        return paramiko.OPEN_SUCCEEDED
+
+
+def relay(a, b):
+    """
+    在通道和套接字之间双向转发，任一端关闭即结束
+    """
+    import select
+    try:
+        while True:
+            r, _, _ = select.select([a, b], [], [], 5)
+            if not r: continue
+            for src, dst in ((a, b), (b, a)):
+                if src in r:
+                    data = src.recv(65536)
+                    if not data: return
+                    dst.sendall(data)
+    except OSError:
+        pass
+    finally:
+        a.close()
+        b.close()
+
+
+def start_ssh_server(host_key: paramiko.PKey) -> int:
+    """
+    启动替身 SSH 服务器
+
+    Returns:
+        int: 监听端口
+    """
+    listener = socket.create_server(('127.0.0.1', 0))
+
+    def serve_transport(sock):
+        transport = paramiko.Transport(sock)
+        transport.add_server_key(host_key)
+        server = StandInServer()
+        transport.start_server(server=server)
+        while transport.is_active():
+            channel = transport.accept(1)
+            if channel is None: continue
+            target = server.targets.pop(channel.get_id(), None)
+            if target is None:
+                channel.close()
+                continue
+            threading.Thread(target=relay, args=(channel, target), daemon=True).start()
+
+    def serve():
+        while True:
+            sock, _ = listener.accept()
+            threading.Thread(target=serve_transport, args=(sock,), daemon=True).start()
+
+    threading.Thread(target=serve, name='StandInSSH', daemon=True).start()
+    return listener.getsockname()[1]
+
+
+def start_echo_server() -> int:
+    """
+    启动回显服务
+
+    Returns:
+        int: 监听端口
+    """
+    listener = socket.create_server(('127.0.0.1', 0), backlog=1024)
+
+    def echo(conn):
+        try:
+            while data := conn.recv(65536):
+                conn.sendall(data)
+        except OSError:
+            pass
+        finally:
+            conn.close()
+
+    def serve():
+        while True:
+            conn, _ = listener.accept()
+            threading.Thread(target=echo, args=(conn,), daemon=True).start()
+
+    threading.Thread(target=serve, name='Echo', daemon=True).start()
+    return listener.getsockname()[1]
+
+
+def closed_port() -> int:
+    """
+    获取一个当前没有监听的端口
+    """
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def socks5_connect(proxy_port: int, dest_port: int) -> socket.socket:
+    """
+    完成 SOCKS5 握手并请求连接 127.0.0.1:dest_port
+    """
+    sock = socket.create_connection(('127.0.0.1', proxy_port), timeout=10)
+    sock.sendall(b'\x05\x01\x00')
+    sock.recv(2)
+    sock.sendall(b'\x05\x01\x00\x01' + socket.inet_aton('127.0.0.1') + struct.pack('!H', dest_port))
+    sock.recv(10)
+    return sock
+
+
+def churn_one(kind: str, proxy_port: int, echo_port: int, refused_port: int):
+    """
+    执行一次指定类型的短连接
+    """
+    try:
+        if kind == 'aborted':
+            sock = socket.create_connection(('127.0.0.1', proxy_port), timeout=10)
+            sock.sendall(b'\x05')
+            sock.close()
+        elif kind == 'refused':
+            sock = socks5_connect(proxy_port, refused_port)
+            sock.recv(1)
+            sock.close()
+        elif kind == 'rst':
+            sock = socks5_connect(proxy_port, echo_port)
+            sock.sendall(os.urandom(1024))
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+            sock.close()
+        else:
+            sock = socks5_connect(proxy_port, echo_port)
+            payload = os.urandom(random.randint(1, 8192))
+            sock.sendall(payload)
+            received = 0
+            while received < len(payload):
+                data = sock.recv(65536)
+                if not data: break
+                received += len(data)
+            sock.close()
+    except OSError:
+        pass
+
+
+def sample(forwarder: DynamicForwarder) -> dict:
+    """
+    采样进程资源和管理器大小
+    """
+    transport_manager = forwarder.transport_manager
+    return {
+        'threads': threading.active_count(),
+        'fds': len(os.listdir('/proc/self/fd')) if os.path.isdir('/proc/self/fd') else resource.getrlimit(resource.RLIMIT_NOFILE)[0],
+        'rss_kib': int(open('/proc/self/statm').read().split()[1]) * resource.getpagesize() // 1024
+        if os.path.exists('/proc/self/statm') else resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'socket_kv': len(forwarder.socket_manager._kv),
+        'transport_kv': len(transport_manager._kv),
+        'dispatcher_kv': len(transport_manager.dispatcher_manager._kv),
+    }
+
+
+def checkpoints(series: list, count: int) -> list:
+    """
+    把采样序列等分为count段，取每段的中位数
+
+    Returns:
+        list: 各检查点的值，采样不足count个时每个采样各为一个检查点
+    """
+    count = min(count, len(series))
+    size = len(series) / count
+    points = []
+    for i in range(count):
+        segment = sorted(series[int(i * size):int((i + 1) * size)])
+        points.append(segment[len(segment) // 2])
+    return points
+
+
+def find_leaks(baseline: dict, samples: list, final: dict, tolerance: float, slack: int,
+               count: int = 4) -> list:
+    """
+    对比基线、基线之后的采样和最终采样，找出疑似泄漏的指标
+
+    Args:
+        baseline: 基线采样
+        samples: 基线之后按时间顺序的采样
+        final: 最终采样
+        tolerance: 相对基线允许的增长比例
+        slack: 线程数、fd数、_kv大小允许的绝对增长
+        count: 趋势检查的检查点数
+
+    Returns:
+        list: 每个疑似泄漏指标的说明，为空表示未发现泄漏
+    """
+    failed = []
+    for key, base in baseline.items():
+        allowance = base * tolerance + (0 if key == 'rss_kib' else slack)
+        if final[key] > base + allowance:
+            failed.append(f'{key}: {base} -> {final[key]} (limit {base + allowance:.0f})')
+            continue
+        points = checkpoints([base] + [s[key] for s in samples] + [final[key]], count)
+        if len(points) >= 3 and all(b > a for a, b in zip(points, points[1:])) \
+                and points[-1] - points[0] > allowance / 2:
+            failed.append(f'{key}: grows at every checkpoint {points}')
+    return failed
+
+
+def run_soak(connections: int, concurrency: int, warmup: float, sample_interval: float,
+             settle: float = 5, verbose: bool = True) -> tuple[dict, list, dict]:
+    """
+    运行浸泡测试
+
+    Args:
+        connections: 总连接数
+        concurrency: 并发客户端数
+        warmup: 预热阶段占总连接数的比例
+        sample_interval: 采样间隔(秒)
+        settle: 结束后等待连接收尾的时间(秒)
+        verbose: 是否打印进度
+
+    Returns:
+        tuple: (基线采样, 基线之后的采样列表, 最终采样)
+    """
+    host_key = paramiko.RSAKey.generate(2048)
+    client_key = paramiko.RSAKey.generate(2048)
+    ssh_port = start_ssh_server(host_key)
+    echo_port = start_echo_server()
+    refused_port = closed_port()
+
+    socket_manager = SocketManager()
+    transport_manager = TransportManager(socket_manager)
+    forwarder = DynamicForwarder((closed_port(), None, ('127.0.0.1', 'soak', client_key, None, ssh_port),
+                                  '127.0.0.1'), socket_manager, transport_manager)
+    forwarder.trace_ring = None
+    proxy_port = forwarder.local_socket.getsockname()[1]
+    threading.Thread(target=forwarder.forward, name='DynamicForwarder', daemon=True).start()
+
+    kinds = ['normal'] * 7 + ['aborted', 'refused', 'rst']
+    done = 0
+    samples = []
+    baseline = None
+    warmup = int(connections * warmup)
+    started = last_sample = time.monotonic()
+    with ThreadPoolExecutor(concurrency) as executor:
+        while done < connections:
+            batch = min(concurrency * 16, connections - done)
+            list(executor.map(lambda _: churn_one(random.choice(kinds), proxy_port, echo_port, refused_port),
+                              range(batch)))
+            done += batch
+            now = time.monotonic()
+            if baseline is None and done >= warmup:
+                time.sleep(2)
+                baseline = sample(forwarder)
+                last_sample = time.monotonic()
+                if verbose: print(f'baseline after {done} connections: {baseline}', flush=True)
+            elif baseline is not None and now - last_sample >= sample_interval:
+                last_sample = now
+                samples.append(sample(forwarder))
+                if verbose: print(f'{done:>8} conns {done / (now - started):8.0f}/s {samples[-1]}', flush=True)
+    time.sleep(settle)
+    final = sample(forwarder)
+    if verbose: print(f'final: {final}', flush=True)
+    forwarder.close()
+    socket_manager.close()
+    transport_manager.close()
+    return baseline or final, samples, final
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--connections', type=int, default=200000, help='总连接数')
+    parser.add_argument('--concurrency', type=int, default=32, help='并发客户端数')
+    parser.add_argument('--warmup', type=float, default=0.1, help='预热阶段占总连接数的比例')
+    parser.add_argument('--sample-interval', type=float, default=5, help='采样间隔(秒)')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='相对基线允许的增长比例')
+    parser.add_argument('--slack', type=int, default=16, help='线程数、fd数、_kv大小允许的绝对增长')
+    parser.add_argument('--checkpoints', type=int, default=4, help='趋势检查的检查点数')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.CRITICAL)
+    baseline, samples, final = run_soak(args.connections, args.concurrency, args.warmup, args.sample_interval)
+    failed = find_leaks(baseline, samples, final, args.tolerance, args.slack, args.checkpoints)
+    if failed:
+        print('LEAK DETECTED\n  ' + '\n  '.join(failed))
+        sys.exit(1)
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
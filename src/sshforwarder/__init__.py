@@ -1,3 +1,3 @@
-from config import SSHConfig, ForwardConfig
-from manager import ForwarderManager, TransportManager
-from fowarder import LocalForwarder, RemoteForwarder, DynamicForwarder
\ No newline at end of file
+from .config import SSHConfig, ForwardConfig
+from .manager import ForwarderManager, TransportManager
+from .fowarder import LocalForwarder, MultiLocalForwarder, RemoteForwarder, DynamicForwarder
\ No newline at end of file
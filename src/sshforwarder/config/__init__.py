@@ -1,3 +1,5 @@
-from .ssh_config import SSHConfig
+from .ssh_config import SSHConfig, load_private_key
+from .handshake_profile import HandshakeProfile, FAST_PROFILE
 from .socket_config import SocketConfig
+from .upstream_config import UpstreamConfig
 from .forward_config import ForwardConfig
\ No newline at end of file
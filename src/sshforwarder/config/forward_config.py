@@ -1,25 +1,59 @@
 from dataclasses import dataclass
+from typing import List
+
 from .ssh_config import SSHConfig
+from .upstream_config import UpstreamConfig
 
 
 @dataclass
 class ForwardConfig:
     """
     SSH端口转发配置类
+
+    端口为None且主机为路径(包含'/')时表示Unix域套接字：本地端为本地转发的监听路径或远程转发的目标路径，
+    远程端为本地转发的目标路径(direct-streamlocal@openssh.com)或远程转发的监听路径(streamlocal-forward@openssh.com)。
     
     Attributes:
-        local_port (int): 本地端口号
+        local_port (int | None): 本地端口号
         remote_port (int | None): 远程端口号
-        ssh_config (SSHConfig | tuple): SSH连接配置
-        local_host (str): 本地主机地址，默认为'localhost'
-        remote_host (str): 远程主机地址，默认为'localhost'
+        ssh_config (SSHConfig | tuple | list): SSH连接配置，本地端口转发可传入到同一目标的多条SSH路径列表；
+            同时指定ssh_paths时可为None，否则须与ssh_paths的第一条路径相同
+        local_host (str): 本地主机地址或Unix域套接字路径，默认为'localhost'
+        remote_host (str): 远程主机地址或Unix域套接字路径，默认为'localhost'
+        upstream (UpstreamConfig | list | None): 远程端口转发的本地上游服务池，
+            默认为None表示只转发到(local_host, local_port)
+        ssh_paths (List[SSHConfig]): 按优先级排列的SSH路径列表，默认为[ssh_config]，ssh_config为其中第一条
+        path_weights (List[float] | None): 各SSH路径的权重，默认为None表示权重相同
     """
     local_port: int
     remote_port: int | None
-    ssh_config: SSHConfig | tuple
+    ssh_config: SSHConfig | tuple | list
     local_host: str = 'localhost'
     remote_host: str = 'localhost'
+    upstream: UpstreamConfig | list | None = None
+    ssh_paths: List[SSHConfig | tuple] = None
+    path_weights: List[float] | None = None
 
     def __post_init__(self):
-        if not isinstance(self.ssh_config, SSHConfig):
-            self.ssh_config = SSHConfig(*self.ssh_config)
\ No newline at end of file
+        """
+        规范化SSH路径列表
+
+        Raises:
+            ValueError: ssh_config与ssh_paths冲突，或path_weights与ssh_paths长度不一致
+        """
+        if isinstance(self.ssh_config, list):
+            if self.ssh_paths is not None:
+                raise ValueError('ssh_config为路径列表时不能再指定ssh_paths')
+            self.ssh_paths = self.ssh_config
+        elif self.ssh_paths is None:
+            self.ssh_paths = [self.ssh_config]
+        self.ssh_paths = [_ if isinstance(_, SSHConfig) else SSHConfig(*_) for _ in self.ssh_paths]
+        if self.ssh_config is not None and not isinstance(self.ssh_config, list):
+            ssh_config = self.ssh_config if isinstance(self.ssh_config, SSHConfig) else SSHConfig(*self.ssh_config)
+            if ssh_config != self.ssh_paths[0]:
+                raise ValueError(f'ssh_config({ssh_config})与ssh_paths的第一条路径({self.ssh_paths[0]})不一致')
+        self.ssh_config = self.ssh_paths[0]
+        if self.path_weights is not None and len(self.path_weights) != len(self.ssh_paths):
+            raise ValueError('path_weights与ssh_paths长度不一致')
+        if isinstance(self.upstream, list):
+            self.upstream = UpstreamConfig(self.upstream)
\ No newline at end of file
@@ -0,0 +1,40 @@
+"""
+SSH握手配置模块
+
+提供HandshakeProfile类，按主机固定密钥交换、主机密钥、加密、MAC和用户认证签名算法，
+跳过paramiko默认的多算法协商和RSA签名算法回退。
+"""
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class HandshakeProfile:
+    """
+    SSH握手配置
+
+    各算法列表是允许使用的算法，通过Transport的disabled_algorithms禁用其余算法，允许的算法之间按paramiko
+    默认的优先级协商；为空表示使用paramiko默认值，paramiko不支持的算法会被忽略。
+
+    Attributes:
+        kex (tuple): 密钥交换算法
+        key_types (tuple): 服务器主机密钥算法
+        ciphers (tuple): 加密算法
+        digests (tuple): MAC算法
+        pubkeys (tuple): 用户公钥认证的签名算法，其余算法被禁用
+    """
+    kex: tuple = ()
+    key_types: tuple = ()
+    ciphers: tuple = ()
+    digests: tuple = ()
+    pubkeys: tuple = ()
+
+
+# curve25519密钥交换、ed25519主机密钥(带一个ECDSA后备)、AES-128；认证保留每种私钥类型的签名算法，
+# RSA只保留rsa-sha2-256
+FAST_PROFILE = HandshakeProfile(
+    kex=('curve25519-sha256@libssh.org', 'ecdh-sha2-nistp256'),
+    key_types=('ssh-ed25519', 'ecdsa-sha2-nistp256'),
+    ciphers=('aes128-gcm@openssh.com', 'aes128-ctr'),
+    digests=('hmac-sha2-256-etm@openssh.com', 'hmac-sha2-256'),
+    pubkeys=('ssh-ed25519', 'ecdsa-sha2-nistp256', 'ecdsa-sha2-nistp384', 'ecdsa-sha2-nistp521', 'rsa-sha2-256'),
+)
@@ -11,7 +11,7 @@ class SocketConfig(NamedTuple):
     
     Attributes:
         bind_port (int): 绑定端口号，默认为None表示不绑定
-        bind_address (str): 绑定地址，默认为None表示任意地址
+        bind_address (str): 绑定地址，默认为None表示任意地址；地址族为AF_UNIX时为监听的套接字路径
         family (socket.AddressFamily): 地址族，默认为IPv4 (AF_INET)
         type_ (socket.SocketKind): Socket类型，默认为流式Socket (SOCK_STREAM)
         proto (int): 协议号，默认为0表示自动选择
@@ -3,11 +3,30 @@ SSH连接配置模块
 
 提供SSHConfig类用于存储和管理SSH连接配置信息，包括主机、用户、密钥、跳板服务器列表等。
 """
-from dataclasses import dataclass
+import os
+from dataclasses import dataclass, replace
+from functools import lru_cache
 from typing import List, Union
 
 from paramiko import PKey
 
+from .handshake_profile import HandshakeProfile
+
+
+@lru_cache(maxsize=None)
+def load_private_key(path: str, password: str = None) -> PKey:
+    """
+    读取并解析私钥文件，同一文件只解析一次
+
+    Args:
+        path: 私钥文件路径，支持~
+        password: 可选的私钥密码
+
+    Returns:
+        PKey: 私钥对象(类型按文件内容自动识别)
+    """
+    return PKey.from_path(os.path.expanduser(path), password)
+
 
 @dataclass
 class SSHConfig:
@@ -17,24 +36,66 @@ class SSHConfig:
     Attributes:
         ip (str): 目标服务器IP地址
         user (str): SSH登录用户名
-        private_key (PKey): SSH私钥对象
+        private_key (PKey | str): SSH私钥对象，或私钥文件路径(通过load_private_key解析并缓存)
         jump_server_list (List[Union[SSHConfig, tuple]]): 跳板服务器配置列表
         port (int): SSH端口号，默认为22
+        compression (bool | str): 是否启用zlib压缩，默认为False；
+            'adaptive'表示按目标流量的可压缩性在压缩与不压缩的传输通道之间分配连接
+        max_opening (int): 每个传输通道同时进行中的通道打开请求数上限，默认为None表示不限制
+        max_channels (int): 每个传输通道的通道总数上限(对应服务器的MaxSessions)，默认为None表示不限制
+        max_lanes (int): 达到上限时最多并行使用的同主机传输通道数，默认为1表示只排队不分流
+        lane (int): 同主机传输通道的编号，默认为0
+        handshake_profile (HandshakeProfile): 固定握手算法的配置，默认为None表示使用paramiko默认协商
+        lazy (bool): 是否在第一个连接到来时才建立传输通道，默认为False表示转发器初始化时建立；
+            远程端口转发需要传输通道在服务器上监听，不受影响
+        idle_timeout (float): 没有通道和远程端口转发的传输通道空闲多久(秒)后释放，
+            默认为None表示不释放；释放后下一个连接到来时重建
     """
     ip: str
     user: str
     private_key: PKey
     jump_server_list: List[Union['SSHConfig', tuple]] = None
     port: int = 22
+    compression: bool | str = False
+    max_opening: int = None
+    max_channels: int = None
+    max_lanes: int = 1
+    lane: int = 0
+    handshake_profile: HandshakeProfile = None
+    lazy: bool = False
+    idle_timeout: float = None
 
     def __post_init__(self):
         """
         初始化后处理跳板服务器列表转换
         """
+        assert self.compression in (True, False, 'adaptive'), f'不支持的压缩模式: {self.compression}'
+        if isinstance(self.private_key, (str, os.PathLike)):
+            self.private_key = load_private_key(os.fspath(self.private_key))
         if isinstance(self.jump_server_list, list) and len(self.jump_server_list) > 0 \
                 and not isinstance(self.jump_server_list[0], SSHConfig):
             self.jump_server_list = [SSHConfig(*_) for _ in self.jump_server_list]
 
+    def compressed(self) -> 'SSHConfig':
+        """
+        返回启用压缩的同主机配置，用于自适应压缩模式下的压缩传输通道
+
+        Returns:
+            SSHConfig: compression为True的配置副本
+        """
+        return replace(self, compression=True)
+
+    def with_lane(self, lane: int) -> 'SSHConfig':
+        """
+        返回同主机的另一条传输通道的配置，用于通道数达到上限时分流
+
+        Args:
+            lane: 传输通道编号
+
+        Returns:
+            SSHConfig: lane为指定编号的配置副本
+        """
+        return replace(self, lane=lane)
 
     def __repr__(self):
         """
@@ -50,9 +111,9 @@ class SSHConfig:
         返回对象的用户友好字符串表示
         
         Returns:
-            str: 包含用户名、IP和端口信息的字符串
+            str: 包含用户名、IP和端口信息的字符串，非默认传输通道附加#编号
         """
-        return f"{self.user}@{self.ip}:{self.port}"
+        return f"{self.user}@{self.ip}:{self.port}" + (f"#{self.lane}" if self.lane else "")
 
     def __eq__(self, other):
         """
@@ -62,18 +123,19 @@ class SSHConfig:
             other (SSHConfig): 另一个SSH配置对象
             
         Returns:
-            bool: 如果IP、用户和端口相同则返回True
+            bool: 如果IP、用户、端口、压缩模式和传输通道编号相同则返回True
         """
-        return self.ip == other.ip and self.user == other.user and self.port == other.port
+        return self.ip == other.ip and self.user == other.user and self.port == other.port \
+            and self.compression == other.compression and self.lane == other.lane
 
     def __hash__(self):
         """
         返回对象的哈希值
 
         Returns:
-            int: 基于IP、用户和端口计算的哈希值
+            int: 基于IP、用户、端口、压缩模式和传输通道编号计算的哈希值
         """
-        return hash((self.ip, self.user,self.port))
+        return hash((self.ip, self.user, self.port, self.compression, self.lane))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,40 @@
+"""
+上游服务池配置模块
+
+提供UpstreamConfig类，描述远程端口转发的本地目标服务池及其负载均衡和健康检查参数。
+"""
+from dataclasses import dataclass
+from typing import List
+
+
+@dataclass
+class UpstreamConfig:
+    """
+    上游服务池配置类
+
+    Attributes:
+        upstreams (List[tuple]): 上游服务地址列表 [(host, port), ...]，(套接字路径, None)表示本地Unix域套接字
+        strategy (str): 负载均衡策略 'round_robin' | 'least_connections' | 'consistent_hash'，默认为轮询
+        connect_timeout (float): 连接上游的超时时间(秒)，默认为1秒
+        max_fails (int): 连续失败多少次后摘除该上游，默认为1次
+        fail_timeout (float): 上游被摘除的时长(秒)，默认为10秒
+        health_check_interval (float): 主动健康检查间隔(秒)，0表示关闭，默认为0
+        idle_connections (int): 每个上游预先建立的空闲连接数，默认为0
+        idle_timeout (float): 空闲连接的最长保留时间(秒)，默认为30秒
+    """
+    upstreams: List[tuple]
+    strategy: str = 'round_robin'
+    connect_timeout: float = 1
+    max_fails: int = 1
+    fail_timeout: float = 10
+    health_check_interval: float = 0
+    idle_connections: int = 0
+    idle_timeout: float = 30
+
+    def __post_init__(self):
+        """
+        初始化后校验负载均衡策略并规范化地址
+        """
+        assert self.strategy in ('round_robin', 'least_connections', 'consistent_hash'), \
+            f'不支持的负载均衡策略: {self.strategy}'
+        self.upstreams = [tuple(_) for _ in self.upstreams]
@@ -1,3 +1,4 @@
 from .local_forwarder import LocalForwarder
+from .multi_local_forwarder import MultiLocalForwarder
 from .remote_forwarder import RemoteForwarder
 from .dynamic_forwarder import DynamicForwarder
\ No newline at end of file
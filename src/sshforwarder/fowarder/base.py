@@ -6,9 +6,22 @@ SSH端口转发器基类模块
 import logging
 import select
 import threading
+from collections import deque
 from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from time import monotonic
 
-from sshforwarder.utils import ResourceAgent, parse_cleartext_payload
+from paramiko import Channel
+
+from sshforwarder.utils import ResourceAgent, parse_cleartext_payload, format_address, ConnectionTrace, default_trace_ring
+from sshforwarder.utils.memory import StackSizeThreadPoolExecutor
+from sshforwarder.utils.capture import UP, DOWN
+
+
+class TransportUnavailable(ConnectionError):
+    """
+    传输通道暂不可用(断开或正在重建)，源端连接可以挂起等待重连
+    """
 
 
 class Forwarder:
@@ -21,7 +34,32 @@ class Forwarder:
         thread_pool_executor: 线程池执行器，用于处理并发连接
         exit_event: 线程退出事件标志
         logger: 日志记录器
+        compression_advisor: 自适应压缩建议器，为None时不抽样
+        trace_ring: 连接生命周期记录的环形缓冲区，为None时不记录
+        traffic_capture: 流量抓取(TrafficCapture)，为None时不抓取
+        access_log: 访问日志(AccessLog)，为None时不记录
+        connect_in_worker: 是否在工作线程中建立目标端连接，避免慢连接阻塞接收循环
+        pending_limit: 等待传输通道重连的源端连接数上限，0表示不挂起
+        pending_timeout: 源端连接最长挂起时间(秒)
+        coalesce_bytes: 写入SSH通道前合并小块数据的字节上限，0表示不合并；只对paramiko通道生效，
+            经由MuxTransportManager的连接(目标为本地套接字)不合并
+        coalesce_delay: 连续写入时等待后续数据的最长时间(秒)，0表示只合并已到达的数据
+        coalesce_flush: 可选的判断函数 coalesce_flush(chunk) -> bool，返回True时立即发送已合并的数据
+        progress_bytes: 转发过程中每累计多少字节调用一次_connection_progress
+        progress_interval: 转发过程中至少每隔多少秒调用一次_connection_progress(有新流量时)
+        stack_size: 连接线程栈大小(字节)，None表示系统默认；低内存模式可设为utils.memory.LOW_MEMORY_STACK_SIZE，
+            需在forward()之前设置，只对内部创建的线程池生效
     """
+    connect_in_worker = False
+    pending_limit = 256
+    pending_timeout = 10
+    coalesce_bytes = 0
+    coalesce_delay = 0.001
+    coalesce_flush = None
+    progress_bytes = 1024 * 1024
+    progress_interval = 1
+    stack_size = None
+
     def __init__(self, thread_pool_executor: ThreadPoolExecutor = None):
         """
         初始化转发器
@@ -29,33 +67,83 @@ class Forwarder:
         Args:
             thread_pool_executor: 可选的线程池执行器，如果未提供将创建新的
         """
-        self.thread_pool_executor = ResourceAgent(ThreadPoolExecutor, thread_pool_executor,
+        self.thread_pool_executor = ResourceAgent(StackSizeThreadPoolExecutor, thread_pool_executor,
                                                   thread_name_prefix=f"{self.__class__.__name__}.connection",
                                                   max_workers=4096).init()
         self.exit_event = threading.Event()
         self.logger = logging.getLogger("Forwarder")
+        self.compression_advisor = None
+        self.trace_ring = default_trace_ring
+        self.traffic_capture = None
+        self.access_log = None
+        self._pending = deque()
+        self._pending_lock = threading.Lock()
 
     def forward(self):
         """
         启动转发主循环
         
         持续监听源端连接，为每个连接创建目标端连接并启动转发线程。
-        处理连接过程中的异常和超时。
+        处理连接过程中的异常和超时；传输通道不可用时挂起源端连接，不阻塞接收循环。
         """
+        if type(self.thread_pool_executor) is StackSizeThreadPoolExecutor and self.stack_size:
+            self.thread_pool_executor.stack_size = self.stack_size
         while not self.exit_event.is_set():
-            _from_conn = None
+            _from_conn, trace = None, None
+            if self._pending: self._expire_pending()
             try:
                 _from_conn, _from_addr = self._from()
                 if _from_conn is None: continue
-                _to_conn, _to_addr = self._to(_from_conn)
-                self.thread_pool_executor.submit(self._connection_handler, _from_conn, _from_addr, _to_conn, _to_addr)
+                trace = self._start_trace(_from_addr)
+                if self.connect_in_worker:
+                    self.thread_pool_executor.submit(self._connect_handler, _from_conn, _from_addr, trace)
+                    continue
+                _to_conn, _to_addr = self._to(_from_conn, trace)
+                if _to_conn is None:
+                    _from_conn.close()
+                    self._finish_trace(trace, 'rejected')
+                    continue
+                self.thread_pool_executor.submit(self._connection_handler, _from_conn, _from_addr, _to_conn, _to_addr, trace)
             except TimeoutError as e:
-                pass
+                if _from_conn:
+                    self._reject(_from_conn)
+                    self._finish_trace(trace, 'connect_timeout')
+            except TransportUnavailable as e:
+                self.logger.error(f'{e.__class__.__name__}: {e}')
+                if _from_conn: self._hold(_from_conn, _from_addr, trace)
+                self._forward_failed()
             except Exception as e:
-                if _from_conn: _from_conn.close()
+                if _from_conn: self._reject(_from_conn)
+                self._finish_trace(trace, f'connect_failed: {e.__class__.__name__}')
                 self.logger.error(f'{e.__class__.__name__}: {e}')
                 self._forward_failed()
 
+    def _start_trace(self, f_a) -> ConnectionTrace | None:
+        """
+        为新接入的连接创建生命周期记录，只开启访问日志时创建不入环形缓冲区的记录
+
+        Args:
+            f_a: 源端地址
+
+        Returns:
+            ConnectionTrace | None: 连接记录，都未开启时返回None
+        """
+        if self.trace_ring is not None: return self.trace_ring.start(self.logger.name, f_a)
+        if self.access_log is not None: return ConnectionTrace(self.logger.name, f_a)
+        return None
+
+    def _finish_trace(self, trace: ConnectionTrace | None, reason: str):
+        """
+        结束连接的生命周期记录并写入访问日志，连接在任何阶段结束都经由此处；每条记录只写入一次
+
+        Args:
+            trace: 连接记录，为None或已结束时忽略
+            reason: 关闭原因
+        """
+        if trace is None or trace.closed: return
+        trace.close(reason)
+        if self.access_log is not None: self.access_log.record(trace)
+
     def _from(self) -> tuple[any, str]:
         """
         建立源端连接(抽象方法)
@@ -65,15 +153,16 @@ class Forwarder:
         """
         raise NotImplementedError()
 
-    def _to(self, _from) -> tuple[any, str]:
+    def _to(self, _from, trace: ConnectionTrace = None) -> tuple[any, str]:
         """
         建立目标端连接(抽象方法)
         
         Args:
             _from: 源端连接对象
+            trace: 可选的连接生命周期记录，实现应记录目标地址和建立时间
             
         Returns:
-            tuple: (目标端连接对象, 目标端地址字符串)
+            tuple: (目标端连接对象, 目标端地址字符串)，目标端连接对象为None表示已拒绝该连接(不视为失败)
         """
         raise NotImplementedError()
 
@@ -81,11 +170,151 @@ class Forwarder:
         """
         转发失败回调方法
         
-        子类可重写此方法实现自定义失败处理逻辑。
+        子类可重写此方法实现自定义失败处理逻辑，不应阻塞；传输通道重建后应调用_replay_pending。
         """
         pass
 
-    def _connection_handler(self, f, f_a, t, t_a):
+    def _reconnect(self, ssh_config):
+        """
+        在后台重建传输通道，就绪后重放挂起的源端连接
+
+        Args:
+            ssh_config: SSH连接配置
+
+        Returns:
+            Future: 传输通道的Future
+        """
+        future = self.transport_manager.get(ssh_config, block=False)
+        future.add_done_callback(lambda f: f.exception() is None and self._replay_pending())
+        return future
+
+    def _reject(self, f):
+        """
+        关闭无法转发的源端连接，子类可重写以先通知客户端
+
+        Args:
+            f: 源端连接对象
+        """
+        f.close()
+
+    def _hold(self, f, f_a, trace: ConnectionTrace = None, deadline: float = None):
+        """
+        挂起源端连接，等待传输通道重连
+
+        Args:
+            f: 源端连接对象
+            f_a: 源端地址
+            trace: 可选的连接生命周期记录
+            deadline: 挂起截止时间，默认为pending_timeout秒后
+        """
+        with self._pending_lock:
+            if len(self._pending) < self.pending_limit and not self.exit_event.is_set():
+                self._pending.append((deadline or monotonic() + self.pending_timeout, f, f_a, trace))
+                return
+        self._reject(f)
+        self._finish_trace(trace, 'pending_full')
+
+    def _expire_pending(self):
+        """
+        关闭超过截止时间的挂起连接
+        """
+        now = monotonic()
+        with self._pending_lock:
+            expired = [_ for _ in self._pending if _[0] <= now]
+            if not expired: return
+            self._pending = deque(_ for _ in self._pending if _[0] > now)
+        for _, f, _, trace in expired:
+            self._reject(f)
+            self._finish_trace(trace, 'pending_expired')
+
+    def _replay_pending(self):
+        """
+        传输通道就绪后，在工作线程中为所有挂起的源端连接重新建立目标端连接
+
+        由传输通道Future的完成回调调用，转发器可能已关闭：线程池拒绝提交时关闭剩余的挂起连接。
+        """
+        self._expire_pending()
+        with self._pending_lock:
+            pending, self._pending = self._pending, deque()
+        while pending:
+            deadline, f, f_a, trace = pending[0]
+            try:
+                self.thread_pool_executor.submit(self._connect_handler, f, f_a, trace, deadline)
+            except RuntimeError:
+                break
+            pending.popleft()
+        for _, f, _, trace in pending:
+            self._reject(f)
+            self._finish_trace(trace, 'forwarder_closed')
+
+    def _ready_transport(self, ssh_config):
+        """
+        获取已就绪的传输通道，不等待正在重建的通道
+
+        Args:
+            ssh_config: SSH连接配置
+
+        Returns:
+            Transport | None: 已就绪的传输通道，未就绪时返回None
+        """
+        future = self.transport_manager.get(ssh_config, block=False)
+        if future.done() and future.exception() is None:
+            return future.result()
+        return None
+
+    def _placed_transport(self, ssh_config, destination):
+        """
+        按自适应压缩建议为目标选择传输通道
+
+        值得压缩的目标走压缩通道；压缩通道尚未就绪时(会在后台建立)仍走默认通道。
+
+        Args:
+            ssh_config: SSH连接配置
+            destination: 目标地址
+
+        Returns:
+            Transport | None: 已就绪的传输通道，未就绪时返回None
+        """
+        if ssh_config.compression == 'adaptive' and self.compression_advisor is not None \
+                and self.compression_advisor.should_compress(destination):
+            transport = self._ready_transport(ssh_config.compressed())
+            if transport is not None: return transport
+        return self._ready_transport(ssh_config)
+
+    def _connect_handler(self, f, f_a, trace: ConnectionTrace = None, deadline: float = None):
+        """
+        在工作线程中建立目标端连接并开始转发
+
+        Args:
+            f: 源端连接对象
+            f_a: 源端地址
+            trace: 可选的连接生命周期记录
+            deadline: 重放挂起连接时沿用的挂起截止时间
+        """
+        try:
+            t, t_a = self._to(f, trace)
+        except TransportUnavailable as e:
+            self.logger.error(f'{e.__class__.__name__}: {e}')
+            self._hold(f, f_a, trace, deadline)
+            self._forward_failed()
+            return
+        except TimeoutError:
+            self._reject(f)
+            self._finish_trace(trace, 'connect_timeout')
+            return
+        except Exception as e:
+            self._reject(f)
+            self._finish_trace(trace, f'connect_failed: {e.__class__.__name__}')
+            self.logger.error(f'{e.__class__.__name__}: {e}')
+            self._forward_failed()
+            return
+        if t is None:
+            f.close()
+            self._finish_trace(trace, 'rejected')
+            return
+        self._connection_handler(f, f_a, t, t_a, trace)
+
+    def _connection_handler(self, f, f_a, t, t_a, trace: ConnectionTrace = None):
         """
         连接处理线程
         
@@ -96,43 +325,148 @@ class Forwarder:
             f_a: 源端地址
             t: 目标端连接对象
             t_a: 目标端地址
+            trace: 可选的连接生命周期记录
         """
+        sampler = self.compression_advisor.sampler(t_a) if self.compression_advisor else None
+        capture = self.traffic_capture
+        capture_id = capture.session(self.logger.name, f_a, t_a) if capture is not None else None
+        tap_up = partial(capture.record, capture_id, UP) if capture_id is not None else None
+        tap_down = partial(capture.record, capture_id, DOWN) if capture_id is not None else None
+        reason = 'forwarder_closed'
+        bytes_up = bytes_down = 0
+        unreported, reported_at = 0, monotonic()  # 尚未通过_connection_progress报告的字节数
+        last = None  # 上一次转发的方向，同一方向连续转发(对端未应答)视为连续写入
         while not self.exit_event.is_set():
+            if unreported and (unreported >= self.progress_bytes or monotonic() - reported_at >= self.progress_interval):
+                self._connection_progress(f_a, t_a, unreported)
+                unreported, reported_at = 0, monotonic()
             r, _, x = select.select([f, t], [], [], 1)
-            if f in r and not self._relay_streams(f, f_a, t, t_a): break
-            if t in r and not self._relay_streams(t, t_a, f, f_a): break
+            if f in r:
+                n = self._relay_streams(f, f_a, t, t_a, sampler, tap_up, last == UP)
+                last = UP
+                if n <= 0:
+                    reason = 'source_eof' if n == 0 else 'source_error'
+                    break
+                bytes_up += n
+                unreported += n
+                if trace is not None:
+                    if not trace.first_up: trace.first_up = monotonic()
+                    trace.bytes_up += n
+            if t in r:
+                n = self._relay_streams(t, t_a, f, f_a, sampler, tap_down, last == DOWN)
+                last = DOWN
+                if n <= 0:
+                    reason = 'destination_eof' if n == 0 else 'destination_error'
+                    break
+                bytes_down += n
+                unreported += n
+                if trace is not None:
+                    if not trace.first_down: trace.first_down = monotonic()
+                    trace.bytes_down += n
+        if sampler is not None and sampler.remaining > 0: sampler.finish()
+        if capture_id is not None: capture.end(capture_id)
         if f: f.close()
         if t: t.close()
+        self._finish_trace(trace, reason)
+        if unreported: self._connection_progress(f_a, t_a, unreported)
+        self._connection_closed(f_a, t_a, bytes_up, bytes_down, reason)
 
-    def _relay_streams(self, f, f_a, t, t_a):
+    def _connection_progress(self, f_a, t_a, nbytes: int):
+        """
+        转发过程回调，每累计progress_bytes字节或每隔progress_interval秒报告一次新转发的字节数，
+        连接结束前报告剩余部分；子类可重写以增量统计流量
+
+        Args:
+            f_a: 源端地址
+            t_a: 目标端地址
+            nbytes: 自上次报告以来双向转发的字节数
+        """
+        pass
+
+    def _connection_closed(self, f_a, t_a, bytes_up: int, bytes_down: int, reason: str):
+        """
+        连接结束回调(在最后一次_connection_progress之后调用)，子类可重写
+
+        Args:
+            f_a: 源端地址
+            t_a: 目标端地址
+            bytes_up: 源端到目标端的字节数
+            bytes_down: 目标端到源端的字节数
+            reason: 关闭原因
+        """
+        pass
+
+    def _relay_streams(self, f, f_a, t, t_a, sampler=None, tap=None, streaming=False):
         """
         转发数据流
+
+        开启写入合并(coalesce_bytes > 0)且目标端为SSH通道时，先合并源端后续的数据再写入通道。
         
         Args:
             f: 源端连接对象
             f_a: 源端地址
             t: 目标端连接对象
             t_a: 目标端地址
+            sampler: 可选的可压缩性抽样器
+            tap: 可选的抓取回调，接收转发的每个分块
+            streaming: 源端是否在连续写入(上次转发也是这个方向)，合并时据此决定是否等待后续数据
             
         Returns:
-            bool: 转发是否成功
+            int: 转发的字节数，0表示对端已关闭，-1表示收发出错
         """
-        logger = self.logger.getChild(f"[{"%s:%s"%f_a} --> {"%s:%s"%t_a}]")
+        coalesce = self.coalesce_bytes > 0 and isinstance(t, Channel)
         try:
-            data = f.recv(4096)
+            data = f.recv(self.coalesce_bytes if coalesce else 4096)
             if data == b'':
-                return False
-            logger.debug(parse_cleartext_payload(data))
+                return 0
+            if coalesce: data = self._coalesce(f, data, streaming)
+            if sampler is not None and sampler.remaining > 0: sampler.feed(data)
+            if tap is not None: tap(data)
+            # 连接标识只在需要输出日志时格式化，不为每个地址创建子Logger(logging会永久缓存)
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug('[%s --> %s] %s', format_address(f_a), format_address(t_a), parse_cleartext_payload(data))
         except Exception as e:
-            logger.debug(f'{e.__class__.__name__}: {e}')
-            return False
+            self.logger.debug('[%s --> %s] %s: %s', format_address(f_a), format_address(t_a), e.__class__.__name__, e)
+            return -1
         try:
-            t.send(data)
+            t.sendall(data)
         except Exception as e:
-            logger.debug(f'{e.__class__.__name__}: {e}')
-            return False
+            self.logger.debug('[%s --> %s] %s: %s', format_address(f_a), format_address(t_a), e.__class__.__name__, e)
+            return -1
+
+        return len(data)
+
+    def _coalesce(self, f, data: bytes, streaming: bool = False) -> bytes:
+        """
+        把源端随后到达的数据合并到一次通道写入中，每次通道写入都是一个独立加密的SSH报文
 
-        return True
+        先读完源端已到达的数据；源端在连续写入或已合并多个分块时，最多再等待coalesce_delay秒的后续数据。
+        请求-应答式的连接(两个方向交替转发)不等待，不增加延迟。
+        达到coalesce_bytes、coalesce_flush返回True或源端关闭时结束合并。
+
+        Args:
+            f: 源端连接对象
+            data: 已读取的第一个分块
+            streaming: 源端是否在连续写入
+
+        Returns:
+            bytes: 合并后的数据
+        """
+        chunks, size, deadline = [data], len(data), None
+        while size < self.coalesce_bytes and not (self.coalesce_flush is not None and self.coalesce_flush(chunks[-1])):
+            r, _, _ = select.select([f], [], [], 0)
+            if not r:
+                if not (streaming or len(chunks) > 1) or self.coalesce_delay <= 0: break
+                if deadline is None: deadline = monotonic() + self.coalesce_delay
+                remaining = deadline - monotonic()
+                if remaining <= 0: break
+                r, _, _ = select.select([f], [], [], remaining)
+                if not r: break
+            chunk = f.recv(self.coalesce_bytes - size)
+            if not chunk: break
+            chunks.append(chunk)
+            size += len(chunk)
+        return b''.join(chunks) if len(chunks) > 1 else data
 
     def close(self):
         """
@@ -141,5 +475,10 @@ class Forwarder:
         停止所有转发线程并释放资源。
         """
         self.exit_event.set()
+        with self._pending_lock:
+            pending, self._pending = self._pending, deque()
+        for _, f, _, trace in pending:
+            self._reject(f)
+            self._finish_trace(trace, 'forwarder_closed')
         self.thread_pool_executor.shutdown()
 
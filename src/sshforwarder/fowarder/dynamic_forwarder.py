@@ -5,12 +5,15 @@
 """
 import logging
 from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
+
+from paramiko import ChannelException
 
 from sshforwarder.config import ForwardConfig
 from sshforwarder.manager import SocketManager, TransportManager
-from sshforwarder.utils import ResourceAgent
+from sshforwarder.utils import ResourceAgent, CompressionAdvisor, DestinationCache, TrafficAnalytics
 from sshforwarder.protocols import Socks5
-from .base import Forwarder
+from .base import Forwarder, TransportUnavailable
 
 
 class DynamicForwarder(Forwarder):
@@ -18,6 +21,10 @@ class DynamicForwarder(Forwarder):
     动态端口转发器类
     
     继承自Forwarder基类，实现基于SOCKS5协议的动态端口转发功能。
+    SSH配置为自适应压缩时，按各目标流量的可压缩性把新连接分配到压缩或不压缩的传输通道。
+    SSH服务器因目标不可达(connect failed)拒绝打开的目标会记入负缓存，缓存期内对同一目标的请求直接以相应的
+    SOCKS5错误码应答；其他失败原因(如服务器的通道数上限)与目标无关，不缓存。
+    传输通道断开时已完成SOCKS5协商的连接被挂起，重连后直接打开通道，不再重新协商。
     
     Attributes:
         config: 转发配置对象
@@ -25,8 +32,23 @@ class DynamicForwarder(Forwarder):
         transport_manager: SSH传输管理对象
         transport: SSH传输通道
         local_socket: 本地监听套接字
+        destination_cache: 不可达目标的负缓存
+        analytics: 目标和客户端流量热点统计(固定内存，按5分钟窗口切换)
         logger: 日志记录器
     """
+    # 通道打开失败原因(RFC 4254)到SOCKS5应答码的映射
+    OPEN_FAILURE_REPLIES = {
+        1: Socks5.NOT_ALLOWED,  # administratively prohibited
+        2: Socks5.CONNECTION_REFUSED,  # connect failed
+        3: Socks5.COMMAND_NOT_SUPPORTED,  # unknown channel type
+        4: Socks5.GENERAL_FAILURE,  # resource shortage
+    }
+    # 只有目标本身不可达的失败原因记入负缓存；administratively prohibited和resource shortage
+    # 常由服务器的MaxSessions/通道数上限引起，属于传输通道容量问题
+    CACHED_OPEN_FAILURES = frozenset({2})
+    # SOCKS5协商和通道打开在工作线程中进行，并发请求由TransportManager按通道上限排队
+    connect_in_worker = True
+
     def __init__(self, config: ForwardConfig | tuple,
                  socket_manager: SocketManager = None,
                  transport_manager: TransportManager = None,
@@ -39,15 +61,25 @@ class DynamicForwarder(Forwarder):
             socket_manager: 可选的套接字管理对象
             transport_manager: 可选的SSH传输管理对象
             thread_pool_executor: 可选的线程池执行器
+
+        Raises:
+            ValueError: 配置了多条SSH路径
         """
         super().__init__(thread_pool_executor)
-        if not isinstance(config, ForwardConfig):
-            self.config = ForwardConfig(*config)
+        self.config = config if isinstance(config, ForwardConfig) else ForwardConfig(*config)
+        if len(self.config.ssh_paths) > 1:
+            raise ValueError('DynamicForwarder只支持一条SSH路径，多路径只用于LocalForwarder')
         self.socket_manager = ResourceAgent(SocketManager, socket_manager).init()
         self.transport_manager = ResourceAgent(TransportManager, transport_manager).init()
 
-        self.transport = self.transport_manager.get(self.config.ssh_config)
+        # lazy模式下传输通道在第一个连接到来时才建立
+        self.transport = None if self.config.ssh_config.lazy else self.transport_manager.get(self.config.ssh_config)
+        if self.config.ssh_config.compression == 'adaptive':
+            self.compression_advisor = CompressionAdvisor()
         self.local_socket = self.socket_manager.get((self.config.local_port, self.config.local_host))
+        self.destination_cache = DestinationCache()
+        self._negotiated = {}  # 挂起连接 -> (Socks5, 目标地址)
+        self.analytics = TrafficAnalytics()
 
         self.logger = logging.getLogger(f"DynamicForwarder[{'%s:%s'%self.local_socket.getsockname()} <--> {self.config.ssh_config} <--> *]")
 
@@ -63,34 +95,105 @@ class DynamicForwarder(Forwarder):
         connection, address = self.local_socket.accept()
         return connection, address
 
-    def _to(self, _from):
+    def _to(self, _from, trace=None):
         """
         建立到动态目标的连接
         
-        通过SOCKS5协议解析目标地址并建立SSH通道连接。
+        通过SOCKS5协议解析目标地址并建立SSH通道连接，连接结果确定后再向客户端应答。
+        目标被SSH服务器拒绝(或处于负缓存期)时直接应答错误码，不视为转发失败。
+        传输通道断开或尚未建立(lazy)时保存协商结果并抛出TransportUnavailable，由基类挂起该连接。
         
         Args:
             _from: 本地连接对象
+            trace: 可选的连接生命周期记录
             
         Returns:
-            tuple: (SSH通道对象, 目标地址)
-        """
-        to_addr = Socks5(_from).destination()
-        channel = self.transport.open_channel(
-            kind='direct-tcpip',
-            src_addr=_from.getpeername(),
-            dest_addr=to_addr,
-            timeout=5
-        )
+            tuple: (SSH通道对象, 目标地址)，目标被拒绝时通道对象为None
+
+        Raises:
+            TransportUnavailable: 传输通道已断开或尚未建立
+        """
+        negotiated = self._negotiated.pop(_from, None)
+        if negotiated is None:
+            socks5 = Socks5(_from)
+            to_addr = socks5.destination()
+            if trace is not None:
+                trace.negotiated = monotonic()
+                trace.destination, trace.via = to_addr, str(self.config.ssh_config)
+            if to_addr[0] is None: return None, to_addr
+        else:
+            socks5, to_addr = negotiated
+        code = self.destination_cache.get(to_addr)
+        if code is not None:
+            socks5.reply(code)
+            return None, to_addr
+        transport = self._placed_transport(self.config.ssh_config, to_addr) or self.transport
+        if transport is None:
+            self._negotiated[_from] = (socks5, to_addr)
+            raise TransportUnavailable(f'{self.config.ssh_config} 传输通道尚未建立')
+        if trace is not None: trace.open_requested = monotonic()
+        try:
+            channel = self.transport_manager.open_channel(
+                self.config.ssh_config,
+                kind='direct-tcpip',
+                src_addr=_from.getpeername(),
+                dest_addr=to_addr,
+                timeout=5,
+                transport=transport
+            )
+        except ChannelException as e:
+            code = self.OPEN_FAILURE_REPLIES.get(e.code, Socks5.GENERAL_FAILURE)
+            if e.code in self.CACHED_OPEN_FAILURES: self.destination_cache.failed(to_addr, code)
+            socks5.reply(code)
+            return None, to_addr
+        except Exception as e:
+            if not transport.is_active():
+                self._negotiated[_from] = (socks5, to_addr)
+                raise TransportUnavailable(f'{self.config.ssh_config} 传输通道已断开') from e
+            try:
+                socks5.reply(Socks5.GENERAL_FAILURE)
+            except OSError:
+                pass
+            raise
+        if trace is not None: trace.open_confirmed = monotonic()
+        self.destination_cache.succeeded(to_addr)
+        socks5.reply()
         return channel, to_addr
 
     def _forward_failed(self):
         """
         转发失败处理
         
-        当转发失败时重新获取SSH传输通道
+        在后台重建SSH传输通道，就绪后重放挂起的连接
+        """
+        self._reconnect(self.config.ssh_config)
+
+    def _connection_progress(self, f_a, t_a, nbytes):
+        """
+        转发过程中把新增流量计入热点统计，长连接的流量落在实际发生的窗口中
+        """
+        self.analytics.add(f_a, t_a, nbytes, connections=0)
+
+    def _connection_closed(self, f_a, t_a, bytes_up, bytes_down, reason):
+        """
+        连接结束时计入连接数(流量已由_connection_progress计入)
+        """
+        self.analytics.add(f_a, t_a, 0)
+
+    def _reject(self, f):
+        """
+        关闭无法转发的连接，已完成协商的连接先应答失败
+
+        Args:
+            f: 本地连接对象
         """
-        self.transport = self.transport_manager.get(self.config.ssh_config)
+        negotiated = self._negotiated.pop(f, None)
+        if negotiated is not None:
+            try:
+                negotiated[0].reply(Socks5.GENERAL_FAILURE)
+            except OSError:
+                pass
+        f.close()
 
     def close(self):
         """
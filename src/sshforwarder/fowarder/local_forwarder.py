@@ -2,14 +2,19 @@
 本地端口转发器实现模块
 
 该模块提供了LocalForwarder类，用于实现本地到远程的SSH端口转发功能。
+本地端和远程目标都可以是Unix域套接字(端口为None，主机为套接字路径)。
 """
 import logging
+import socket
+from concurrent.futures import wait, FIRST_COMPLETED
 from concurrent.futures.thread import ThreadPoolExecutor
+from time import monotonic
 
-from sshforwarder.config import ForwardConfig
+from sshforwarder.config import ForwardConfig, SocketConfig
 from sshforwarder.manager import SocketManager, TransportManager
-from sshforwarder.utils import ResourceAgent
-from .base import Forwarder
+from sshforwarder.utils import ResourceAgent, PathSelector, CompressionAdvisor, format_address, unix_path
+from sshforwarder.utils.streamlocal import DIRECT_STREAMLOCAL
+from .base import Forwarder, TransportUnavailable
 
 
 class LocalForwarder(Forwarder):
@@ -17,15 +22,20 @@ class LocalForwarder(Forwarder):
     本地端口转发器类
     
     继承自Forwarder基类，实现本地端口到远程主机的SSH隧道转发功能。
+    配置多条SSH路径时，每个新连接走近期通道建立延迟最低的健康路径，通道建立失败立即切换到下一条路径。
     
     Attributes:
         config: 转发配置对象
         socket_manager: 套接字管理对象
         transport_manager: SSH传输管理对象
-        transport: SSH传输通道
-        local_socket: 本地监听套接字
+        path_selector: SSH路径选择器
+        local_socket: 本地监听套接字(TCP或Unix域套接字)
+        remote_path: 远程Unix域套接字路径，远程目标为TCP地址时为None
         logger: 日志记录器
     """
+    # 通道在工作线程中打开：通道打开闸门排满时排队的是工作线程，接收循环继续接收其他客户端
+    connect_in_worker = True
+
     def __init__(self, config: ForwardConfig | tuple,
                  socket_manager: SocketManager = None,
                  transport_manager: TransportManager = None,
@@ -40,15 +50,22 @@ class LocalForwarder(Forwarder):
             thread_pool_executor: 可选的线程池执行器
         """
         super().__init__(thread_pool_executor)
-        if not isinstance(config, ForwardConfig):
-            self.config = ForwardConfig(*config)
+        self.config = config if isinstance(config, ForwardConfig) else ForwardConfig(*config)
         self.socket_manager = ResourceAgent(SocketManager, socket_manager).init()
         self.transport_manager = ResourceAgent(TransportManager, transport_manager).init()
 
-        self.transport = self.transport_manager.get(self.config.ssh_config)
-        self.local_socket = self.socket_manager.get((self.config.local_port, self.config.local_host))
+        self.path_selector = PathSelector(self.config.ssh_paths, self.config.path_weights)
+        if any(_.compression == 'adaptive' for _ in self.config.ssh_paths):
+            self.compression_advisor = CompressionAdvisor()
+        # 等待任意一条路径连通即可开始服务，其余路径在后台建立；lazy路径在第一个连接到来时才建立
+        futures = self._connect_paths()
+        if futures: wait(futures, return_when=FIRST_COMPLETED)
+        local_path = unix_path(self.config.local_host, self.config.local_port)
+        self.local_socket = self.socket_manager.get(
+            SocketConfig(None, local_path, socket.AF_UNIX) if local_path else (self.config.local_port, self.config.local_host))
+        self.remote_path = unix_path(self.config.remote_host, self.config.remote_port)
 
-        self.logger = logging.getLogger(f"LocalForwarder[{'%s:%s'%self.local_socket.getsockname()} <--> {self.config.ssh_config} <--> {self.config.remote_host}:{self.config.remote_port}]")
+        self.logger = logging.getLogger(f"LocalForwarder[{format_address(self.local_socket.getsockname())} <--> {'|'.join(map(str, self.config.ssh_paths))} <--> {format_address((self.config.remote_host, self.config.remote_port))}]")
 
         self.logger.info("Successfully initialized local forwarder")
 
@@ -62,32 +79,77 @@ class LocalForwarder(Forwarder):
         connection, address = self.local_socket.accept()
         return connection, address
 
-    def _to(self, _from):
+    def _connect_paths(self) -> list:
+        """
+        以非阻塞方式获取所有非lazy路径的SSH传输通道，失效的通道在后台重建
+
+        Returns:
+            list: 各路径传输通道的Future列表
+        """
+        return [self.transport_manager.get(ssh_config, block=False)
+                for ssh_config in self.config.ssh_paths if not ssh_config.lazy]
+
+    def _to(self, _from, trace=None):
         """
         建立到远程目标的连接
         
+        依次尝试路径选择器给出的路径，跳过传输通道尚未就绪的路径；远程目标为Unix域套接字时打开
+        direct-streamlocal@openssh.com通道，否则打开direct-tcpip通道；
+        没有可用的传输通道时抛出TransportUnavailable，由基类挂起该连接等待重连。
+        
         Args:
             _from: 本地连接对象
+            trace: 可选的连接生命周期记录
             
         Returns:
             tuple: (SSH通道对象, 远程目标地址)
+
+        Raises:
+            TransportUnavailable: 所有路径的传输通道都未就绪或已断开
         """
         to_addr = (self.config.remote_host, self.config.remote_port)
-        channel = self.transport.open_channel(
-            kind='direct-tcpip',
-            src_addr=_from.getpeername(),
-            dest_addr=to_addr,
-            timeout=5
-        )
-        return channel, to_addr
+        if trace is not None: trace.destination = to_addr
+        if self.remote_path:
+            kind, src_addr, dest_addr = DIRECT_STREAMLOCAL, None, self.remote_path
+        else:
+            # Unix域套接字的客户端没有地址，direct-tcpip的源地址用本机代替
+            peer = _from.getpeername()
+            kind, src_addr, dest_addr = 'direct-tcpip', peer if isinstance(peer, tuple) else ('127.0.0.1', 0), to_addr
+        error, active = None, False
+        for ssh_config in self.path_selector.order():
+            transport = self._placed_transport(ssh_config, to_addr)
+            if transport is None: continue
+            start = monotonic()
+            if trace is not None: trace.open_requested, trace.via = start, str(ssh_config)
+            try:
+                channel = self.transport_manager.open_channel(
+                    ssh_config,
+                    kind=kind,
+                    src_addr=src_addr,
+                    dest_addr=dest_addr,
+                    timeout=5,
+                    transport=transport
+                )
+            except Exception as e:
+                self.path_selector.failed(ssh_config)
+                self.logger.error(f'{ssh_config} 通道建立失败 ({e.__class__.__name__}: {e}), 切换路径')
+                error, active = e, active or transport.is_active()
+                continue
+            end = monotonic()
+            self.path_selector.succeeded(ssh_config, end - start)
+            if trace is not None: trace.open_confirmed = end
+            return channel, to_addr
+        if error is not None and active: raise error
+        raise TransportUnavailable('没有可用的SSH路径') from error
 
     def _forward_failed(self):
         """
         转发失败处理
         
-        当转发失败时重新获取SSH传输通道
+        在后台重建失效的SSH传输通道，不阻塞接收循环，任一路径就绪后重放挂起的连接
         """
-        self.transport = self.transport_manager.get(self.config.ssh_config)
+        for ssh_config in self.config.ssh_paths:
+            self._reconnect(ssh_config)
 
     def close(self):
         """
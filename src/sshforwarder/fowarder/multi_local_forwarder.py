@@ -0,0 +1,150 @@
+"""
+多端口本地转发器实现模块
+
+该模块提供了MultiLocalForwarder类，一个转发器同时监听一组本地端口(端口范围或映射列表)，
+用一个selector接收所有监听端口上的连接，共用一个SSH传输通道和一个线程池。
+"""
+import logging
+import selectors
+from collections import deque
+from concurrent.futures.thread import ThreadPoolExecutor
+from time import monotonic
+
+from sshforwarder.config import SSHConfig
+from sshforwarder.manager import SocketManager, TransportManager
+from sshforwarder.utils import ResourceAgent
+from .base import Forwarder, TransportUnavailable
+
+
+class MultiLocalForwarder(Forwarder):
+    """
+    多端口本地转发器类
+
+    相当于一组共用SSH传输通道和线程池的LocalForwarder，但只有一个接收循环。
+
+    Attributes:
+        ssh_config: SSH连接配置
+        routes (dict): 实际监听端口到远程目标地址的映射
+        socket_manager: 套接字管理对象
+        transport_manager: SSH传输管理对象
+        transport: SSH传输通道
+        local_sockets: 本地监听套接字列表
+        selector: 监听所有本地套接字的selector
+        logger: 日志记录器
+    """
+    # 所有监听端口共用一个接收循环，通道在工作线程中打开，慢速或排队的打开请求不阻塞其他端口的接收
+    connect_in_worker = True
+
+    def __init__(self, ssh_config: SSHConfig | tuple,
+                 mappings: list | range,
+                 remote_host: str = 'localhost',
+                 local_host: str = 'localhost',
+                 socket_manager: SocketManager = None,
+                 transport_manager: TransportManager = None,
+                 thread_pool_executor: ThreadPoolExecutor = None):
+        """
+        初始化多端口本地转发器
+
+        Args:
+            ssh_config: SSH连接配置对象或配置元组
+            mappings: 端口映射列表，元素为(local_port, remote_host, remote_port)，
+                或端口号/端口范围，表示转发到remote_host上的同一端口
+            remote_host: 映射只给出端口号时的远程主机地址，默认为'localhost'
+            local_host: 本地监听地址，默认为'localhost'
+            socket_manager: 可选的套接字管理对象
+            transport_manager: 可选的SSH传输管理对象
+            thread_pool_executor: 可选的线程池执行器
+        """
+        super().__init__(thread_pool_executor)
+        self.ssh_config = ssh_config if isinstance(ssh_config, SSHConfig) else SSHConfig(*ssh_config)
+        self.socket_manager = ResourceAgent(SocketManager, socket_manager).init()
+        self.transport_manager = ResourceAgent(TransportManager, transport_manager).init()
+
+        # lazy模式下传输通道在第一个连接到来时才建立
+        self.transport = None if self.ssh_config.lazy else self.transport_manager.get(self.ssh_config)
+
+        self.routes = {}
+        self.local_sockets = []
+        self.selector = selectors.DefaultSelector()
+        for mapping in mappings:
+            local_port, to_host, to_port = (mapping, remote_host, mapping) if isinstance(mapping, int) else mapping
+            local_socket = self.socket_manager.get((local_port, local_host))
+            self.routes[local_socket.getsockname()[1]] = (to_host, to_port)
+            self.local_sockets.append(local_socket)
+            self.selector.register(local_socket, selectors.EVENT_READ)
+        self._ready = deque()
+
+        ports = sorted(self.routes)
+        self.logger = logging.getLogger(
+            f"MultiLocalForwarder[{local_host}:{ports[0]}-{ports[-1]}({len(ports)}) <--> {self.ssh_config} <--> *]")
+
+        self.logger.info("Successfully initialized multi local forwarder")
+
+    def _from(self):
+        """
+        从任一监听端口获取本地连接
+
+        一次select可能返回多个就绪的监听套接字，依次接收。
+
+        Returns:
+            tuple: (连接对象, 客户端地址)，没有新连接时返回(None, None)
+        """
+        if not self._ready:
+            self._ready.extend(key.fileobj for key, _ in self.selector.select(timeout=1))
+            if not self._ready: return None, None
+        connection, address = self._ready.popleft().accept()
+        return connection, address
+
+    def _to(self, _from, trace=None):
+        """
+        按连接所在的本地端口建立到对应远程目标的连接
+
+        Args:
+            _from: 本地连接对象
+            trace: 可选的连接生命周期记录
+
+        Returns:
+            tuple: (SSH通道对象, 远程目标地址)
+
+        Raises:
+            TransportUnavailable: 传输通道已断开或尚未建立(lazy)
+        """
+        to_addr = self.routes[_from.getsockname()[1]]
+        transport = self._ready_transport(self.ssh_config) or self.transport
+        if transport is None: raise TransportUnavailable(f'{self.ssh_config} 传输通道尚未建立')
+        if trace is not None:
+            trace.destination, trace.via, trace.open_requested = to_addr, str(self.ssh_config), monotonic()
+        try:
+            channel = self.transport_manager.open_channel(
+                self.ssh_config,
+                kind='direct-tcpip',
+                src_addr=_from.getpeername(),
+                dest_addr=to_addr,
+                timeout=5,
+                transport=transport
+            )
+        except Exception as e:
+            if not transport.is_active():
+                raise TransportUnavailable(f'{self.ssh_config} 传输通道已断开') from e
+            raise
+        if trace is not None: trace.open_confirmed = monotonic()
+        return channel, to_addr
+
+    def _forward_failed(self):
+        """
+        转发失败处理
+
+        在后台重建SSH传输通道，就绪后重放挂起的连接
+        """
+        self._reconnect(self.ssh_config)
+
+    def close(self):
+        """
+        关闭转发器并释放所有资源
+        """
+        super().close()
+        self.selector.close()
+        for local_socket in self.local_sockets:
+            local_socket.close()
+        self.socket_manager.close()
+        self.transport_manager.close()
@@ -2,13 +2,17 @@
 远程端口转发器模块
 
 该模块实现了通过SSH隧道将远程主机端口转发到本地网络的功能。
+远程监听端和本地目标都可以是Unix域套接字(端口为None，主机为套接字路径)。
 """
 import logging
+import threading
 from concurrent.futures import ThreadPoolExecutor
+from queue import Empty
+from time import monotonic
 
-from sshforwarder.config import ForwardConfig
-from sshforwarder.manager import SocketManager, TransportManager
-from sshforwarder.utils import ResourceAgent
+from sshforwarder.config import ForwardConfig, UpstreamConfig
+from sshforwarder.manager import SocketManager, TransportManager, UpstreamPool
+from sshforwarder.utils import ResourceAgent, format_address, unix_path
 from .base import Forwarder
 
 
@@ -17,7 +21,10 @@ class RemoteForwarder(Forwarder):
     远程端口转发器类，负责建立和管理远程端口转发连接
     
     通过SSH隧道将远程主机的指定端口转发到本地网络。
+    本地目标可以是一个上游服务池，连接在工作线程中建立。
     """
+    connect_in_worker = True
+
     def __init__(self, config: ForwardConfig | tuple,
                  socket_manager: SocketManager = None,
                  transport_manager: TransportManager = None,
@@ -30,68 +37,126 @@ class RemoteForwarder(Forwarder):
             socket_manager: 可选的套接字管理对象
             transport_manager: 可选的SSH传输管理对象
             thread_pool_executor: 可选的线程池执行器
+
+        Raises:
+            ValueError: 配置了多条SSH路径
         """
         super().__init__(thread_pool_executor)
 
-        if not isinstance(config, ForwardConfig):
-            self.config = ForwardConfig(*config)
+        self.config = config if isinstance(config, ForwardConfig) else ForwardConfig(*config)
+        if len(self.config.ssh_paths) > 1:
+            raise ValueError('RemoteForwarder只支持一条SSH路径，多路径只用于LocalForwarder')
         self.socket_manager = ResourceAgent(SocketManager, socket_manager).init()
         self.transport_manager = ResourceAgent(TransportManager, transport_manager).init()
 
-        self.transport = self.transport_manager.get(self.config.ssh_config)
+        self._rebind_lock = threading.Lock()
+        self.dispatcher = self.transport_manager.dispatcher_manager.get(self.config.ssh_config)
+        self.transport = self.dispatcher.transport
+        self.upstream_pool = UpstreamPool(
+            self.config.upstream or UpstreamConfig([(self.config.local_host, self.config.local_port)]),
+            self.socket_manager)
 
+        local = format_address((self.config.local_host, self.config.local_port))
         self.logger = logging.getLogger(
-            f"RemoteForwarder[{self.config.local_host}:{self.config.local_port} <--> {self.config.ssh_config} <--> {self.config.remote_host}:{self.config.remote_port}]")
+            f"RemoteForwarder[{local} <--> {self.config.ssh_config} <--> {format_address((self.config.remote_host, self.config.remote_port))}]")
 
-        try:
-            new_port = self.transport.request_port_forward(self.config.remote_host, self.config.remote_port)
-        except Exception as e:
-            self.logger.error(f'绑定指定的远程端口失败 {e.__class__.__name__}: {e}')
-            new_port = self.transport.request_port_forward(self.config.remote_host, 0)
-            self.logger.error(f'随机绑定远程端口: {new_port}')
+        self.remote_port, self.channel_queue = self._request_port_forward()
 
         self.logger = logging.getLogger(
-            f"RemoteForwarder[{self.config.local_host}:{self.config.local_port} <--> {self.config.ssh_config} <--> {self.config.remote_host}:{new_port}]")
+            f"RemoteForwarder[{local} <--> {self.config.ssh_config} <--> {format_address((self.config.remote_host, self.remote_port))}]")
 
         self.logger.info("Successfully initialized remote forwarder")
 
+    def _request_port_forward(self, dispatcher=None):
+        """
+        通过分发器请求远程端口转发，指定端口不可用时随机绑定；远程Unix域套接字转发失败时直接抛出
+
+        Args:
+            dispatcher: 使用的分发器，默认为当前分发器
+
+        Returns:
+            tuple: (实际绑定的远程端口(Unix域套接字转发为None), 通道队列)
+        """
+        dispatcher = dispatcher or self.dispatcher
+        try:
+            return dispatcher.register(self.config.remote_host, self.config.remote_port)
+        except Exception as e:
+            if unix_path(self.config.remote_host, self.config.remote_port): raise
+            self.logger.error(f'绑定指定的远程端口失败 {e.__class__.__name__}: {e}')
+            new_port, queue = dispatcher.register(self.config.remote_host, 0)
+            self.logger.error(f'随机绑定远程端口: {new_port}')
+            return new_port, queue
+
     def _from(self):
         """
         获取来自远程端的连接
-        
+
+        通道由分发器按绑定端口投递到本转发器的队列中，无需轮询transport.accept。
+
         Returns:
             tuple: (connection, address) 连接对象和地址元组
+
+        Raises:
+            ConnectionError: 传输通道已失效
         """
-        connection, address = self.transport.accept(timeout=1), None
-        if connection: address = connection.origin_addr
-        return connection, address
+        try:
+            item = self.channel_queue.get(timeout=1)
+        except Empty:
+            if not self.transport.is_active():
+                raise ConnectionError(f'{self.config.ssh_config} 传输通道已断开')
+            return None, None
+        if item is None: return None, None
+        return item
 
-    def _to(self, _from):
+    def _to(self, _from, trace=None):
         """
-        建立到本地目标的连接
+        从上游服务池中选择本地目标并建立连接
         
         Args:
             _from: 来自远程端的连接对象
+            trace: 可选的连接生命周期记录
             
         Returns:
             tuple: (local_sock, to_addr) 本地套接字和目标地址
         """
-        local_sock = self.socket_manager.get()
-        to_addr = (self.config.local_host, self.config.local_port)
-        local_sock.connect(to_addr)
+        origin_addr = getattr(_from, 'origin_addr', None)
+        if trace is not None: trace.open_requested, trace.via = monotonic(), str(self.config.ssh_config)
+        local_sock, to_addr = self.upstream_pool.acquire(origin_addr[0] if origin_addr else None)
+        if trace is not None: trace.open_confirmed, trace.destination = monotonic(), to_addr
         return local_sock, to_addr
 
-    def _forward_failed(self):
+    def _connection_handler(self, f, f_a, t, t_a, trace=None):
         """
-        转发失败时的处理，重新获取传输对象
+        转发连接，结束后归还上游连接计数
         """
-        self.transport = self.transport_manager.get(self.config.ssh_config)
+        try:
+            super()._connection_handler(f, f_a, t, t_a, trace)
+        finally:
+            self.upstream_pool.release(t_a)
 
+    def _forward_failed(self):
+        """
+        转发失败时的处理，传输通道重建后在新通道上重新请求远程端口转发
+
+        可能由多个工作线程同时调用，加锁后重新比较分发器，保证每个新分发器只注册一次。
+        """
+        with self._rebind_lock:
+            dispatcher = self.transport_manager.dispatcher_manager.get(self.config.ssh_config)
+            if dispatcher is self.dispatcher: return
+            try:
+                self.remote_port, self.channel_queue = self._request_port_forward(dispatcher)
+            except Exception as e:
+                self.logger.error(f'重新请求远程端口转发失败 {e.__class__.__name__}: {e}')
+                return
+            self.dispatcher = dispatcher
+            self.transport = dispatcher.transport
 
     def close(self):
         """
         关闭所有资源，包括套接字和传输管理器
         """
         super().close()
+        self.dispatcher.unregister(self.config.remote_host, self.remote_port)
+        self.upstream_pool.close()
         self.socket_manager.close()
         self.transport_manager.close()
\ No newline at end of file
@@ -1,3 +1,7 @@
 from .socket_manager import SocketManager
+from .upstream_pool import UpstreamPool
+from .dispatcher_manager import DispatcherManager, RemoteForwardDispatcher
 from .transport_manager import TransportManager
-from .forwarder_manager import ForwarderManager
\ No newline at end of file
+from .forwarder_manager import ForwarderManager
+from .process_manager import ProcessForwarderManager
+from .mux_manager import MuxServer, MuxTransportManager
\ No newline at end of file
@@ -4,6 +4,7 @@
 提供线程安全的资源管理基础实现，支持泛型配置和资源类型。
 """
 import threading
+from concurrent.futures import Future
 from typing import TypeVar
 from abc import abstractmethod
 
@@ -15,46 +16,116 @@ class Manager:
     线程安全的资源管理器基类
     
     提供配置到资源的映射管理，确保线程安全的资源创建和访问。
+    同一配置的并发创建请求会被合并为一次进行中的创建(single-flight)，
+    所有等待者共享同一个创建结果或异常。
     
     Attributes:
         _kv: 配置到资源的映射字典
-        _lock_add_lock: 用于保护_create_locks字典的锁
-        _create_locks: 每个配置对应的资源创建锁
+        _lock_add_lock: 用于保护_creating字典的锁
+        _creating: 每个配置对应的进行中创建任务(Future)
     """
 
     def __init__(self):
         """初始化资源管理器"""
         self._kv = {}  # 配置到资源的映射
-        self._lock_add_lock = threading.Lock()  # 保护_create_locks字典的锁
-        self._create_locks = {}  # 每个配置对应的资源创建锁
+        self._lock_add_lock = threading.Lock()  # 保护_creating字典的锁
+        self._creating = {}  # 每个配置对应的进行中创建任务
 
-    def get(self, config: K = None) -> R:
+    def get(self, config: K = None, block: bool = True) -> R | Future:
         """
         获取或创建资源实例
         
         Args:
             config: 配置对象，如果为None则创建默认资源
+            block: 是否阻塞等待创建完成。为False时立即返回Future，
+                创建过程在后台线程中进行
             
         Returns:
-            与配置对应的资源实例
+            与配置对应的资源实例；block为False时返回解析为该实例的Future
+            
+        Raises:
+            Exception: 阻塞模式下，创建失败的异常会抛给所有等待者
             
         Note:
-            当配置对应的资源不存在时，会线程安全地创建新资源
+            当配置对应的资源不存在或失效时，同一时刻只会有一个创建过程，
+            其余调用者等待并共享其结果
         """
-        if config:
-            v = self._kv.get(config)
-            if v and self._validate(v):
-                return v
+        if not config:
+            return self._create(config) if block else self._submit(config)
+        v = self._kv.get(config)
+        if v and self._validate(v):
+            return v if block else self._resolved(v)
+        with self._lock_add_lock:
+            future = self._creating.get(config)
+            leader = future is None
+            if leader:
+                # 获取锁后再次检查，资源可能已由上一个创建者放入
+                v = self._kv.get(config)
+                if v and self._validate(v):
+                    return v if block else self._resolved(v)
+                future = self._creating[config] = Future()
+        if leader:
+            if block:
+                self._run_create(config, future)
             else:
-                _create_lock = None
-                with self._lock_add_lock:
-                    _create_lock = self._create_locks.setdefault(config, threading.Lock())
-                with _create_lock:
-                    instance = self._create(config)
-                    self._put(config, instance)
-                    return instance
+                threading.Thread(target=self._run_create, args=(config, future),
+                                 name=f"{self.__class__.__name__}.create", daemon=True).start()
+        return future.result() if block else future
+
+    def _run_create(self, config: K, future: Future):
+        """
+        内部方法：执行一次创建并将结果(或异常)发布给所有等待者
+        
+        Args:
+            config: 配置对象
+            future: 该配置对应的进行中创建任务
+        """
+        try:
+            instance = self._create(config)
+            self._put(config, instance)
+        except BaseException as e:
+            future.set_exception(e)
         else:
-            return self._create(config)
+            future.set_result(instance)
+        finally:
+            with self._lock_add_lock:
+                self._creating.pop(config, None)
+
+    def _submit(self, config: K) -> Future:
+        """
+        内部方法：在后台线程中创建不缓存的资源
+        
+        Args:
+            config: 配置对象
+            
+        Returns:
+            Future: 解析为新建资源的Future
+        """
+        future = Future()
+
+        def run():
+            try:
+                future.set_result(self._create(config))
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, name=f"{self.__class__.__name__}.create", daemon=True).start()
+        return future
+
+    @staticmethod
+    def _resolved(v: R) -> Future:
+        """
+        内部方法：将已有资源包装为已完成的Future
+        
+        Args:
+            v: 资源实例
+            
+        Returns:
+            Future: 已完成的Future
+        """
+        future = Future()
+        future.set_result(v)
+        return future
 
     def close(self):
         """
@@ -0,0 +1,236 @@
+"""
+通道打开限流模块
+
+提供ChannelGate类，限制单个SSH传输通道上同时进行中的通道打开请求数和通道总数(对应服务器的
+MaxSessions/MaxStartups)，超出上限的请求按先来先到的顺序排队，并统计排队等待时间。
+"""
+import threading
+import weakref
+from collections import deque
+from functools import partial
+from time import monotonic
+from typing import Callable
+
+from paramiko import Channel, Transport
+
+
+class ChannelGate:
+    """
+    单个传输通道的通道打开闸门
+
+    通道总数只统计经由闸门打开的通道：打开成功后由release登记，通道关闭时由传输通道的_unlink_channel
+    钩子(见attach)注销并唤醒排队者，排队者不轮询。paramiko以弱引用保存通道，未等到服务器关闭应答就被回收的
+    通道不会经过_unlink_channel，由回收时的finalize注销。
+
+    Attributes:
+        name (str): 传输通道名称(SSH配置字符串)
+        max_opening (int | None): 同时进行中的通道打开请求数上限
+        max_channels (int | None): 通道总数上限
+        opening (int): 进行中的通道打开请求数
+        waited (int): 经过排队的请求数
+        wait_total (float): 累计排队时间(秒)
+        wait_max (float): 最长排队时间(秒)
+        timeouts (int): 排队超时的请求数
+        idle_since (float | None): 没有通道和进行中的打开请求的起始时间，忙碌时为None
+        retired (bool): 闸门已停用(传输通道即将关闭)，不再发放名额
+    """
+    def __init__(self, name: str, max_opening: int = None, max_channels: int = None):
+        """
+        初始化闸门
+
+        Args:
+            name: 传输通道名称
+            max_opening: 同时进行中的通道打开请求数上限，None表示不限制
+            max_channels: 通道总数上限，None表示不限制
+        """
+        self.name = name
+        self.max_opening = max_opening
+        self.max_channels = max_channels
+        self.opening = 0
+        self.waited = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.timeouts = 0
+        self.idle_since = monotonic()
+        self.retired = False
+        self._channels = {}  # 通道编号 -> (标记, weakref.finalize)
+        self._version = 0
+        self._condition = threading.Condition()
+        self._waiters = deque()
+
+    def attach(self, transport: Transport):
+        """
+        在传输通道上安装通道关闭钩子，通道关闭(包括传输通道断开)时注销通道
+
+        Args:
+            transport: 该闸门对应的传输通道
+        """
+        transport._unlink_channel = partial(_unlink_channel, transport._unlink_channel, self)
+
+    def _has_room(self) -> bool:
+        if self.retired: return False
+        if self.max_opening is not None and self.opening >= self.max_opening:
+            return False
+        return self.max_channels is None or len(self._channels) + self.opening < self.max_channels
+
+    def _notify(self):
+        # 持有锁时调用
+        self._version += 1
+        self._condition.notify_all()
+
+    def _update_idle(self):
+        # 持有锁时调用
+        busy = self.opening or self._channels
+        if busy: self.idle_since = None
+        elif self.idle_since is None: self.idle_since = monotonic()
+
+    def try_acquire(self) -> bool:
+        """
+        不排队地尝试获取一个打开名额，已有排队者时不插队
+
+        Returns:
+            bool: 是否获得名额
+        """
+        with self._condition:
+            if self._waiters or not self._has_room(): return False
+            self.opening += 1
+            self._update_idle()
+            return True
+
+    def acquire(self, transport: Transport, timeout: float, spill: Callable[[], bool] = None) -> bool:
+        """
+        排队获取一个打开名额
+
+        Args:
+            transport: 该闸门对应的传输通道，断开时放弃排队
+            timeout: 最长等待时间(秒)
+            spill: 可选的分流回调，排在队首且本闸门没有名额时在锁外调用，返回True表示已在其他传输通道
+                获得名额；分流目标稍后才可能就绪时，回调应安排调用notify以便重试
+
+        Returns:
+            bool: 是否在超时前获得名额(或已分流)
+        """
+        start = monotonic()
+        token = object()
+        with self._condition:
+            self._waiters.append(token)
+        try:
+            while True:
+                with self._condition:
+                    head = self._waiters[0] is token
+                    if head and self._has_room():
+                        self.opening += 1
+                        self._update_idle()
+                        break
+                    remaining = start + timeout - monotonic()
+                    if remaining <= 0 or not transport.is_active():
+                        self.timeouts += 1
+                        return False
+                    if not head or spill is None:
+                        self._condition.wait(remaining)
+                        continue
+                    version = self._version
+                # 分流可能建立新的传输通道，不能持有本闸门的锁
+                if spill(): break
+                with self._condition:
+                    if self._version == version:
+                        self._condition.wait(remaining)
+        finally:
+            with self._condition:
+                self._waiters.remove(token)
+                self._notify()
+        with self._condition:
+            elapsed = monotonic() - start
+            self.waited += 1
+            self.wait_total += elapsed
+            self.wait_max = max(self.wait_max, elapsed)
+        return True
+
+    def release(self, channel: Channel = None):
+        """
+        归还打开名额(通道打开成功或失败后调用)
+
+        Args:
+            channel: 打开成功的通道，登记后计入通道总数直到关闭
+        """
+        with self._condition:
+            self.opening -= 1
+            # 通道在登记前已关闭时不再登记，避免计数泄漏
+            if channel is not None and not channel.closed:
+                chanid, token = channel.get_id(), object()
+                self._channels[chanid] = token, weakref.finalize(channel, self._collected, chanid, token)
+            self._update_idle()
+            self._notify()
+
+    def closed(self, chanid: int):
+        """
+        注销一个已关闭的通道
+
+        Args:
+            chanid: 通道编号
+        """
+        with self._condition:
+            entry = self._channels.pop(chanid, None)
+            if entry is None: return
+            entry[1].detach()
+            self._update_idle()
+            self._notify()
+
+    def _collected(self, chanid: int, token):
+        """
+        通道对象被回收，通道编号可能已被新通道复用，只注销同一次登记
+        """
+        with self._condition:
+            entry = self._channels.get(chanid)
+            if entry is None or entry[0] is not token: return
+            del self._channels[chanid]
+            self._update_idle()
+            self._notify()
+
+    def notify(self):
+        """
+        唤醒排队者重新检查名额和分流目标
+        """
+        with self._condition:
+            self._notify()
+
+    def retire(self, idle: float) -> bool:
+        """
+        闲置超过idle秒时停用闸门，之后不再发放名额
+
+        Args:
+            idle: 闲置时间(秒)
+
+        Returns:
+            bool: 是否已停用
+        """
+        with self._condition:
+            if not self.retired and self.idle_since is not None and not self._waiters \
+                    and monotonic() - self.idle_since >= idle:
+                self.retired = True
+            return self.retired
+
+    def stats(self) -> dict:
+        """
+        闸门统计
+
+        Returns:
+            dict: opening、channels、queued、waited、wait_avg、wait_max、timeouts
+        """
+        return {
+            'opening': self.opening,
+            'channels': len(self._channels),
+            'queued': len(self._waiters),
+            'waited': self.waited,
+            'wait_avg': self.wait_total / self.waited if self.waited else 0.0,
+            'wait_max': self.wait_max,
+            'timeouts': self.timeouts,
+        }
+
+
+def _unlink_channel(original, gate: ChannelGate, chanid: int):
+    """
+    Transport._unlink_channel钩子：通道从传输通道移除后通知闸门
+    """
+    original(chanid)
+    gate.closed(chanid)
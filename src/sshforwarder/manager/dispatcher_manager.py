@@ -0,0 +1,191 @@
+"""
+远程端口转发分发模块
+
+该模块提供RemoteForwardDispatcher和DispatcherManager类。同一SSH传输通道上的所有远程端口转发
+共用一个分发器：分发器通过request_port_forward注册回调，按绑定端口把每个forwarded-tcpip通道
+直接投递到所属转发器的队列中，避免多个转发器轮询同一个transport.accept互相抢占通道。
+端口为None时为远程Unix域套接字转发(streamlocal-forward@openssh.com)，按套接字路径投递。
+"""
+import logging
+from queue import Queue
+
+from paramiko import Channel, Transport
+
+from sshforwarder.config import SSHConfig
+from sshforwarder.utils import request_streamlocal_forward, cancel_streamlocal_forward
+from sshforwarder.utils.streamlocal import CANCEL_STREAMLOCAL_FORWARD
+from .base import Manager
+
+
+class RemoteForwardDispatcher:
+    """
+    单个SSH传输通道上的远程端口转发分发器
+
+    Attributes:
+        transport (Transport): 所属的SSH传输通道
+        logger (logging.Logger): 日志记录器
+        _routes (dict): 远程绑定端口(或Unix域套接字路径)到通道队列的映射
+    """
+    def __init__(self, transport: Transport):
+        """
+        初始化分发器
+
+        Args:
+            transport: SSH传输通道
+        """
+        self.transport = transport
+        self.logger = logging.getLogger("RemoteForwardDispatcher")
+        self._routes = {}
+
+    def register(self, address: str, port: int) -> tuple[int, Queue]:
+        """
+        请求远程端口转发并登记其通道队列
+
+        Args:
+            address: 远程绑定地址，port为None时为远程Unix域套接字路径
+            port: 远程绑定端口，0表示由服务器分配，None表示Unix域套接字转发
+
+        Returns:
+            tuple: (实际绑定的远程端口(Unix域套接字转发为None), 接收(通道, 来源地址)的队列)
+        """
+        queue = Queue()
+        key = address if port is None else port
+        # 先登记指定端口，避免请求成功后立即到达的通道找不到归属
+        if key: self._routes[key] = queue
+        try:
+            if port is None and isinstance(self.transport, Transport):
+                request_streamlocal_forward(self.transport, address, handler=self._dispatch)
+                new_port = None
+            else:
+                new_port = self.transport.request_port_forward(address, port, handler=self._dispatch)
+        except Exception:
+            if key: self._routes.pop(key, None)
+            raise
+        self._routes[address if new_port is None else new_port] = queue
+        return new_port, queue
+
+    def unregister(self, address: str, port: int):
+        """
+        取消远程端口转发
+
+        不使用Transport.cancel_port_forward，因为它会清除整个传输通道共用的回调。
+
+        Args:
+            address: 远程绑定地址或Unix域套接字路径
+            port: 远程绑定端口，None表示Unix域套接字转发
+        """
+        queue = self._routes.pop(address if port is None else port, None)
+        if queue is not None: queue.put(None)
+        if self.transport.is_active():
+            try:
+                if port is None and isinstance(self.transport, Transport):
+                    cancel_streamlocal_forward(self.transport, address)
+                elif port is None:
+                    self.transport.global_request(CANCEL_STREAMLOCAL_FORWARD, (address,), wait=True)
+                else:
+                    self.transport.global_request("cancel-tcpip-forward", (address, port), wait=True)
+            except Exception as e:
+                self.logger.debug(f'{e.__class__.__name__}: {e}')
+
+    def _dispatch(self, channel: Channel, origin: tuple, server: tuple):
+        """
+        paramiko回调：按绑定端口(Unix域套接字转发按套接字路径)投递新通道
+
+        Args:
+            channel: 新的forwarded-tcpip或forwarded-streamlocal@openssh.com通道
+            origin: 来源地址
+            server: 远程绑定地址，Unix域套接字转发为(套接字路径, None)
+        """
+        key = server[0] if server[1] is None else server[1]
+        queue = self._routes.get(key)
+        if queue is None:
+            self.logger.error(f'未知的远程绑定端口 {key}, 关闭通道')
+            channel.close()
+            return
+        queue.put((channel, origin))
+
+    def has_routes(self) -> bool:
+        """
+        是否还有登记中的远程端口转发
+
+        Returns:
+            bool: 有远程端口转发时为True
+        """
+        return bool(self._routes)
+
+    def close(self):
+        """
+        唤醒所有等待中的转发器
+        """
+        for queue in list(self._routes.values()):
+            queue.put(None)
+
+
+class DispatcherManager(Manager):
+    """
+    远程端口转发分发器管理器
+
+    按SSH配置管理分发器，分发器随传输通道失效而重建。
+
+    Attributes:
+        transport_manager: 提供SSH传输通道的管理器
+    """
+    def __init__(self, transport_manager: Manager):
+        """
+        初始化分发器管理器
+
+        Args:
+            transport_manager: 提供SSH传输通道的管理器
+        """
+        super().__init__()
+        self.transport_manager = transport_manager
+
+    def _validate(self, v: RemoteForwardDispatcher) -> bool:
+        """
+        验证分发器所属的传输通道是否仍然活跃
+
+        Args:
+            v: 分发器
+
+        Returns:
+            bool: 传输通道是否活跃
+        """
+        return v is not None and v.transport.is_active()
+
+    def _create(self, config: SSHConfig = None) -> RemoteForwardDispatcher:
+        """
+        在当前传输通道上创建分发器
+
+        Args:
+            config: SSH连接配置
+
+        Returns:
+            RemoteForwardDispatcher: 新的分发器
+        """
+        assert config is not None
+        return RemoteForwardDispatcher(self.transport_manager.get(config))
+
+    def has_routes(self, config: SSHConfig, transport: Transport = None) -> bool:
+        """
+        config对应的分发器上是否还有远程端口转发
+
+        Args:
+            config: SSH连接配置
+            transport: 可选，只统计属于该传输通道的分发器
+
+        Returns:
+            bool: 有远程端口转发时为True
+        """
+        dispatcher = self._kv.get(config)
+        if dispatcher is None: return False
+        if transport is not None and dispatcher.transport is not transport: return False
+        return dispatcher.has_routes()
+
+    def _close(self, v: RemoteForwardDispatcher):
+        """
+        关闭分发器
+
+        Args:
+            v: 分发器
+        """
+        v.close()
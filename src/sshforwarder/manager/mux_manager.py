@@ -0,0 +1,382 @@
+"""
+传输通道共享模块(类似OpenSSH ControlMaster)
+
+提供MuxServer、MuxTransport和MuxTransportManager类。一个进程运行MuxServer，持有所有SSH传输通道并在
+Unix域套接字上提供服务；其他进程使用MuxTransportManager代替TransportManager，通道和远程端口转发都
+由MuxServer在已建立的传输通道上完成，新进程无需自己握手即可开始转发。
+
+协议(SOCK_SEQPACKET，每个报文为一个JSON对象，每个请求使用一个新连接):
+    {"op": "hello", "host": 主机}  等待主机的传输通道就绪，应答后连接保持打开，传输通道断开时服务端关闭连接
+    {"op": "open", "host": 主机, "kind", "src", "dest", "timeout"}  打开通道，成功应答附带套接字fd，
+        服务端在通道和该套接字之间转发数据；失败应答包含code(通道打开失败原因)。
+        direct-streamlocal@openssh.com通道的dest为远程Unix域套接字路径
+    {"op": "forward", "host": 主机, "address", "port"}  请求远程端口转发，应答包含实际绑定端口，
+        之后每个新通道以 {"origin", "server"} 报文附带套接字fd发送；客户端关闭连接即取消转发。
+        port为null时为远程Unix域套接字转发，address为套接字路径
+    主机为 {"ip", "user", "port", "compression", "lane"}，私钥只保存在MuxServer中。
+应答为 {"ok": true, ...} 或 {"ok": false, "error": 错误信息}。
+
+经由MuxServer的连接不使用转发器的写入合并(Forwarder.coalesce_bytes)：客户端的转发目标是本地套接字而不是
+SSH通道；MuxServer的splice每次把套接字上已到达的数据(最多64KB)一次写入通道，不等待后续数据。
+"""
+import json
+import logging
+import os
+import select
+import socket
+import threading
+from dataclasses import replace
+
+from paramiko import Transport, Channel, ChannelException
+
+from sshforwarder.config import SSHConfig
+from sshforwarder.utils.streamlocal import CANCEL_STREAMLOCAL_FORWARD
+from .socket_manager import SocketManager
+from .transport_manager import TransportManager
+
+MAX_MESSAGE = 65536
+
+
+def _send(sock: socket.socket, message: dict, fd: int = None):
+    data = json.dumps(message, default=str).encode()
+    if fd is None:
+        sock.send(data)
+    else:
+        socket.send_fds(sock, [data], [fd])
+
+
+def _recv(sock: socket.socket) -> tuple[dict | None, socket.socket | None]:
+    data, fds, _, _ = socket.recv_fds(sock, MAX_MESSAGE, 1)
+    if not data:
+        for fd in fds: os.close(fd)
+        return None, None
+    return json.loads(data), socket.socket(fileno=fds[0]) if fds else None
+
+
+def _address(address):
+    """
+    JSON解码后的地址：列表还原为元组，Unix域套接字路径等保持不变
+    """
+    return tuple(address) if isinstance(address, list) else address
+
+
+def _host(config: SSHConfig) -> dict:
+    return {'ip': config.ip, 'user': config.user, 'port': config.port,
+            'compression': config.compression, 'lane': config.lane}
+
+
+def splice(channel: Channel, sock: socket.socket):
+    """
+    在通道和套接字之间双向转发数据，任一端关闭即结束
+
+    Args:
+        channel: SSH通道
+        sock: 本地套接字
+    """
+    try:
+        while True:
+            r, _, _ = select.select([channel, sock], [], [], 30)
+            for src, dst in ((channel, sock), (sock, channel)):
+                if src in r:
+                    data = src.recv(65536)
+                    if not data: return
+                    dst.sendall(data)
+    except OSError:
+        pass
+    finally:
+        channel.close()
+        sock.close()
+
+
+class MuxServer:
+    """
+    传输通道共享服务端
+
+    Attributes:
+        path (str): Unix域套接字路径
+        transport_manager (TransportManager): 持有传输通道的管理器
+        configs (dict): (ip, user, port)到SSH配置的映射
+        exit_event (threading.Event): 退出事件
+        logger (logging.Logger): 日志记录器
+    """
+    def __init__(self, path: str, configs: list[SSHConfig | tuple], transport_manager: TransportManager = None):
+        """
+        初始化服务端并监听Unix域套接字(权限0600)
+
+        Args:
+            path: Unix域套接字路径，已存在时替换
+            configs: 允许客户端使用的SSH配置
+            transport_manager: 可选的SSH传输管理对象
+        """
+        self.path = path
+        self.transport_manager = transport_manager or TransportManager()
+        self.configs = {}
+        for config in configs:
+            config = config if isinstance(config, SSHConfig) else SSHConfig(*config)
+            self.configs[(config.ip, config.user, config.port)] = config
+        self.exit_event = threading.Event()
+        self.logger = logging.getLogger(f"MuxServer[{path}]")
+        if os.path.exists(path): os.unlink(path)
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        old_umask = os.umask(0o177)
+        try:
+            self.listener.bind(path)
+        finally:
+            os.umask(old_umask)
+        self.listener.listen(128)
+        self.listener.settimeout(1)
+
+    def _config(self, host: dict) -> SSHConfig:
+        """
+        按客户端给出的主机查找SSH配置
+
+        Raises:
+            KeyError: 主机未登记
+        """
+        config = self.configs[(host['ip'], host['user'], host['port'])]
+        return replace(config, compression=host.get('compression', config.compression), lane=host.get('lane', 0))
+
+    def serve(self):
+        """
+        服务循环，直到close被调用
+        """
+        self.logger.info("Mux server started")
+        while not self.exit_event.is_set():
+            try:
+                conn, _ = self.listener.accept()
+            except (TimeoutError, socket.timeout):
+                continue
+            except OSError:
+                break
+            threading.Thread(target=self._handle, args=(conn,), name="MuxServer.client", daemon=True).start()
+
+    def _handle(self, conn: socket.socket):
+        """
+        处理一个客户端请求
+        """
+        try:
+            request, _ = _recv(conn)
+            if request is None: return
+            config = self._config(request['host'])
+            handler = getattr(self, f"_op_{request['op']}")
+            handler(conn, config, request)
+        except ChannelException as e:
+            self._reply_error(conn, e, code=e.code)
+        except Exception as e:
+            self._reply_error(conn, e)
+        finally:
+            conn.close()
+
+    def _reply_error(self, conn: socket.socket, e: Exception, **extra):
+        self.logger.debug(f'{e.__class__.__name__}: {e}')
+        try:
+            _send(conn, {'ok': False, 'error': f'{e.__class__.__name__}: {e}', **extra})
+        except OSError:
+            pass
+
+    def _op_hello(self, conn: socket.socket, config: SSHConfig, request: dict):
+        transport = self.transport_manager.get(config)
+        _send(conn, {'ok': True})
+        while transport.is_active() and not self.exit_event.is_set():
+            r, _, _ = select.select([conn], [], [], 1)
+            if r and not conn.recv(1): break
+
+    def _op_open(self, conn: socket.socket, config: SSHConfig, request: dict):
+        channel = self.transport_manager.open_channel(
+            config, request['kind'], _address(request['src']), _address(request['dest']), request.get('timeout', 5))
+        local, remote = socket.socketpair()
+        try:
+            _send(conn, {'ok': True}, remote.fileno())
+        except OSError:
+            channel.close()
+            local.close()
+            raise
+        finally:
+            remote.close()
+        splice(channel, local)
+
+    def _op_forward(self, conn: socket.socket, config: SSHConfig, request: dict):
+        dispatcher = self.transport_manager.dispatcher_manager.get(config)
+        port, queue = dispatcher.register(request['address'], request['port'])
+        try:
+            _send(conn, {'ok': True, 'port': port})
+            while dispatcher.transport.is_active() and not self.exit_event.is_set():
+                r, _, _ = select.select([conn], [], [], 0)
+                if r and not conn.recv(1): break
+                try:
+                    item = queue.get(timeout=1)
+                except Exception:
+                    continue
+                if item is None: break
+                channel, origin = item
+                local, remote = socket.socketpair()
+                try:
+                    _send(conn, {'origin': origin, 'server': (request['address'], port)}, remote.fileno())
+                except OSError:
+                    channel.close()
+                    local.close()
+                    break
+                finally:
+                    remote.close()
+                threading.Thread(target=splice, args=(channel, local), name="MuxServer.splice", daemon=True).start()
+        finally:
+            dispatcher.unregister(request['address'], port)
+
+    def close(self):
+        """
+        停止服务并关闭所有传输通道
+        """
+        self.exit_event.set()
+        self.listener.close()
+        if os.path.exists(self.path): os.unlink(self.path)
+        self.transport_manager.close()
+
+
+class MuxTransport:
+    """
+    客户端的传输通道代理，提供转发器用到的Transport接口
+
+    Attributes:
+        path (str): MuxServer的Unix域套接字路径
+        config (SSHConfig): SSH连接配置
+    """
+    def __init__(self, path: str, config: SSHConfig):
+        """
+        连接MuxServer并等待主机的传输通道就绪
+
+        Args:
+            path: MuxServer的Unix域套接字路径
+            config: SSH连接配置
+
+        Raises:
+            ConnectionError: MuxServer拒绝或传输通道建立失败
+        """
+        self.path = path
+        self.config = config
+        self._forwards = {}
+        self._session = self._request({'op': 'hello'})[0]
+
+    def _request(self, request: dict) -> tuple[socket.socket, dict, socket.socket | None]:
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        try:
+            conn.connect(self.path)
+            _send(conn, {**request, 'host': _host(self.config)})
+            reply, fd_sock = _recv(conn)
+        except Exception:
+            conn.close()
+            raise
+        if reply is None or not reply.get('ok'):
+            conn.close()
+            error = reply.get('error') if reply else 'MuxServer 关闭了连接'
+            if reply and reply.get('code') is not None:
+                raise ChannelException(reply['code'], error)
+            raise ConnectionError(f'{self.config}: {error}')
+        return conn, reply, fd_sock
+
+    def is_active(self) -> bool:
+        """
+        MuxServer上的传输通道是否仍然活跃
+        """
+        try:
+            r, _, _ = select.select([self._session], [], [], 0)
+        except (OSError, ValueError):
+            return False
+        return not r
+
+    def open_channel(self, kind: str, dest_addr=None, src_addr=None, timeout: float = None, **kwargs) -> socket.socket:
+        """
+        通过MuxServer打开通道
+
+        Returns:
+            socket.socket: 与通道相连的本地套接字
+
+        Raises:
+            ChannelException: 服务器拒绝打开通道
+        """
+        conn, _, sock = self._request({'op': 'open', 'kind': kind, 'src': src_addr, 'dest': dest_addr,
+                                       'timeout': timeout or 5})
+        conn.close()
+        return sock
+
+    def request_port_forward(self, address: str, port: int, handler=None) -> int:
+        """
+        通过MuxServer请求远程端口转发，新通道以本地套接字的形式交给handler
+
+        Args:
+            address: 远程绑定地址，port为None时为远程Unix域套接字路径
+            port: 远程绑定端口，None表示Unix域套接字转发
+            handler: 回调 handler(套接字, 来源地址, 远程绑定地址)
+
+        Returns:
+            int | None: 实际绑定的远程端口，Unix域套接字转发为None
+        """
+        conn, reply, _ = self._request({'op': 'forward', 'address': address, 'port': port})
+        self._forwards[address if reply['port'] is None else reply['port']] = conn
+
+        def receive():
+            try:
+                while True:
+                    message, sock = _recv(conn)
+                    if message is None: break
+                    if sock is not None: handler(sock, _address(message['origin']), _address(message['server']))
+            except OSError:
+                pass
+            finally:
+                conn.close()
+
+        threading.Thread(target=receive, name="MuxTransport.forward", daemon=True).start()
+        return reply['port']
+
+    def global_request(self, kind: str, data=None, wait: bool = True):
+        """
+        只支持cancel-tcpip-forward和cancel-streamlocal-forward@openssh.com：关闭对应的远程转发连接
+        """
+        if kind in ('cancel-tcpip-forward', CANCEL_STREAMLOCAL_FORWARD):
+            conn = self._forwards.pop(data[1] if kind == 'cancel-tcpip-forward' else data[0], None)
+            if conn is not None: conn.shutdown(socket.SHUT_RDWR)
+
+    def close(self):
+        """
+        断开与MuxServer的连接，传输通道仍由MuxServer持有
+        """
+        for conn in list(self._forwards.values()):
+            conn.shutdown(socket.SHUT_RDWR)
+        self._forwards.clear()
+        self._session.close()
+
+
+class MuxTransportManager(TransportManager):
+    """
+    使用MuxServer传输通道的传输管理器，可直接替换TransportManager传给各转发器
+
+    通道上限和分流由MuxServer按其配置处理；open_channel返回本地套接字，转发器的写入合并对其不生效。
+
+    Attributes:
+        path (str): MuxServer的Unix域套接字路径
+    """
+    def __init__(self, path: str, socket_manager: SocketManager = None):
+        """
+        初始化传输管理器
+
+        Args:
+            path: MuxServer的Unix域套接字路径
+            socket_manager: 可选的套接字管理对象
+        """
+        super().__init__(socket_manager)
+        self.path = path
+        self.logger = logging.getLogger(f"MuxTransportManager[{path}]")
+
+    def _create(self, config: SSHConfig = None) -> MuxTransport:
+        """
+        连接MuxServer获取传输通道代理
+        """
+        assert config is not None
+        return MuxTransport(self.path, config)
+
+    def open_channel(self, config: SSHConfig, kind: str, src_addr, dest_addr,
+                     timeout: float = 5, transport: MuxTransport = None) -> socket.socket:
+        """
+        通过MuxServer打开通道
+        """
+        transport = transport or self.get(config)
+        return transport.open_channel(kind=kind, src_addr=src_addr, dest_addr=dest_addr, timeout=timeout)
@@ -0,0 +1,307 @@
+"""
+多进程转发管理模块
+
+paramiko在GIL下用Python完成报文加解密，单进程最多用满约一个CPU核。该模块提供ProcessForwarderManager类：
+接收进程持有所有监听套接字，把接入的客户端文件描述符通过Unix域套接字(SCM_RIGHTS)交给工作进程，
+每个工作进程拥有自己的SSH传输通道和转发循环。接收进程同时负责监控并重启退出的工作进程。
+
+仅适用于有本地监听端口的转发器(LocalForwarder、DynamicForwarder)；依赖fork启动方式和SOCK_SEQPACKET(Linux)。
+"""
+import logging
+import multiprocessing
+import os
+import selectors
+import socket
+import struct
+import threading
+import zlib
+from queue import Queue, Empty
+
+from sshforwarder.config import ForwardConfig
+from .socket_manager import SocketManager
+from .transport_manager import TransportManager
+from .forwarder_manager import ForwarderManager
+
+
+class FdListener:
+    """
+    工作进程中代替监听套接字的对象
+
+    accept()返回接收进程转交过来的客户端连接，其余接口与监听套接字一致。
+
+    Attributes:
+        address (tuple): 接收进程中监听套接字的地址
+        queue (Queue): 转交过来的客户端连接队列
+    """
+    def __init__(self, address: tuple):
+        self.address = address
+        self.queue = Queue()
+
+    def accept(self) -> tuple[socket.socket, tuple]:
+        """
+        获取一个转交过来的客户端连接
+
+        Returns:
+            tuple: (连接对象, 客户端地址)
+
+        Raises:
+            TimeoutError: 1秒内没有新连接
+        """
+        try:
+            connection = self.queue.get(timeout=1)
+        except Empty:
+            raise TimeoutError()
+        return connection, connection.getpeername()
+
+    def getsockname(self) -> tuple:
+        return self.address
+
+    def close(self):
+        pass
+
+
+class FdSocketManager(SocketManager):
+    """
+    工作进程使用的套接字管理器，监听请求返回FdListener而不绑定端口
+
+    Attributes:
+        listener (FdListener): 该转发器对应的FdListener
+    """
+    def __init__(self, listener: FdListener):
+        super().__init__()
+        self.listener = listener
+
+    def _create(self, config=None):
+        if config is not None:
+            return self.listener
+        return super()._create(config)
+
+
+class ForwarderSpec:
+    """
+    一个转发器的描述
+
+    Attributes:
+        forwarder_class (type): 转发器类
+        config: 转发配置对象
+        listener (socket.socket): 接收进程中的监听套接字
+        address (tuple): 监听套接字的地址
+        placement_key (int): 按SSH主机计算的稳定哈希
+    """
+    __slots__ = ('forwarder_class', 'config', 'listener', 'address', 'placement_key')
+
+    def __init__(self, forwarder_class: type, config, listener: socket.socket):
+        self.forwarder_class = forwarder_class
+        self.config = config
+        self.listener = listener
+        self.address = listener.getsockname()
+        self.placement_key = zlib.crc32(str(config.ssh_config).encode())
+
+
+class ProcessForwarderManager:
+    """
+    多进程转发管理器
+
+    放置策略:
+        'host': 同一SSH主机的转发器固定在同一个工作进程，每个主机只建立一次SSH连接
+        'hash': 每个工作进程都运行所有转发器，连接按客户端地址哈希分配，适合单个热点主机
+
+    Attributes:
+        workers (int): 工作进程数
+        placement (str): 放置策略
+        socket_manager (SocketManager): 接收进程的套接字管理对象
+        dropped (int): 因工作进程来不及接收(发送缓冲区已满)而关闭的连接数
+        exit_event (threading.Event): 退出事件
+        logger (logging.Logger): 日志记录器
+    """
+    def __init__(self, workers: int = None, placement: str = 'host'):
+        """
+        初始化多进程转发管理器
+
+        Args:
+            workers: 工作进程数，默认为CPU核数
+            placement: 放置策略 'host' | 'hash'
+        """
+        assert placement in ('host', 'hash'), f'不支持的放置策略: {placement}'
+        self.workers = workers or os.cpu_count()
+        self.placement = placement
+        self.socket_manager = SocketManager()
+        self.dropped = 0
+        self.exit_event = threading.Event()
+        self.logger = logging.getLogger("ProcessForwarderManager")
+        self._context = multiprocessing.get_context('fork')
+        self._specs = []
+        self._processes = [None] * self.workers
+        self._channels = [None] * self.workers
+        self._selector = selectors.DefaultSelector()
+
+    def add(self, forwarder_class: type, config):
+        """
+        添加一个转发器并在接收进程中绑定其监听端口，必须在start之前调用
+
+        Args:
+            forwarder_class: 转发器类
+            config: 转发配置对象或配置元组
+        """
+        config = config if isinstance(config, ForwardConfig) else ForwardConfig(*config)
+        listener = self.socket_manager.get((config.local_port, config.local_host))
+        spec = ForwarderSpec(forwarder_class, config, listener)
+        self._selector.register(listener, selectors.EVENT_READ, len(self._specs))
+        self._specs.append(spec)
+        self.logger.info(f"{forwarder_class.__name__}[{'%s:%s' % spec.address} <--> {config.ssh_config}]")
+
+    def _spawn(self, index: int):
+        """
+        启动(或重启)一个工作进程
+
+        Args:
+            index: 工作进程编号
+        """
+        if self._channels[index] is not None: self._channels[index].close()
+        parent_sock, child_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        process = self._context.Process(target=self._worker_main, args=(index, child_sock),
+                                         name=f'ForwarderWorker-{index}', daemon=True)
+        process.start()
+        child_sock.close()
+        # 工作进程繁忙或卡住时不能阻塞接收循环，发送缓冲区已满的连接直接关闭
+        parent_sock.setblocking(False)
+        self._processes[index] = process
+        self._channels[index] = parent_sock
+
+    def _worker_of(self, spec_index: int, client_addr) -> int:
+        """
+        计算连接应交给哪个工作进程
+
+        Args:
+            spec_index: 转发器编号
+            client_addr: 客户端地址
+
+        Returns:
+            int: 工作进程编号
+        """
+        if self.placement == 'host':
+            return self._specs[spec_index].placement_key % self.workers
+        return zlib.crc32(str(client_addr[0]).encode()) % self.workers
+
+    def _assigned_workers(self) -> set:
+        """
+        有转发器可运行的工作进程编号
+
+        Returns:
+            set: 'hash'策略下为全部工作进程，'host'策略下为分配到SSH主机的工作进程
+        """
+        if self.placement == 'hash': return set(range(self.workers))
+        return {spec.placement_key % self.workers for spec in self._specs}
+
+    def _worker_main(self, index: int, channel: socket.socket):
+        """
+        工作进程入口
+
+        先开始接收转交过来的客户端连接，再在后台线程中构建分配给本进程的转发器(构建时可能阻塞在SSH连接上)，
+        接收到的连接在转发器就绪前暂存在FdListener中；接收进程退出时随之退出。
+
+        Args:
+            index: 工作进程编号
+            channel: 与接收进程通信的Unix域套接字
+        """
+        for spec in self._specs: spec.listener.close()
+        for sock in self._channels:
+            if sock is not None: sock.close()
+        transport_manager = TransportManager()
+        forwarder_manager = ForwarderManager()
+        listeners = {i: FdListener(spec.address) for i, spec in enumerate(self._specs)
+                     if self.placement == 'hash' or spec.placement_key % self.workers == index}
+
+        def build():
+            for i, listener in listeners.items():
+                spec = self._specs[i]
+                try:
+                    forwarder_manager.get(spec.forwarder_class(spec.config, FdSocketManager(listener), transport_manager))
+                except Exception as e:
+                    self.logger.error(f'工作进程 {index} 构建转发器失败 ({e.__class__.__name__}: {e})')
+
+        threading.Thread(target=build, name=f'ForwarderWorker-{index}.build', daemon=True).start()
+        try:
+            while True:
+                msg, fds, _, _ = socket.recv_fds(channel, 4, 1)
+                if not msg: break
+                spec_index, = struct.unpack('!I', msg)
+                connection = socket.socket(fileno=fds[0])
+                if spec_index in listeners:
+                    listeners[spec_index].queue.put(connection)
+                else:
+                    connection.close()
+        finally:
+            forwarder_manager.close()
+            transport_manager.close()
+            os._exit(0)
+
+    def start(self):
+        """
+        启动所有工作进程
+
+        'host'策略下没有分配到SSH主机的工作进程不会启动(工作进程数多于主机数或主机哈希冲突)，并输出警告。
+        """
+        assigned = self._assigned_workers()
+        if len(assigned) < self.workers:
+            self.logger.warning(f"'host'放置策略下 {self.workers - len(assigned)}/{self.workers} 个工作进程"
+                                f"没有分配到SSH主机，不启动；单个热点主机请使用'hash'策略")
+        for index in sorted(assigned):
+            self._spawn(index)
+
+    def wait(self):
+        """
+        接收循环
+
+        接收客户端连接并转交给工作进程，同时监控并重启退出的工作进程，直到close被调用。
+        """
+        while not self.exit_event.is_set():
+            for index, process in enumerate(self._processes):
+                if process is not None and not process.is_alive():
+                    self.logger.error(f'工作进程 {index} 已退出 (exitcode={process.exitcode}), 重启...')
+                    self._spawn(index)
+            for key, _ in self._selector.select(timeout=1):
+                spec_index = key.data
+                try:
+                    connection, address = key.fileobj.accept()
+                except (BlockingIOError, TimeoutError):
+                    continue
+                self._handoff(self._worker_of(spec_index, address), spec_index, connection)
+
+    def _handoff(self, index: int, spec_index: int, connection: socket.socket) -> bool:
+        """
+        把客户端连接转交给工作进程，不阻塞
+
+        Args:
+            index: 工作进程编号
+            spec_index: 转发器编号
+            connection: 客户端连接，转交后在本进程中关闭
+
+        Returns:
+            bool: 是否转交成功，工作进程来不及接收时关闭连接并计入dropped
+        """
+        try:
+            socket.send_fds(self._channels[index], [struct.pack('!I', spec_index)], [connection.fileno()])
+            return True
+        except BlockingIOError:
+            self.dropped += 1
+            self.logger.warning(f'工作进程 {index} 来不及接收连接, 关闭连接 (累计 {self.dropped})')
+        except OSError as e:
+            self.logger.error(f'转交连接到工作进程 {index} 失败 ({e.__class__.__name__}: {e})')
+        finally:
+            connection.close()
+        return False
+
+    def close(self):
+        """
+        停止接收循环、关闭监听套接字并结束所有工作进程
+        """
+        self.exit_event.set()
+        self._selector.close()
+        self.socket_manager.close()
+        for channel in self._channels:
+            if channel is not None: channel.close()
+        for process in self._processes:
+            if process is not None:
+                process.join(5)
+                if process.is_alive(): process.terminate()
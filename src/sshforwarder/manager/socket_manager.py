@@ -4,7 +4,9 @@ Socket管理器模块
 提供socket创建、绑定、验证和关闭等操作的管理功能
 """
 import logging
+import os
 import socket
+import stat
 import threading
 
 from sshforwarder.config import SocketConfig
@@ -20,6 +22,7 @@ class SocketManager(Manager):
     Attributes:
         logger: 日志记录器
         exit_event: 线程退出事件
+        _unix_paths: 已绑定的Unix域套接字路径，关闭时删除
     """
     def __init__(self):
         """
@@ -30,13 +33,15 @@ class SocketManager(Manager):
         super().__init__()
         self.logger = logging.getLogger('SocketManager')
         self.exit_event = threading.Event()
+        self._unix_paths = []
 
     def _create(self, config: SocketConfig | tuple = None) -> socket.socket:
         """
         创建并配置socket
         
         Args:
-            config: Socket配置对象或元组，如果为None则使用默认配置
+            config: Socket配置对象或元组，如果为None则使用默认配置；
+                地址族为AF_UNIX时bind_address为监听的套接字路径
             
         Returns:
             socket.socket: 创建并配置好的socket对象
@@ -49,7 +54,11 @@ class SocketManager(Manager):
         port, host, family, type_, proto, timeout = config
         sock = socket.socket(family, type_, proto)
         sock.settimeout(timeout)
-        if port is not None and port > 0:
+        if family == socket.AF_UNIX:
+            if host:
+                self.bind_path(sock, host)
+                sock.listen(10)
+        elif port is not None and port > 0:
             self.bind_port(sock, port, host)
             sock.listen(10)
         return sock
@@ -83,6 +92,42 @@ class SocketManager(Manager):
         """
         v.close()
 
+    def close(self):
+        """
+        关闭所有socket并删除本管理器创建的Unix域套接字文件
+        """
+        super().close()
+        for path in self._unix_paths:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+        self._unix_paths.clear()
+
+    def bind_path(self, v: socket.socket, path: str):
+        """
+        绑定Unix域套接字到指定路径
+
+        路径上残留的套接字文件(没有进程在监听)会被删除后重新绑定。
+
+        Args:
+            v: AF_UNIX socket对象
+            path: 套接字路径
+
+        Raises:
+            OSError: 路径已被其他正在监听的套接字或非套接字文件占用
+        """
+        if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                try:
+                    probe.connect(path)
+                except OSError:
+                    self.logger.getChild('bind_path').info(f'删除残留的套接字文件 {path}')
+                    os.unlink(path)
+        v.bind(path)
+        self._unix_paths.append(path)
+        self.logger.getChild('bind_path').info(f'监听 {path}')
+
     def bind_port(self, v: socket.socket, port: int, host: str = 'localhost') -> int | None:
         """
         绑定socket到指定端口
@@ -6,13 +6,21 @@ SSH传输通道管理模块
 """
 import logging
 import threading
-from time import sleep
+import weakref
+from time import monotonic
+from typing import Callable
 
-from sshforwarder.config import SSHConfig
-from sshforwarder.utils import ResourceAgent
+from sshforwarder.config import SSHConfig, HandshakeProfile
+from sshforwarder.utils import ResourceAgent, default_dns_cache, happy_eyeballs_connect, open_streamlocal_channel
+from sshforwarder.utils.streamlocal import DIRECT_STREAMLOCAL
 from .base import Manager
-from paramiko import Transport
+from paramiko import Transport, Channel, PKey
 from .socket_manager import SocketManager
+from .dispatcher_manager import DispatcherManager
+from .channel_gate import ChannelGate
+
+# 私钥类型 -> 可用的认证签名算法
+_KEY_ALGORITHMS = {'ssh-rsa': ('rsa-sha2-512', 'rsa-sha2-256', 'ssh-rsa')}
 
 
 class TransportManager(Manager):
@@ -25,6 +33,13 @@ class TransportManager(Manager):
     Attributes:
         exit_event (threading.Event): 线程退出事件
         socket_manager (ResourceAgent[SocketManager]): 套接字管理代理
+        dispatcher_manager (DispatcherManager): 远程端口转发分发器管理器
+        dns_cache (DNSCache): 第一跳主机的地址缓存
+        connect_timeout (float): 第一跳TCP连接的超时时间(秒)
+        spilled (int): 因通道数达到上限而分流到其他同主机传输通道的请求数
+        handshake_timings (dict): SSH配置到最近一次成功握手各跳耗时的映射
+        released (int): 因空闲而释放的传输通道数(包括没有通道的分流传输通道)
+        lane_idle_timeout (float): 分流用的同主机传输通道(lane>0)没有通道后保留的时间(秒)，之后关闭
         logger (logging.Logger): 日志记录器
     """
     def __init__(self, socket_manager: SocketManager = None):
@@ -37,6 +52,19 @@ class TransportManager(Manager):
         super().__init__()
         self.exit_event = threading.Event()
         self.socket_manager = ResourceAgent(SocketManager, socket_manager).init()
+        self.dispatcher_manager = DispatcherManager(self)
+        self.dns_cache = default_dns_cache
+        self.connect_timeout = 5
+        self.spilled = 0
+        self.handshake_timings = {}
+        self.released = 0
+        self.lane_idle_timeout = 1
+        self._last_used = weakref.WeakKeyDictionary()  # 传输通道 -> 最近一次打开通道的时间
+        self._opening = weakref.WeakKeyDictionary()  # 传输通道 -> 进行中的open_channel数
+        self._released = weakref.WeakSet()
+        self._reaper = None
+        self._gates = weakref.WeakKeyDictionary()
+        self._gates_lock = threading.Lock()
         self.logger = logging.getLogger("TransportManager")
 
     def _validate(self, v: Transport) -> bool:
@@ -57,8 +85,8 @@ class TransportManager(Manager):
         
         该方法实现了通过跳板机链式建立SSH连接的完整流程：
         1. 构建连接链(本地->跳板机1->...->目标服务器)
-        2. 为每个节点创建TCP通道
-        3. 在每个节点上建立SSH传输层
+        2. 为每个节点创建TCP通道(第一跳解析全部地址并以Happy Eyeballs方式并行连接)
+        3. 在每个节点上建立SSH传输层(按节点的handshake_profile固定算法)，分别记录TCP、密钥交换和认证耗时
         4. 自动重试失败的连接
         
         连接过程可被exit_event安全终止，线程安全。
@@ -76,7 +104,8 @@ class TransportManager(Manager):
             
         Notes:
             - 保持连接活跃: 自动设置keepalive=30秒
-            - 错误处理: 连接失败会自动重试，间隔5秒
+            - 压缩: config.compression为True时在最后一跳启用zlib压缩
+            - 错误处理: 连接失败时关闭已建立的各跳传输通道和套接字，间隔5秒后重试
             - 线程安全: 可通过exit_event立即终止连接过程
         """
         assert config is not None
@@ -86,38 +115,343 @@ class TransportManager(Manager):
         connection_chain.append(config)
         create_retry = 0
         while not self.exit_event.is_set():
+            transport = None
+            timings = []
+            opened = []  # 本次尝试已完成握手的各跳传输通道，失败时逆序关闭
             try:
                 for jump_server in connection_chain:
                     j_ssh_server_ip = jump_server.ip
-                    j_ssh_user_name = jump_server.user
-                    j_private_key = jump_server.private_key
                     j_ssh_port = jump_server.port
+                    start = monotonic()
                     if transport:
                         sock = transport.open_channel(
                             kind='direct-tcpip',
                             src_addr=transport.getpeername(),
                             dest_addr=(j_ssh_server_ip, j_ssh_port))
                     else:
-                        sock = self.socket_manager.get()
-                        sock.connect((j_ssh_server_ip, j_ssh_port))
-                    transport = Transport(sock)
-                    transport.set_keepalive(30)
-                    transport.connect(username=j_ssh_user_name, pkey=j_private_key)
+                        sock = happy_eyeballs_connect(j_ssh_server_ip, j_ssh_port, timeout=self.connect_timeout,
+                                                      resolver=self.dns_cache, exit_event=self.exit_event)
+                    connected = monotonic()
+                    # 只在最后一跳压缩：外层跳板承载的是已加密的数据，压缩无收益
+                    transport, exchanged = self._handshake(sock, jump_server,
+                                                           jump_server is config and config.compression is True)
+                    opened.append(transport)
+                    authenticated = monotonic()
+                    timings.append({'host': str(jump_server), 'tcp': connected - start, 'kex': exchanged - connected,
+                                    'auth': authenticated - exchanged, 'total': authenticated - start})
+                self.handshake_timings[config] = timings
                 if create_retry > 0: self.logger.info(f"{config} 连接成功!")
                 return transport
             except Exception as e:
                 self.logger.error(f"{config} ssh 连接失败 ({e.__class__.__name__}: {e}), 5s 后重试...")
-                sleep(5)
+                self._close_chain(opened)
+                self.exit_event.wait(5)
                 create_retry += 1
         return None
 
+    def _handshake(self, sock, hop: SSHConfig, compression: bool) -> tuple[Transport, float]:
+        """
+        在一跳的TCP通道上完成SSH握手和公钥认证，任一阶段失败时关闭该跳的传输通道和TCP通道
+
+        Args:
+            sock: 该跳的TCP通道(第一跳为套接字，之后为上一跳的direct-tcpip通道)
+            hop: 该跳的SSH配置
+            compression: 是否启用zlib压缩
+
+        Returns:
+            tuple: (已认证的传输通道, 密钥交换完成的时间)
+        """
+        transport = Transport(sock)
+        try:
+            if hop.handshake_profile is not None:
+                transport.disabled_algorithms = self._disabled_algorithms(transport, hop.handshake_profile,
+                                                                          hop.private_key)
+            if compression: transport.use_compression(True)
+            transport.set_keepalive(30)
+            transport.start_client(timeout=self.connect_timeout * 3)
+            exchanged = monotonic()
+            transport.auth_publickey(hop.user, hop.private_key)
+        except BaseException:
+            transport.close()
+            sock.close()  # 未开始握手的传输通道不会关闭套接字
+            raise
+        return transport, exchanged
+
+    @staticmethod
+    def _close_chain(opened: list):
+        """
+        逆序关闭一次失败的连接尝试中已完成握手的各跳传输通道
+
+        Args:
+            opened: 按建立顺序排列的传输通道
+        """
+        for v in reversed(opened):
+            try:
+                v.close()
+            except Exception:
+                pass
+
+    @staticmethod
+    def _disabled_algorithms(transport: Transport, profile: HandshakeProfile, key: PKey) -> dict:
+        """
+        按握手配置计算传输通道的disabled_algorithms：每类算法只保留配置列出且paramiko支持的算法
+
+        配置的算法在该类中都不受支持时不禁用该类；认证签名算法中没有私钥可用的算法时不禁用签名算法，
+        避免认证失败。只固定签名算法可以避免RSA签名算法逐个回退。
+
+        Args:
+            transport: 尚未开始握手的传输通道
+            profile: 握手配置
+            key: 该跳的私钥
+
+        Returns:
+            dict: disabled_algorithms
+        """
+        available = {'kex': transport.preferred_kex, 'keys': transport.preferred_keys,
+                     'ciphers': transport.preferred_ciphers, 'macs': transport.preferred_macs,
+                     'pubkeys': transport.preferred_pubkeys}
+        wanted = {'kex': profile.kex, 'keys': profile.key_types, 'ciphers': profile.ciphers,
+                  'macs': profile.digests, 'pubkeys': profile.pubkeys}
+        usable = _KEY_ALGORITHMS.get(key.get_name(), (key.get_name(),)) if key is not None else ()
+        disabled = {}
+        for kind, names in wanted.items():
+            if not names or not set(names) & set(available[kind]): continue
+            if kind == 'pubkeys' and not set(names) & set(usable): continue
+            disabled[kind] = [_ for _ in available[kind] if _ not in names]
+        return disabled
+
+    def handshake_stats(self, config: SSHConfig = None) -> dict | list:
+        """
+        最近一次成功握手的各跳耗时
+
+        Args:
+            config: 可选的SSH配置，默认为全部
+
+        Returns:
+            list | dict: 各跳的 host、tcp、kex、auth、total(秒)；未指定配置时为配置字符串到该列表的映射
+        """
+        if config is not None: return self.handshake_timings.get(config, [])
+        return {str(k): v for k, v in list(self.handshake_timings.items())}
+
+    def _gate(self, transport: Transport, config: SSHConfig) -> ChannelGate:
+        """
+        获取传输通道对应的通道打开闸门
+
+        Args:
+            transport: 传输通道
+            config: 该传输通道的SSH配置
+
+        Returns:
+            ChannelGate: 通道打开闸门
+        """
+        gate = self._gates.get(transport)
+        if gate is None:
+            with self._gates_lock:
+                gate = self._gates.get(transport)
+                if gate is None:
+                    gate = self._gates[transport] = ChannelGate(str(config), config.max_opening, config.max_channels)
+                    gate.attach(transport)
+        return gate
+
+    def open_channel(self, config: SSHConfig, kind: str, src_addr, dest_addr,
+                     timeout: float = 5, transport: Transport = None) -> Channel:
+        """
+        在受限的传输通道上打开通道
+
+        按config.max_opening和config.max_channels限制每个传输通道上进行中的打开请求数和通道总数。
+        默认传输通道没有名额时依次尝试其他已就绪的同主机传输通道(最多config.max_lanes条，按需在后台建立，
+        没有通道后由回收线程关闭)，都没有名额时在默认传输通道上先来先到地排队。
+        打开期间传输通道登记为使用中，回收线程不会释放它；选定的传输通道已被释放时改用config对应的传输通道。
+
+        Args:
+            config: SSH连接配置
+            kind: 通道类型，direct-streamlocal@openssh.com时dest_addr为远程Unix域套接字路径
+            src_addr: 源地址
+            dest_addr: 目标地址
+            timeout: 排队和打开通道各自的超时时间(秒)
+            transport: 可选的已选定传输通道，默认为config对应的传输通道
+
+        Returns:
+            Channel: 打开的通道
+
+        Raises:
+            TimeoutError: 排队超时
+            paramiko.ChannelException: 服务器拒绝打开通道
+        """
+        transport = self._claim(config, transport)
+        used = transport
+        try:
+            if config.max_opening is None and config.max_channels is None:
+                return self._open(transport, kind, src_addr, dest_addr, timeout)
+            channel, used = self._open_gated(config, transport, kind, src_addr, dest_addr, timeout)
+            return channel
+        finally:
+            with self._lock_add_lock:
+                self._opening[transport] -= 1
+                self._last_used[transport] = self._last_used[used] = monotonic()
+
+    def _claim(self, config: SSHConfig, transport: Transport = None) -> Transport:
+        """
+        取得并登记用于打开通道的传输通道，与回收线程的空闲检查持有同一把锁
+
+        Args:
+            config: SSH连接配置
+            transport: 可选的已选定传输通道
+
+        Returns:
+            Transport: 已登记为使用中的传输通道
+        """
+        while True:
+            transport = transport or self.get(config)
+            with self._lock_add_lock:
+                if transport not in self._released:
+                    self._opening[transport] = self._opening.get(transport, 0) + 1
+                    return transport
+            transport = None
+
+    def _open_gated(self, config: SSHConfig, transport: Transport, kind: str, src_addr, dest_addr,
+                    timeout: float) -> tuple[Channel, Transport]:
+        """
+        经由通道打开闸门打开通道，没有名额时分流或排队
+
+        Returns:
+            tuple: (打开的通道, 实际使用的传输通道)
+        """
+        gate = self._gate(transport, config)
+        chosen = [transport, gate]
+
+        def spill() -> bool:
+            for lane in range(1, config.max_lanes):
+                future = self.get(config.with_lane(lane), block=False)
+                if not future.done():
+                    # 建立完成后唤醒排队者重试分流
+                    future.add_done_callback(lambda _: gate.notify())
+                    continue
+                if future.exception() is not None or future.result() is None: continue
+                lane_transport = future.result()
+                lane_gate = self._gate(lane_transport, config.with_lane(lane))
+                if lane_gate.try_acquire():
+                    chosen[:] = lane_transport, lane_gate
+                    self.spilled += 1
+                    return True
+            return False
+
+        if not gate.try_acquire() and not gate.acquire(transport, timeout, spill):
+            raise TimeoutError(f'{config} 等待通道打开名额超时')
+        transport, gate = chosen
+        channel = None
+        try:
+            channel = self._open(transport, kind, src_addr, dest_addr, timeout)
+            return channel, transport
+        finally:
+            gate.release(channel)
+
+    @staticmethod
+    def _open(transport: Transport, kind: str, src_addr, dest_addr, timeout: float) -> Channel:
+        """
+        打开通道，paramiko不支持的direct-streamlocal@openssh.com由open_streamlocal_channel完成
+        """
+        if kind == DIRECT_STREAMLOCAL:
+            return open_streamlocal_channel(transport, dest_addr, timeout)
+        return transport.open_channel(kind=kind, src_addr=src_addr, dest_addr=dest_addr, timeout=timeout)
+
+    def channel_stats(self) -> dict:
+        """
+        各传输通道的通道打开闸门统计
+
+        Returns:
+            dict: 传输通道名称到ChannelGate.stats()的映射
+        """
+        return {gate.name: gate.stats() for gate in list(self._gates.values())}
+
+    def _put(self, config: SSHConfig, value: Transport):
+        """
+        存储传输通道，配置了idle_timeout或为分流用的同主机传输通道时开始跟踪空闲时间
+        """
+        super()._put(config, value)
+        if value is None: return
+        if config.lane:
+            self._gate(value, config)  # 闸门从此刻开始计算闲置时间
+        elif config.idle_timeout is not None:
+            self._last_used[value] = monotonic()
+        else:
+            return
+        with self._gates_lock:
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap, name="TransportManager.reaper", daemon=True)
+                self._reaper.start()
+
+    def _in_use(self, config: SSHConfig, transport: Transport) -> bool:
+        """
+        传输通道上是否有打开的通道、进行中的open_channel或远程端口转发
+        """
+        if self._opening.get(transport) or len(getattr(transport, '_channels', ())) > 0: return True
+        return self.dispatcher_manager.has_routes(config, transport)
+
+    def _reap(self):
+        """
+        空闲回收线程：释放空闲超过idle_timeout的传输通道和没有通道的分流传输通道
+        """
+        while not self.exit_event.wait(1):
+            for config, transport in list(self._kv.items()):
+                if not self._validate(transport): continue
+                if config.lane:
+                    self._release(config, transport, f"没有通道超过 {self.lane_idle_timeout}s", self._lane_idle)
+                elif config.idle_timeout is not None:
+                    self._release(config, transport, f"空闲超过 {config.idle_timeout}s", self._idle)
+
+    def _lane_idle(self, config: SSHConfig, transport: Transport) -> bool:
+        """
+        分流传输通道是否可以释放(持有_lock_add_lock时调用)
+        """
+        gate = self._gates.get(transport)
+        # 停用闸门后不会再有通道分流到该传输通道
+        return gate is not None and gate.retire(self.lane_idle_timeout)
+
+    def _idle(self, config: SSHConfig, transport: Transport) -> bool:
+        """
+        传输通道是否空闲超过config.idle_timeout(持有_lock_add_lock时调用)
+        """
+        now = monotonic()
+        if self._in_use(config, transport):
+            self._last_used[transport] = now
+            return False
+        return now - self._last_used.get(transport, now) >= config.idle_timeout
+
+    def _release(self, config: SSHConfig, transport: Transport, reason: str,
+                 idle: Callable[[SSHConfig, Transport], bool]) -> bool:
+        """
+        空闲检查通过时移除并关闭仍登记在config下的传输通道
+
+        检查和移除都在_lock_add_lock内进行，open_channel登记使用中的传输通道时持有同一把锁，
+        已被释放的传输通道不会再被选用。
+
+        Args:
+            config: SSH配置
+            transport: 传输通道
+            reason: 日志中的释放原因
+            idle: 空闲检查
+
+        Returns:
+            bool: 是否已释放
+        """
+        with self._lock_add_lock:
+            if self._kv.get(config) is not transport or not idle(config, transport): return False
+            del self._kv[config]
+            self._released.add(transport)
+        self.released += 1
+        self.logger.info(f"{config} {reason}, 释放传输通道")
+        transport.close()
+        return True
+
     def _before_close(self):
         """
         关闭前的清理工作
         
-        设置退出事件并关闭套接字管理器
+        设置退出事件并关闭套接字管理器和分发器管理器
         """
         self.exit_event.set()
+        self.dispatcher_manager.close()
         self.socket_manager.close()
 
     def _close(self, transport: Transport):
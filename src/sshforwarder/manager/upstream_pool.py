@@ -0,0 +1,313 @@
+"""
+上游服务池模块
+
+提供UpstreamPool类，为远程端口转发在多个本地上游服务之间做负载均衡，
+支持轮询、最少连接和一致性哈希策略，以及主动健康检查、失败摘除和预建空闲连接。
+"""
+import bisect
+import itertools
+import logging
+import select
+import socket
+import threading
+import zlib
+from collections import deque
+from time import monotonic
+
+from sshforwarder.config import UpstreamConfig
+from sshforwarder.utils import unix_path
+from .socket_manager import SocketManager
+
+
+class Upstream:
+    """
+    单个上游服务的状态
+
+    Attributes:
+        address (tuple): 上游地址(host, port)
+        active (int): 当前活跃连接数
+        fails (int): 连续失败次数
+        ejected_until (float): 摘除截止时间(monotonic)，0表示未摘除
+        idle (deque): 预建的空闲连接 [(socket, 建立时间), ...]
+    """
+    __slots__ = ('address', 'active', 'fails', 'ejected_until', 'idle')
+
+    def __init__(self, address: tuple):
+        self.address = address
+        self.active = 0
+        self.fails = 0
+        self.ejected_until = 0.0
+        self.idle = deque()
+
+    def available(self, now: float) -> bool:
+        """
+        上游是否未被摘除
+
+        Args:
+            now: 当前时间(monotonic)
+
+        Returns:
+            bool: 是否可用
+        """
+        return self.ejected_until <= now
+
+
+class UpstreamPool:
+    """
+    上游服务池
+
+    线程安全，acquire在转发器的工作线程中调用，不占用接收循环。
+    空闲连接队列由健康检查线程和acquire共同修改，存取都在_lock下进行。
+
+    Attributes:
+        config (UpstreamConfig): 上游服务池配置
+        socket_manager (SocketManager): 套接字管理对象
+        upstreams (list[Upstream]): 上游服务列表
+        exit_event (threading.Event): 健康检查线程退出事件
+        logger (logging.Logger): 日志记录器
+    """
+    VIRTUAL_NODES = 64  # 一致性哈希每个上游的虚拟节点数
+
+    def __init__(self, config: UpstreamConfig, socket_manager: SocketManager):
+        """
+        初始化上游服务池，按需启动健康检查线程
+
+        Args:
+            config: 上游服务池配置
+            socket_manager: 套接字管理对象
+        """
+        self.config = config
+        self.socket_manager = socket_manager
+        self.upstreams = [Upstream(address) for address in config.upstreams]
+        self._by_address = {upstream.address: upstream for upstream in self.upstreams}
+        self._lock = threading.Lock()
+        self._round_robin = itertools.count()
+        self._ring = sorted((self._hash(f'{host}:{port}#{i}'), n)
+                            for n, (host, port) in enumerate(config.upstreams)
+                            for i in range(self.VIRTUAL_NODES))
+        self._ring_keys = [k for k, _ in self._ring]
+        self.exit_event = threading.Event()
+        self.logger = logging.getLogger(f"UpstreamPool{config.upstreams}")
+        if config.health_check_interval > 0 or config.idle_connections > 0:
+            threading.Thread(target=self._health_check, name='UpstreamPool.health_check', daemon=True).start()
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        """
+        稳定的32位哈希，不受PYTHONHASHSEED影响
+
+        Args:
+            key: 哈希键
+
+        Returns:
+            int: 哈希值
+        """
+        return zlib.crc32(key.encode())
+
+    def _candidates(self, key=None) -> list[Upstream]:
+        """
+        按负载均衡策略给出本次尝试的上游顺序，被摘除的上游排在最后作为兜底
+
+        Args:
+            key: 一致性哈希键，通常为客户端地址
+
+        Returns:
+            list[Upstream]: 上游尝试顺序
+        """
+        n = len(self.upstreams)
+        start = next(self._round_robin) % n
+        ordered = self.upstreams[start:] + self.upstreams[:start]
+        if self.config.strategy == 'least_connections':
+            ordered.sort(key=lambda upstream: upstream.active)
+        elif self.config.strategy == 'consistent_hash' and key is not None:
+            i = bisect.bisect(self._ring_keys, self._hash(str(key)))
+            ordered = []
+            for _, index in itertools.islice(itertools.chain(self._ring[i:], self._ring[:i]), len(self._ring)):
+                upstream = self.upstreams[index]
+                if upstream not in ordered:
+                    ordered.append(upstream)
+                    if len(ordered) == n: break
+        now = monotonic()
+        return [_ for _ in ordered if _.available(now)] + [_ for _ in ordered if not _.available(now)]
+
+    def _connect(self, upstream: Upstream) -> socket.socket:
+        """
+        建立到上游的新连接
+
+        Args:
+            upstream: 上游服务，地址为(套接字路径, None)时连接本地Unix域套接字
+
+        Returns:
+            socket.socket: 已连接的套接字
+        """
+        path = unix_path(*upstream.address[:2])
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) if path else self.socket_manager.get()
+        sock.settimeout(self.config.connect_timeout)
+        try:
+            sock.connect(path or upstream.address)
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    def _pop_idle(self, upstream: Upstream) -> socket.socket | None:
+        """
+        取出一个仍然有效的预建空闲连接
+
+        Args:
+            upstream: 上游服务
+
+        Returns:
+            socket.socket | None: 空闲连接，没有可用连接时返回None
+        """
+        deadline = monotonic() - self.config.idle_timeout
+        while True:
+            with self._lock:
+                if not upstream.idle: return None
+                sock, created = upstream.idle.popleft()
+            if created >= deadline:
+                try:
+                    r, _, _ = select.select([sock], [], [], 0)
+                    # 可读但读不到数据说明对端已关闭；有数据(如服务端先发的banner)则保留给转发
+                    if not r or sock.recv(1, socket.MSG_PEEK):
+                        return sock
+                except OSError:
+                    pass
+            sock.close()
+
+    def _prune_idle(self, upstream: Upstream):
+        """
+        关闭超过idle_timeout的空闲连接，使补足空闲连接时不再计入它们
+
+        空闲连接按建立时间先后排列，从最早的开始检查。
+
+        Args:
+            upstream: 上游服务
+        """
+        deadline = monotonic() - self.config.idle_timeout
+        expired = []
+        with self._lock:
+            while upstream.idle and upstream.idle[0][1] < deadline:
+                expired.append(upstream.idle.popleft()[0])
+        for sock in expired: sock.close()
+
+    def _add_idle(self, upstream: Upstream, sock: socket.socket) -> bool:
+        """
+        在空闲连接不足idle_connections时加入一个预建连接
+
+        Args:
+            upstream: 上游服务
+            sock: 已连接的套接字
+
+        Returns:
+            bool: 是否已加入，未加入时由调用方关闭套接字
+        """
+        with self._lock:
+            if len(upstream.idle) >= self.config.idle_connections: return False
+            upstream.idle.append((sock, monotonic()))
+            return True
+
+    def _failed(self, upstream: Upstream, e: Exception):
+        """
+        记录上游连接失败，连续失败达到阈值后摘除
+
+        Args:
+            upstream: 上游服务
+            e: 失败原因
+        """
+        with self._lock:
+            upstream.fails += 1
+            if upstream.fails >= self.config.max_fails:
+                upstream.ejected_until = monotonic() + self.config.fail_timeout
+        self.logger.error(f'上游 {"%s:%s" % upstream.address} 连接失败 ({e.__class__.__name__}: {e})')
+
+    def _recovered(self, upstream: Upstream):
+        """
+        上游恢复，清除失败计数并重新加入
+
+        Args:
+            upstream: 上游服务
+        """
+        if upstream.fails or upstream.ejected_until:
+            with self._lock:
+                upstream.fails = 0
+                upstream.ejected_until = 0.0
+
+    def acquire(self, key=None) -> tuple[socket.socket, tuple]:
+        """
+        选择一个上游并返回到它的连接，失败时立即尝试下一个
+
+        Args:
+            key: 一致性哈希键，通常为客户端地址
+
+        Returns:
+            tuple: (已连接的套接字, 上游地址)
+
+        Raises:
+            ConnectionRefusedError: 所有上游都不可用
+        """
+        for upstream in self._candidates(key):
+            sock = self._pop_idle(upstream)
+            if sock is None:
+                try:
+                    sock = self._connect(upstream)
+                except Exception as e:
+                    self._failed(upstream, e)
+                    continue
+            self._recovered(upstream)
+            with self._lock:
+                upstream.active += 1
+            return sock, upstream.address
+        raise ConnectionRefusedError('没有可用的上游服务')
+
+    def release(self, address: tuple):
+        """
+        归还一个已关闭的上游连接计数
+
+        Args:
+            address: 上游地址
+        """
+        upstream = self._by_address.get(address)
+        if upstream is None: return
+        with self._lock:
+            upstream.active -= 1
+
+    def _health_check(self):
+        """
+        健康检查线程
+
+        定期探测每个上游：成功则恢复该上游并补足空闲连接，失败则摘除。
+        """
+        interval = self.config.health_check_interval or min(self.config.idle_timeout, 5)
+        while not self.exit_event.wait(interval):
+            for upstream in self.upstreams:
+                if self.exit_event.is_set(): break
+                try:
+                    sock = self._connect(upstream)
+                except Exception as e:
+                    self._failed(upstream, e)
+                    continue
+                self._recovered(upstream)
+                self._prune_idle(upstream)
+                if not self._add_idle(upstream, sock):
+                    sock.close()
+                    continue
+                # 建立连接时不持有锁，加入时再按数量检查一次
+                while len(upstream.idle) < self.config.idle_connections:
+                    try:
+                        sock = self._connect(upstream)
+                    except Exception:
+                        break
+                    if not self._add_idle(upstream, sock):
+                        sock.close()
+                        break
+
+    def close(self):
+        """
+        停止健康检查并关闭所有空闲连接
+        """
+        self.exit_event.set()
+        for upstream in self.upstreams:
+            with self._lock:
+                idle, upstream.idle = upstream.idle, deque()
+            for sock, _ in idle: sock.close()
@@ -15,6 +15,15 @@ class Socks5:
         sock: socket.socket - 客户端连接socket
         logger: logging.Logger - 日志记录器
     """
+    # 应答码(REP)
+    SUCCEEDED = 0x00
+    GENERAL_FAILURE = 0x01
+    NOT_ALLOWED = 0x02
+    NETWORK_UNREACHABLE = 0x03
+    HOST_UNREACHABLE = 0x04
+    CONNECTION_REFUSED = 0x05
+    COMMAND_NOT_SUPPORTED = 0x07
+
     def __init__(self, sock: socket.socket):
         """
         初始化SOCKS5处理器
@@ -29,6 +38,8 @@ class Socks5:
         """
         解析客户端请求的目标地址和端口
         
+        只完成协商和请求解析，应答需在目标连接结果确定后通过reply发送。
+        
         Returns:
             tuple: (address, port) - 目标地址和端口，如果协议错误返回(None, None)
         """
@@ -52,10 +63,18 @@ class Socks5:
             addr = socket.inet_ntop(socket.AF_INET6, self.sock.recv(16))
         else:
             addr = 'unknown'
-        addr = addr.decode()
-        port = int.from_bytes(self.sock.recv(2))
+        if isinstance(addr, bytes): addr = addr.decode()
+        port = int.from_bytes(self.sock.recv(2), 'big')
         logger.debug(f"{addr}:{port}")
-        # 返回SOCKS5响应
-        # 格式: VER REP RSV ATYP BND.ADDR BND.PORT
-        self.sock.sendall(b'\x05\x00\x00\x01\x00\x00\x00\x00\x00\x00')
-        return addr, port
\ No newline at end of file
+        return addr, port
+
+    def reply(self, rep: int = SUCCEEDED):
+        """
+        返回SOCKS5响应
+        
+        格式: VER REP RSV ATYP BND.ADDR BND.PORT
+        
+        Args:
+            rep: int - 应答码，默认为成功
+        """
+        self.sock.sendall(b'\x05' + bytes((rep,)) + b'\x00\x01\x00\x00\x00\x00\x00\x00')
\ No newline at end of file
@@ -1,2 +1,12 @@
 from .utils import ResourceAgent
-from .utils import parse_cleartext_payload
\ No newline at end of file
+from .utils import parse_cleartext_payload, format_address
+from .path_selector import PathSelector
+from .compression_advisor import CompressionAdvisor
+from .trace import ConnectionTrace, TraceRing, default_trace_ring
+from .memory import StackSizeThreadPoolExecutor, connection_memory_estimate
+from .destination_cache import DestinationCache
+from .happy_eyeballs import DNSCache, default_dns_cache, happy_eyeballs_connect
+from .capture import TrafficCapture, read_capture
+from .heavy_hitters import CountMinSketch, SpaceSaving, HeavyHitters, TrafficAnalytics
+from .access_log import AccessLog
+from .streamlocal import unix_path, open_streamlocal_channel, request_streamlocal_forward, cancel_streamlocal_forward
@@ -0,0 +1,176 @@
+"""
+访问日志模块
+
+提供AccessLog类，每个结束的转发连接写一条JSON Lines记录(转发器、源端、目标、SSH主机、各阶段耗时、
+双向字节数、关闭原因)。转发线程只把连接记录追加到内存队列(collections.deque，不加锁)，
+格式化和写盘由后台写线程批量完成；队列满时丢弃并计数，文件按大小轮转。
+写盘或轮转失败(磁盘已满、目录被删除、无权限)时丢弃该批记录并计数，写线程继续运行，下一批重新打开文件。
+"""
+import json
+import logging
+import os
+import threading
+from collections import deque
+from time import monotonic, time
+
+from .trace import ConnectionTrace
+
+
+class AccessLog:
+    """
+    异步批量访问日志
+
+    Attributes:
+        path (str): 日志文件路径
+        max_bytes (int): 单个文件的大小上限，写入一批记录前检查，将超过时轮转为path.1、path.2……
+        backups (int): 保留的轮转文件数
+        queue_limit (int): 内存队列最大长度
+        written (int): 已写入的记录数
+        dropped (int): 因队列已满丢弃的记录数
+        errors (int): 因格式化失败丢弃的记录数
+        write_errors (int): 因写入或轮转失败丢弃的记录数
+        logger (logging.Logger): 日志记录器
+    """
+    def __init__(self, path: str, max_bytes: int = 64 * 1024 * 1024, backups: int = 5,
+                 queue_limit: int = 65536, flush_interval: float = 0.5):
+        """
+        初始化访问日志并启动写线程
+
+        Args:
+            path: 日志文件路径，已存在时追加
+            max_bytes: 单个文件的大小上限(字节)
+            backups: 保留的轮转文件数
+            queue_limit: 内存队列最大长度
+            flush_interval: 写线程的最长等待间隔(秒)
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.queue_limit = queue_limit
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self.write_errors = 0
+        self.logger = logging.getLogger('AccessLog')
+        self._failing = False
+        self._queue = deque()
+        self._drop_lock = threading.Lock()
+        self._wall_offset = time() - monotonic()
+        self._fp = open(path, 'a', encoding='utf-8')
+        self._size = self._fp.tell()
+        self._closed = threading.Event()
+        self._writer = threading.Thread(target=self._write_loop, name='AccessLog.writer', daemon=True)
+        self._writer.start()
+
+    def record(self, trace: ConnectionTrace):
+        """
+        提交一个已结束连接的记录，从不阻塞
+
+        Args:
+            trace: 连接生命周期记录
+        """
+        if len(self._queue) >= self.queue_limit:
+            with self._drop_lock:
+                self.dropped += 1
+            return
+        self._queue.append(trace)
+
+    def _format(self, trace: ConnectionTrace) -> str:
+        """
+        格式化为一行JSON，时间戳为Unix时间，耗时单位为毫秒
+        """
+        record = {
+            'time': trace.closed + self._wall_offset if trace.closed else None,
+            'forwarder': trace.forwarder,
+            'client': '%s:%s' % trace.client[:2] if isinstance(trace.client, tuple) else trace.client,
+            'destination': '%s:%s' % trace.destination[:2] if isinstance(trace.destination, tuple) else trace.destination,
+            'via': trace.via,
+            'connect_ms': None,
+            'first_byte_ms': None,
+            'duration_ms': None,
+            'bytes_up': trace.bytes_up,
+            'bytes_down': trace.bytes_down,
+            'reason': trace.close_reason,
+        }
+        for name, phase in (('connect_ms', 'open_confirmed'), ('first_byte_ms', 'first_down'), ('duration_ms', 'closed')):
+            elapsed = trace.elapsed(phase)
+            if elapsed is not None: record[name] = round(elapsed * 1000, 3)
+        return json.dumps(record, ensure_ascii=False, default=str) + '\n'
+
+    def _write_loop(self):
+        """
+        写线程：定期把队列中的记录批量写入文件
+        """
+        while not self._closed.wait(self.flush_interval):
+            self._drain()
+        self._drain()
+
+    def _drain(self):
+        queue = self._queue
+        if not queue: return
+        lines = []
+        while queue:
+            # 单条记录格式化失败不能终止写线程
+            try:
+                lines.append(self._format(queue.popleft()))
+            except Exception:
+                self.errors += 1
+        if not lines: return
+        data = ''.join(lines)
+        size = len(data.encode('utf-8'))
+        try:
+            if self._fp.closed: self._open()
+            if self._size and self._size + size > self.max_bytes: self._rotate()
+            self._fp.write(data)
+            self._fp.flush()
+        except OSError as e:
+            self._write_failed(e, len(lines))
+            return
+        if self._failing:
+            self._failing = False
+            self.logger.info(f'{self.path} 恢复写入')
+        self._size += size
+        self.written += len(lines)
+
+    def _open(self):
+        self._fp = open(self.path, 'a', encoding='utf-8')
+        self._size = self._fp.tell()
+
+    def _write_failed(self, e: OSError, count: int):
+        """
+        丢弃写入失败的一批记录并关闭文件(缓冲区中可能残留部分数据)，下一批重新打开
+        """
+        self.write_errors += count
+        if not self._failing:
+            self._failing = True
+            self.logger.error(f'{self.path} 写入失败, 丢弃记录直到恢复 ({e.__class__.__name__}: {e})')
+        try:
+            self._fp.close()
+        except OSError:
+            pass
+
+    def _rotate(self):
+        """
+        轮转日志文件: path.(n-1) -> path.n, ..., path -> path.1
+        """
+        self._fp.close()
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f'{self.path}.{i}'): os.replace(f'{self.path}.{i}', f'{self.path}.{i + 1}')
+        if self.backups > 0:
+            os.replace(self.path, f'{self.path}.1')
+        else:
+            os.remove(self.path)
+        self._open()
+
+    def close(self):
+        """
+        写完队列中剩余的记录并关闭文件
+        """
+        if self._closed.is_set(): return
+        self._closed.set()
+        self._writer.join()
+        try:
+            self._fp.close()
+        except OSError:
+            pass
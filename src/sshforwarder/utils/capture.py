@@ -0,0 +1,248 @@
+"""
+流量抓取模块
+
+提供TrafficCapture类，按需抓取转发器转发的原始字节：转发线程只把分块头和截断后的载荷追加到内存队列
+(collections.deque，append/popleft在GIL下是原子操作，不加锁)，后台写线程将其写入固定大小的内存映射环形文件，
+转发线程从不等待磁盘。队列满时丢弃并计数。read_capture用于读取抓取文件。
+
+文件格式(小端序):
+    文件头(64字节): magic(8s) b'SFCAP\\x00\\x00\\x01' | version(I) | header_size(I) | capacity(Q) 数据区大小 |
+        head(Q) 下一条记录的写入偏移 | tail(Q) 最旧记录的偏移 | records(Q) 有效记录数 | dropped(Q) 丢弃的分块数
+    数据区: 从文件偏移header_size开始、capacity字节的环形区域，由连续的记录组成
+    记录: timestamp(d) Unix时间 | connection(I) 连接编号 | direction(B) | 3字节填充 |
+        length(I) 原始长度 | captured(I) 载荷长度，之后是captured字节的载荷
+    direction: 0 源端->目标端 | 1 目标端->源端 | 2 连接开始(载荷为JSON: forwarder/client/destination) |
+        3 连接结束 | 255 回绕标记(跳到数据区开头)
+    数据区末尾不足一个记录头时同样回绕到开头。
+"""
+import itertools
+import json
+import mmap
+import os
+import random
+import struct
+import threading
+from collections import deque
+from time import time
+
+HEADER = struct.Struct('<8sIIQQQQQ')
+HEADER_SIZE = 64
+RECORD = struct.Struct('<dIB3xII')
+MAGIC = b'SFCAP\x00\x00\x01'
+VERSION = 1
+
+UP, DOWN, OPEN, CLOSE, WRAP = 0, 1, 2, 3, 255
+
+
+class TrafficCapture:
+    """
+    异步抽样流量抓取
+
+    按连接抽样：连接开始时按目标过滤和抽样率决定是否抓取，被选中连接的每个分块都记录分块头，
+    载荷截断为snaplen字节。
+
+    Attributes:
+        path (str): 抓取文件路径
+        capacity (int): 环形数据区大小(字节)
+        snaplen (int): 每个分块最多保存的载荷字节数
+        sample_rate (float): 连接抽样率
+        destinations (set | None): 目标过滤，元素为host或(host, port)，为None时不过滤
+        queue_limit (int): 内存队列最大长度
+        dropped (int): 因队列已满丢弃的分块数
+    """
+    def __init__(self, path: str, capacity: int = 64 * 1024 * 1024, snaplen: int = 256,
+                 sample_rate: float = 1.0, destinations=None, queue_limit: int = 65536):
+        """
+        初始化流量抓取并启动写线程
+
+        Args:
+            path: 抓取文件路径，已存在时覆盖
+            capacity: 环形数据区大小(字节)
+            snaplen: 每个分块最多保存的载荷字节数
+            sample_rate: 连接抽样率(0~1)
+            destinations: 可选的目标过滤，元素为host或(host, port)
+            queue_limit: 内存队列最大长度
+        """
+        assert capacity >= 2 * (RECORD.size + max(snaplen, 1024)), '环形数据区过小'
+        self.path = path
+        self.capacity = capacity
+        self.snaplen = snaplen
+        self.sample_rate = sample_rate
+        self.destinations = None if destinations is None else set(destinations)
+        self.queue_limit = queue_limit
+        self.dropped = 0
+        self._queue = deque()
+        self._drop_lock = threading.Lock()
+        self._connections = itertools.count(1)
+        self._head = self._tail = self._records = 0
+
+        with open(path, 'wb') as fp:
+            fp.truncate(HEADER_SIZE + capacity)
+        self._fd = os.open(path, os.O_RDWR)
+        self._mmap = mmap.mmap(self._fd, HEADER_SIZE + capacity)
+        self._write_header()
+
+        self._wakeup = threading.Event()
+        self._closed = threading.Event()
+        self._writer = threading.Thread(target=self._write_loop, name='TrafficCapture.writer', daemon=True)
+        self._writer.start()
+
+    def wants(self, destination) -> bool:
+        """
+        是否抓取到该目标的连接
+
+        Args:
+            destination: 目标地址
+
+        Returns:
+            bool: 通过目标过滤且被抽中时返回True
+        """
+        if self.destinations is not None and destination not in self.destinations \
+                and not (isinstance(destination, tuple) and destination[0] in self.destinations):
+            return False
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def session(self, forwarder: str, client, destination) -> int | None:
+        """
+        连接开始，按过滤和抽样决定是否抓取
+
+        Args:
+            forwarder: 转发器名称
+            client: 源端地址
+            destination: 目标地址
+
+        Returns:
+            int | None: 被抓取时返回连接编号，否则返回None
+        """
+        if self._closed.is_set() or not self.wants(destination): return None
+        connection = next(self._connections) & 0xFFFFFFFF
+        meta = json.dumps({'forwarder': forwarder, 'client': client, 'destination': destination},
+                          ensure_ascii=False, default=str).encode()
+        self._offer((time(), connection, OPEN, len(meta), meta))
+        return connection
+
+    def record(self, connection: int, direction: int, data: bytes):
+        """
+        记录一个转发分块，只复制snaplen字节，从不阻塞
+
+        Args:
+            connection: session返回的连接编号
+            direction: UP或DOWN
+            data: 分块数据
+        """
+        self._offer((time(), connection, direction, len(data), data[:self.snaplen]))
+
+    def end(self, connection: int):
+        """
+        连接结束
+
+        Args:
+            connection: session返回的连接编号
+        """
+        self._offer((time(), connection, CLOSE, 0, b''))
+
+    def _offer(self, item: tuple):
+        if len(self._queue) >= self.queue_limit:
+            with self._drop_lock:
+                self.dropped += 1
+            return
+        self._queue.append(item)
+        if len(self._queue) == 1: self._wakeup.set()
+
+    def _write_loop(self):
+        """
+        写线程：把队列中的记录写入环形文件
+        """
+        while not self._closed.is_set():
+            self._wakeup.wait(0.1)
+            self._wakeup.clear()
+            self._drain()
+        self._drain()
+
+    def _drain(self):
+        queue = self._queue
+        if not queue: return
+        while queue:
+            timestamp, connection, direction, length, payload = queue.popleft()
+            self._append(RECORD.pack(timestamp, connection, direction, length, len(payload)), payload)
+        self._write_header()
+
+    def _append(self, header: bytes, payload: bytes):
+        """
+        在head处写入一条记录，先淘汰会被覆盖的旧记录
+        """
+        size = len(header) + len(payload)
+        if self._head + size > self.capacity:
+            self._evict(self._head, self.capacity)
+            if self.capacity - self._head >= RECORD.size:
+                self._write(self._head, RECORD.pack(0, 0, WRAP, 0, 0))
+            self._head = 0
+        self._evict(self._head, self._head + size)
+        if self._records == 0: self._tail = self._head
+        self._write(self._head, header)
+        self._write(self._head + len(header), payload)
+        self._head += size
+        self._records += 1
+
+    def _evict(self, start: int, end: int):
+        """
+        淘汰起始偏移落在[start, end)内的旧记录，tail前移
+        """
+        while self._records and start <= self._tail < end:
+            if self.capacity - self._tail < RECORD.size:
+                self._tail = 0
+                continue
+            _, _, direction, _, captured = RECORD.unpack_from(self._mmap, HEADER_SIZE + self._tail)
+            if direction == WRAP:
+                self._tail = 0
+                continue
+            self._tail += RECORD.size + captured
+            self._records -= 1
+
+    def _write(self, offset: int, data: bytes):
+        self._mmap[HEADER_SIZE + offset:HEADER_SIZE + offset + len(data)] = data
+
+    def _write_header(self):
+        HEADER.pack_into(self._mmap, 0, MAGIC, VERSION, HEADER_SIZE, self.capacity,
+                         self._head, self._tail, self._records, self.dropped)
+
+    def close(self):
+        """
+        写完队列中剩余的记录并关闭抓取文件
+        """
+        if self._closed.is_set(): return
+        self._closed.set()
+        self._wakeup.set()
+        self._writer.join()
+        self._mmap.flush()
+        self._mmap.close()
+        os.close(self._fd)
+
+
+def read_capture(path: str):
+    """
+    按时间顺序读取抓取文件中的记录
+
+    Args:
+        path: 抓取文件路径
+
+    Yields:
+        dict: timestamp、connection、direction、length、payload；连接开始记录另含meta
+    """
+    with open(path, 'rb') as fp:
+        data = fp.read()
+    magic, version, header_size, capacity, head, tail, records, dropped = HEADER.unpack_from(data, 0)
+    assert magic == MAGIC, f'不是抓取文件: {path}'
+    offset = tail
+    for _ in range(records):
+        if capacity - offset < RECORD.size: offset = 0
+        timestamp, connection, direction, length, captured = RECORD.unpack_from(data, header_size + offset)
+        if direction == WRAP:
+            offset = 0
+            timestamp, connection, direction, length, captured = RECORD.unpack_from(data, header_size)
+        start = header_size + offset + RECORD.size
+        record = {'timestamp': timestamp, 'connection': connection, 'direction': direction,
+                  'length': length, 'payload': data[start:start + captured]}
+        if direction == OPEN: record['meta'] = json.loads(record['payload'])
+        yield record
+        offset += RECORD.size + captured
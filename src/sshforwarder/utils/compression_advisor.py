@@ -0,0 +1,132 @@
+"""
+自适应压缩模块
+
+提供CompressionAdvisor类，对转发的数据做抽样并估计可压缩性，按目标地址记录，
+用于在自适应压缩模式下决定新连接走压缩还是不压缩的SSH传输通道。
+"""
+import threading
+import zlib
+from collections import OrderedDict
+
+
+def estimate_compressibility(data: bytes) -> float:
+    """
+    估计数据的压缩比
+
+    使用zlib最快档压缩样本，开销在微秒级。
+
+    Args:
+        data: 样本数据
+
+    Returns:
+        float: 压缩后与压缩前的长度比，越小越适合压缩
+    """
+    if not data: return 1.0
+    return len(zlib.compress(data, 1)) / len(data)
+
+
+class CompressionSampler:
+    """
+    单个连接的抽样器
+
+    只抽取连接开始的sample_bytes字节，抽满或连接结束时将压缩比提交给CompressionAdvisor。
+
+    Attributes:
+        advisor (CompressionAdvisor): 所属的压缩建议器
+        destination: 目标地址
+        remaining (int): 剩余待抽样字节数
+        chunks (list): 已抽样的数据块
+    """
+    __slots__ = ('advisor', 'destination', 'remaining', 'chunks')
+
+    def __init__(self, advisor: 'CompressionAdvisor', destination):
+        self.advisor = advisor
+        self.destination = destination
+        self.remaining = advisor.sample_bytes
+        self.chunks = []
+
+    def feed(self, data: bytes):
+        """
+        抽样一个数据块
+
+        Args:
+            data: 转发的数据块
+        """
+        chunk = data[:self.remaining]
+        self.chunks.append(chunk)
+        self.remaining -= len(chunk)
+        if self.remaining <= 0: self.finish()
+
+    def finish(self):
+        """
+        提交抽样结果，样本过小时丢弃
+        """
+        sample = b''.join(self.chunks)
+        self.chunks = []
+        self.remaining = 0
+        if len(sample) >= self.advisor.min_sample_bytes:
+            self.advisor.update(self.destination, estimate_compressibility(sample))
+
+
+class CompressionAdvisor:
+    """
+    按目标地址记录可压缩性的压缩建议器
+
+    每个目标保存压缩比的指数移动平均，最多保留max_entries个目标(LRU淘汰)。
+    尚无样本的目标走不压缩的通道。
+
+    Attributes:
+        threshold (float): 压缩比低于该值时走压缩通道
+        sample_bytes (int): 每个连接抽样的字节数
+        min_sample_bytes (int): 有效样本的最小字节数
+        alpha (float): 指数移动平均的平滑系数
+        max_entries (int): 最多记录的目标数
+    """
+    def __init__(self, threshold: float = 0.7, sample_bytes: int = 4096, min_sample_bytes: int = 256,
+                 alpha: float = 0.3, max_entries: int = 4096):
+        self.threshold = threshold
+        self.sample_bytes = sample_bytes
+        self.min_sample_bytes = min_sample_bytes
+        self.alpha = alpha
+        self.max_entries = max_entries
+        self._ratios = OrderedDict()
+        self._lock = threading.Lock()
+
+    def sampler(self, destination) -> CompressionSampler:
+        """
+        为新连接创建抽样器
+
+        Args:
+            destination: 目标地址
+
+        Returns:
+            CompressionSampler: 抽样器
+        """
+        return CompressionSampler(self, destination)
+
+    def update(self, destination, ratio: float):
+        """
+        更新目标的压缩比
+
+        Args:
+            destination: 目标地址
+            ratio: 样本压缩比
+        """
+        with self._lock:
+            old = self._ratios.pop(destination, None)
+            self._ratios[destination] = ratio if old is None else old + self.alpha * (ratio - old)
+            if len(self._ratios) > self.max_entries:
+                self._ratios.popitem(last=False)
+
+    def should_compress(self, destination) -> bool:
+        """
+        目标的流量是否值得压缩
+
+        Args:
+            destination: 目标地址
+
+        Returns:
+            bool: 是否应走压缩通道
+        """
+        ratio = self._ratios.get(destination)
+        return ratio is not None and ratio < self.threshold
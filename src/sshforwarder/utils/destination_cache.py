@@ -0,0 +1,95 @@
+"""
+目标地址负缓存模块
+
+提供DestinationCache类，记录近期通道建立失败的目标地址，在TTL内直接拒绝对同一目标的重复请求，
+避免每次都等待SSH服务器的失败应答。同一目标连续失败时TTL按指数增长，成功一次即移除。
+"""
+import threading
+from collections import OrderedDict
+from time import monotonic
+
+
+class DestinationCache:
+    """
+    目标地址负缓存
+
+    每个条目为 (过期时间, 连续失败次数, 错误码)，最多保留max_entries个目标(LRU淘汰)。
+    条目过期后放行一次请求作为探测：探测失败则TTL翻倍，探测成功则移除条目。
+    条目仍有效时到达的失败(同一批并发请求)只更新错误码，不计入连续失败次数；
+    条目过期后又过了一个TTL仍没有新的失败时，连续失败次数归零，之后的失败重新从ttl开始。
+
+    Attributes:
+        ttl (float): 首次失败的缓存时长(秒)
+        max_ttl (float): 缓存时长上限(秒)
+        max_entries (int): 最多记录的目标数
+    """
+    def __init__(self, ttl: float = 5, max_ttl: float = 300, max_entries: int = 4096):
+        """
+        初始化负缓存
+
+        Args:
+            ttl: 首次失败的缓存时长(秒)
+            max_ttl: 缓存时长上限(秒)
+            max_entries: 最多记录的目标数
+        """
+        self.ttl = ttl
+        self.max_ttl = max_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, destination) -> int | None:
+        """
+        查询目标是否处于失败缓存期
+
+        Args:
+            destination: 目标地址(host, port)
+
+        Returns:
+            int | None: 缓存的错误码，未命中或已过期时返回None
+        """
+        entry = self._entries.get(destination)
+        if entry is None or entry[0] <= monotonic():
+            return None
+        return entry[2]
+
+    def failed(self, destination, code: int):
+        """
+        记录一次通道建立失败
+
+        Args:
+            destination: 目标地址(host, port)
+            code: 返回给客户端的错误码
+        """
+        with self._lock:
+            now = monotonic()
+            entry = self._entries.pop(destination, None)
+            if entry is not None and entry[0] > now:
+                self._entries[destination] = (entry[0], entry[1], code)
+                return
+            # 过期后很久才再次失败视为新的故障，不沿用之前的连续失败次数
+            aged = entry is None or now - entry[0] >= self._ttl(entry[1])
+            failures = 1 if aged else entry[1] + 1
+            self._entries[destination] = (now + self._ttl(failures), failures, code)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _ttl(self, failures: int) -> float:
+        """
+        第failures次连续失败的缓存时长
+        """
+        return min(self.ttl * 2 ** (failures - 1), self.max_ttl)
+
+    def succeeded(self, destination):
+        """
+        记录一次通道建立成功，目标已恢复
+
+        Args:
+            destination: 目标地址(host, port)
+        """
+        if destination in self._entries:
+            with self._lock:
+                self._entries.pop(destination, None)
+
+    def __len__(self):
+        return len(self._entries)
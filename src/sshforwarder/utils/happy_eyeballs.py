@@ -0,0 +1,160 @@
+"""
+并行建连模块
+
+提供DNSCache类和happy_eyeballs_connect函数：解析主机的全部地址并按TTL缓存，
+按RFC 8305(Happy Eyeballs v2)的方式交替IPv6/IPv4地址、错开250ms并行发起TCP连接，保留最先成功的套接字。
+"""
+import errno
+import os
+import selectors
+import socket
+import threading
+from itertools import zip_longest
+from time import monotonic
+
+
+class DNSCache:
+    """
+    主机地址缓存
+
+    getaddrinfo不返回记录的TTL，这里对每个(host, port)统一缓存ttl秒；解析失败不缓存。
+
+    Attributes:
+        ttl (float): 缓存时长(秒)
+    """
+    def __init__(self, ttl: float = 60):
+        """
+        初始化地址缓存
+
+        Args:
+            ttl: 缓存时长(秒)
+        """
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, host: str, port: int) -> list[tuple]:
+        """
+        解析主机的全部TCP地址
+
+        Args:
+            host: 主机名或IP地址
+            port: 端口号
+
+        Returns:
+            list: getaddrinfo结果 [(family, type, proto, canonname, sockaddr), ...]
+
+        Raises:
+            socket.gaierror: 解析失败
+        """
+        entry = self._entries.get((host, port))
+        if entry is not None and entry[0] > monotonic():
+            return entry[1]
+        addresses = socket.getaddrinfo(host, port, socket.AF_UNSPEC, socket.SOCK_STREAM)
+        with self._lock:
+            self._entries[(host, port)] = (monotonic() + self.ttl, addresses)
+        return addresses
+
+    def invalidate(self, host: str, port: int):
+        """
+        删除主机的缓存地址，下次解析时重新查询
+
+        Args:
+            host: 主机名或IP地址
+            port: 端口号
+        """
+        with self._lock:
+            self._entries.pop((host, port), None)
+
+
+default_dns_cache = DNSCache()
+
+
+def interleave(addresses: list[tuple]) -> list[tuple]:
+    """
+    按RFC 8305第4节交替排列地址族，以解析结果中第一个地址的地址族开头
+
+    Args:
+        addresses: getaddrinfo结果
+
+    Returns:
+        list: 交替排列后的地址列表
+    """
+    if not addresses: return []
+    first = [a for a in addresses if a[0] == addresses[0][0]]
+    other = [a for a in addresses if a[0] != addresses[0][0]]
+    return [a for pair in zip_longest(first, other) for a in pair if a is not None]
+
+
+def happy_eyeballs_connect(host: str, port: int, timeout: float = 5, delay: float = 0.25,
+                           resolver: DNSCache = None, exit_event: threading.Event = None) -> socket.socket:
+    """
+    并行连接主机的多个地址，返回最先建立的连接
+
+    每隔delay秒(或上一个尝试失败时立即)对下一个地址发起连接，已发起的尝试继续进行，
+    第一个成功的连接胜出，其余尝试被关闭。所有地址都失败时删除该主机的缓存地址。
+
+    Args:
+        host: 主机名或IP地址
+        port: 端口号
+        timeout: 整体超时时间(秒)
+        delay: 相邻两次连接尝试的间隔(秒)
+        resolver: 地址缓存，默认为模块级default_dns_cache
+        exit_event: 可选的退出事件，置位后放弃连接
+
+    Returns:
+        socket.socket: 已连接的阻塞套接字
+
+    Raises:
+        TimeoutError: 超时或被exit_event终止
+        OSError: 所有地址都连接失败时抛出最后一个错误
+    """
+    resolver = resolver or default_dns_cache
+    addresses = interleave(resolver.resolve(host, port))
+    deadline = monotonic() + timeout
+    selector = selectors.DefaultSelector()
+    pending = {}
+    error = None
+    next_attempt = 0
+    try:
+        while addresses or pending:
+            now = monotonic()
+            if now >= deadline or (exit_event is not None and exit_event.is_set()): break
+            if addresses and (not pending or now >= next_attempt):
+                family, type_, proto, _, address = addresses.pop(0)
+                sock = socket.socket(family, type_, proto)
+                sock.setblocking(False)
+                err = sock.connect_ex(address)
+                if err == 0:
+                    sock.setblocking(True)
+                    return sock
+                if err not in (errno.EINPROGRESS, errno.EWOULDBLOCK):
+                    error = OSError(err, f'{os.strerror(err)}: {address}')
+                    sock.close()
+                    continue
+                selector.register(sock, selectors.EVENT_WRITE)
+                pending[sock] = address
+                next_attempt = now + delay
+                continue
+            wait = deadline - now
+            if addresses: wait = min(wait, next_attempt - now)
+            if exit_event is not None: wait = min(wait, 1)
+            for key, _ in selector.select(max(wait, 0)):
+                sock = key.fileobj
+                selector.unregister(sock)
+                address = pending.pop(sock)
+                err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if err == 0:
+                    sock.setblocking(True)
+                    return sock
+                error = OSError(err, f'{os.strerror(err)}: {address}')
+                sock.close()
+                next_attempt = 0
+        if not addresses and not pending:
+            resolver.invalidate(host, port)
+            raise error or OSError(f'{host}:{port} 没有可用地址')
+        raise TimeoutError(f'连接 {host}:{port} 超时')
+    finally:
+        for sock in pending:
+            sock.close()
+        selector.close()
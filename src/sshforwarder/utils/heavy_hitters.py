@@ -0,0 +1,226 @@
+"""
+流量热点统计模块
+
+提供CountMinSketch、SpaceSaving和HeavyHitters类，以固定内存统计海量键(目标地址、客户端地址)的流量：
+Count-Min Sketch估计任意键的累计值(只会高估)，Space-Saving维护累计值最大的K个键。
+TrafficAnalytics按时间窗口统计DynamicForwarder的目标和客户端流量。
+"""
+import threading
+from array import array
+from time import time
+
+
+class CountMinSketch:
+    """
+    Count-Min Sketch
+
+    估计值不小于真实值，以至少1-(1/2)^depth的概率高估不超过 total*2/width。
+
+    Attributes:
+        width (int): 每行计数器数
+        depth (int): 行数(哈希函数数)
+        total (int): 所有键的累计值
+    """
+    def __init__(self, width: int = 2048, depth: int = 4):
+        self.width = width
+        self.depth = depth
+        self.total = 0
+        self._rows = [array('q', bytes(8 * width)) for _ in range(depth)]
+
+    def add(self, key, count: int = 1):
+        """
+        累加键的值
+
+        Args:
+            key: 可哈希的键
+            count: 增量
+        """
+        for i, row in enumerate(self._rows):
+            row[hash((i, key)) % self.width] += count
+        self.total += count
+
+    def estimate(self, key) -> int:
+        """
+        估计键的累计值
+
+        Args:
+            key: 可哈希的键
+
+        Returns:
+            int: 估计值
+        """
+        return min(row[hash((i, key)) % self.width] for i, row in enumerate(self._rows))
+
+
+class SpaceSaving:
+    """
+    Space-Saving 热点键算法
+
+    最多跟踪k个键；新键在已满时替换当前最小的键并继承其计数作为误差上界。
+    真实值在 [count - error, count] 之间，累计值超过 total/k 的键一定在表中。
+
+    Attributes:
+        k (int): 跟踪的键数
+    """
+    def __init__(self, k: int = 100):
+        self.k = k
+        self._counters = {}  # key -> [count, error]
+
+    def add(self, key, count: int = 1):
+        """
+        累加键的值
+
+        Args:
+            key: 可哈希的键
+            count: 增量
+        """
+        counter = self._counters.get(key)
+        if counter is not None:
+            counter[0] += count
+        elif len(self._counters) < self.k:
+            self._counters[key] = [count, 0]
+        else:
+            victim = min(self._counters, key=lambda _: self._counters[_][0])
+            floor = self._counters.pop(victim)[0]
+            self._counters[key] = [floor + count, floor]
+
+    def top(self, n: int = None) -> list[tuple]:
+        """
+        累计值最大的键
+
+        Args:
+            n: 返回的键数，默认为全部
+
+        Returns:
+            list: [(key, count, error), ...]，按count从大到小
+        """
+        items = sorted(((key, c, e) for key, (c, e) in self._counters.items()), key=lambda _: _[1], reverse=True)
+        return items[:n] if n else items
+
+
+class HeavyHitters:
+    """
+    固定内存的热点统计：Count-Min Sketch + Space-Saving
+
+    Attributes:
+        sketch (CountMinSketch): 任意键的估计
+        top_k (SpaceSaving): 热点键
+    """
+    def __init__(self, k: int = 100, width: int = 2048, depth: int = 4):
+        """
+        Args:
+            k: 跟踪的热点键数
+            width: Count-Min Sketch每行计数器数
+            depth: Count-Min Sketch行数
+        """
+        self.sketch = CountMinSketch(width, depth)
+        self.top_k = SpaceSaving(k)
+
+    def add(self, key, count: int):
+        self.sketch.add(key, count)
+        self.top_k.add(key, count)
+
+    def estimate(self, key) -> int:
+        return self.sketch.estimate(key)
+
+    def top(self, n: int = 10) -> list[tuple]:
+        """
+        累计值最大的n个键
+
+        Returns:
+            list: [(key, estimate), ...]，估计值取Space-Saving计数与Count-Min估计的较小者
+        """
+        return [(key, min(count, self.sketch.estimate(key))) for key, count, _ in self.top_k.top(n)]
+
+    @property
+    def total(self) -> int:
+        return self.sketch.total
+
+
+class TrafficAnalytics:
+    """
+    按时间窗口统计目标和客户端流量的热点
+
+    窗口到期时(下一次add时)自动切换，上一个窗口的快照保存在previous中。
+
+    Attributes:
+        window (float): 窗口长度(秒)，None表示只能手动reset
+        k (int): 每个窗口跟踪的热点数
+        previous (dict | None): 上一个窗口的快照
+    """
+    def __init__(self, window: float = 300, k: int = 100, width: int = 2048, depth: int = 4):
+        """
+        Args:
+            window: 窗口长度(秒)，None表示只能手动reset
+            k: 跟踪的热点数
+            width: Count-Min Sketch每行计数器数
+            depth: Count-Min Sketch行数
+        """
+        self.window = window
+        self.k = k
+        self._dimensions = (width, depth)
+        self._lock = threading.Lock()
+        self.previous = None
+        self._start()
+
+    def _start(self):
+        self.started = time()
+        self.connections = 0
+        self.destinations = HeavyHitters(self.k, *self._dimensions)
+        self.clients = HeavyHitters(self.k, *self._dimensions)
+
+    def add(self, client, destination, nbytes: int, connections: int = 1):
+        """
+        记录连接的流量
+
+        长连接的流量应在转发过程中分批记录(connections=0)，结束时再计入连接数，使流量落在实际发生的窗口中。
+
+        Args:
+            client: 客户端地址(只统计主机部分)
+            destination: 目标地址(host, port)
+            nbytes: 双向字节数
+            connections: 计入的已结束连接数
+        """
+        with self._lock:
+            if self.window is not None and time() - self.started >= self.window:
+                self.previous = self._snapshot()
+                self._start()
+            self.connections += connections
+            if nbytes <= 0: return
+            self.destinations.add(destination, nbytes)
+            self.clients.add(client[0] if isinstance(client, tuple) else client, nbytes)
+
+    def _snapshot(self, n: int = None) -> dict:
+        return {
+            'start': self.started,
+            'end': time(),
+            'connections': self.connections,
+            'bytes': self.destinations.total,
+            'destinations': self.destinations.top(n or self.k),
+            'clients': self.clients.top(n or self.k),
+        }
+
+    def snapshot(self, n: int = 10) -> dict:
+        """
+        当前窗口的统计
+
+        Args:
+            n: 返回的热点数
+
+        Returns:
+            dict: start、end、connections、bytes，以及destinations和clients热点列表[(key, bytes), ...]
+        """
+        with self._lock:
+            return self._snapshot(n)
+
+    def reset(self) -> dict:
+        """
+        结束当前窗口并开始新窗口
+
+        Returns:
+            dict: 结束的窗口的快照
+        """
+        with self._lock:
+            self.previous = self._snapshot()
+            self._start()
+            return self.previous
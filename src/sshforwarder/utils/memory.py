@@ -0,0 +1,154 @@
+"""
+低内存模式模块
+
+提供StackSizeThreadPoolExecutor和connection_memory_estimate，用于缩小连接线程栈并测量每个连接的内存占用。
+
+每个转发连接的内存由以下部分组成：
+    - 连接线程栈：预留stack_size的虚拟内存，只有被访问的页才占用物理内存
+    - 连接状态：ConnectionTrace等__slots__记录
+    - 两端的套接字/通道对象：paramiko Channel含收发缓冲区
+    - 转发缓冲：每次recv最多4096字节，转发后立即释放
+connection_memory_estimate在当前进程中实测这些部分(线程栈按转发过数据的线程的RSS增量，对象按tracemalloc增量)，
+无法实测时(非Linux)线程栈常驻回退为STACK_RESIDENT_SIZE并标记为估算。内核套接字缓冲区不计入进程内存。
+"""
+import os
+import select
+import socket
+import threading
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from paramiko import Channel
+
+from .trace import ConnectionTrace
+
+LOW_MEMORY_STACK_SIZE = 256 * 1024  # 低内存模式的线程栈大小
+DEFAULT_STACK_SIZE = 8 * 1024 * 1024  # 未设置时大多数Linux发行版的默认线程栈大小
+STACK_RESIDENT_SIZE = 16 * 1024  # 无法实测时假定的连接线程栈常驻大小
+RELAY_BUFFER_SIZE = 4096  # 单次转发的缓冲区大小
+RELAY_ROUNDS = 16  # 测量线程栈时每个线程转发数据的次数
+
+# threading.stack_size对整个进程生效，临时修改期间互斥
+_stack_size_lock = threading.Lock()
+
+
+class StackSizeThreadPoolExecutor(ThreadPoolExecutor):
+    """
+    使用指定线程栈大小创建工作线程的线程池
+
+    只在本线程池创建工作线程的瞬间修改threading.stack_size，随后恢复原值，不影响进程中的其他线程池。
+
+    Attributes:
+        stack_size: 工作线程栈大小(字节，至少32 KiB)，None表示系统默认；只影响之后新建的工作线程
+    """
+
+    def __init__(self, *args, stack_size: int = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stack_size = stack_size
+
+    def _adjust_thread_count(self):
+        if not self.stack_size:
+            return super()._adjust_thread_count()
+        with _stack_size_lock:
+            previous = threading.stack_size(self.stack_size)
+            try:
+                super()._adjust_thread_count()
+            finally:
+                threading.stack_size(previous)
+
+
+def _rss() -> int | None:
+    """
+    读取当前进程的常驻内存(字节)，非Linux返回None
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def _measure_stack_resident(stack_size: int | None, threads: int) -> int | None:
+    """
+    启动threads个线程，每个线程像转发循环一样经select和套接字收发数据后停住，按RSS增量测量每个线程的常驻大小
+
+    只转发过数据的线程才会访问select/recv/send路径上的栈页和线程私有的内存分配区，空闲线程会低估常驻大小。
+    套接字在测量前创建，其对象大小另行计入sockets。
+
+    Returns:
+        int | None: 每个线程的常驻大小(字节)，无法测量时返回None
+    """
+    if _rss() is None: return None
+    pairs = [socket.socketpair() for _ in range(threads)]
+    payload = b'x' * RELAY_BUFFER_SIZE
+    started = threading.Barrier(threads + 1)
+    release = threading.Event()
+
+    def relay(a: socket.socket, b: socket.socket):
+        try:
+            for _ in range(RELAY_ROUNDS):
+                a.sendall(payload)
+                select.select([b], [], [], 1)
+                b.recv(RELAY_BUFFER_SIZE)
+        finally:
+            started.wait()
+            release.wait()
+
+    try:
+        before = _rss()
+        with StackSizeThreadPoolExecutor(threads, stack_size=stack_size) as executor:
+            for a, b in pairs: executor.submit(relay, a, b)
+            started.wait()
+            after = _rss()
+            release.set()
+    finally:
+        for a, b in pairs:
+            a.close()
+            b.close()
+    return max(after - before, 0) // threads
+
+
+def _measure_objects(factory, count: int) -> int:
+    """
+    按tracemalloc增量测量factory创建的每个对象(含其引用的缓冲区)的大小
+
+    Returns:
+        int: 每个对象的大小(字节)
+    """
+    tracing = tracemalloc.is_tracing()
+    if not tracing: tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        objects = [factory() for _ in range(count)]
+        size = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        if not tracing: tracemalloc.stop()
+    for obj in objects:
+        if isinstance(obj, socket.socket): obj.close()
+    return size // count
+
+
+def connection_memory_estimate(stack_size: int = None, samples: int = 64) -> dict:
+    """
+    测量指定线程栈大小下每个转发连接的内存占用
+
+    Args:
+        stack_size: 连接线程栈大小(字节)，None表示系统默认(通常为8 MiB)
+        samples: 测量用的线程数和对象数，越多越稳定
+
+    Returns:
+        dict: 各部分占用(字节)，包括 stack_reserved、stack_resident、state、sockets、relay_buffer、
+            合计的 resident_total，以及 measured(线程栈常驻是否为实测值)
+    """
+    stack_reserved = stack_size or threading.stack_size() or DEFAULT_STACK_SIZE
+    stack_resident = _measure_stack_resident(stack_size, samples)
+    estimate = {
+        'stack_reserved': stack_reserved,
+        'stack_resident': STACK_RESIDENT_SIZE if stack_resident is None else stack_resident,
+        'state': _measure_objects(lambda: ConnectionTrace('', None), samples),
+        'sockets': _measure_objects(socket.socket, samples) + _measure_objects(lambda: Channel(0), samples),
+        'relay_buffer': RELAY_BUFFER_SIZE,
+    }
+    estimate['resident_total'] = sum(v for k, v in estimate.items() if k != 'stack_reserved')
+    estimate['measured'] = stack_resident is not None
+    return estimate
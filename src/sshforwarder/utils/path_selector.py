@@ -0,0 +1,126 @@
+"""
+SSH路径选择模块
+
+提供PathSelector类，在到达同一目标的多条SSH路径之间按近期通道建立延迟、权重和健康状态排序。
+"""
+import threading
+from time import monotonic
+from typing import List
+
+
+class PathStats:
+    """
+    单条SSH路径的统计信息
+
+    Attributes:
+        config: SSH连接配置
+        index (int): 路径在配置中的顺序
+        weight (float): 路径权重
+        latency (float | None): 通道建立延迟的指数移动平均(秒)，None表示尚无样本
+        down_until (float): 失败后降级的截止时间(monotonic)
+        last_used (float): 最近一次建立通道的时间(monotonic)
+    """
+    __slots__ = ('config', 'index', 'weight', 'latency', 'down_until', 'last_used')
+
+    def __init__(self, config, index: int, weight: float):
+        self.config = config
+        self.index = index
+        self.weight = weight
+        self.latency = None
+        self.down_until = 0.0
+        self.last_used = 0.0
+
+
+class PathSelector:
+    """
+    SSH路径选择器
+
+    路径按 延迟/权重 升序排序，尚无样本的路径按已测得的最小延迟估计，由配置顺序决定先后；
+    通道建立失败的路径在fail_timeout内排到最后，仍可作为兜底。
+    每explore_every次选择会把最久未使用的健康路径提到最前，以便持续更新各路径的延迟。
+
+    Attributes:
+        paths (List[PathStats]): 路径统计列表
+        alpha (float): 延迟指数移动平均的平滑系数
+        fail_timeout (float): 失败路径的降级时长(秒)
+        explore_every (int): 探测间隔(次)，0表示不探测
+    """
+    def __init__(self, configs: list, weights: List[float] = None,
+                 alpha: float = 0.3, fail_timeout: float = 10, explore_every: int = 32):
+        """
+        初始化路径选择器
+
+        Args:
+            configs: SSH连接配置列表，按优先级排列
+            weights: 各路径的权重，默认为相同权重
+            alpha: 延迟指数移动平均的平滑系数
+            fail_timeout: 失败路径的降级时长(秒)
+            explore_every: 探测间隔(次)，0表示不探测
+
+        Raises:
+            ValueError: 权重个数与路径数不一致，或存在不大于0的权重
+        """
+        if weights is None:
+            weights = [1] * len(configs)
+        elif len(weights) != len(configs):
+            raise ValueError(f'权重个数({len(weights)})与路径数({len(configs)})不一致')
+        elif any(weight <= 0 for weight in weights):
+            raise ValueError(f'路径权重必须大于0: {weights}')
+        self.paths = [PathStats(config, i, weight) for i, (config, weight) in enumerate(zip(configs, weights))]
+        self._by_config = {path.config: path for path in self.paths}
+        self.alpha = alpha
+        self.fail_timeout = fail_timeout
+        self.explore_every = explore_every
+        self._selections = 0
+        self._lock = threading.Lock()
+
+    def order(self) -> list:
+        """
+        给出本次连接尝试的路径顺序
+
+        Returns:
+            list: SSH连接配置列表，最优路径在前
+        """
+        now = monotonic()
+        measured = [path.latency for path in self.paths if path.latency is not None]
+        default_latency = min(measured) if measured else 0.0
+        healthy = [path for path in self.paths if path.down_until <= now]
+        down = [path for path in self.paths if path.down_until > now]
+        healthy.sort(key=lambda path: ((default_latency if path.latency is None else path.latency) / path.weight,
+                                       path.index))
+        down.sort(key=lambda path: path.down_until)
+        with self._lock:
+            self._selections += 1
+            explore = self.explore_every and self._selections % self.explore_every == 0
+        if explore and len(healthy) > 1:
+            stale = min(healthy, key=lambda path: path.last_used)
+            healthy.remove(stale)
+            healthy.insert(0, stale)
+        return [path.config for path in healthy + down]
+
+    def succeeded(self, config, latency: float):
+        """
+        记录一次成功的通道建立
+
+        Args:
+            config: SSH连接配置
+            latency: 通道建立耗时(秒)
+        """
+        path = self._by_config[config]
+        with self._lock:
+            path.latency = latency if path.latency is None else \
+                path.latency + self.alpha * (latency - path.latency)
+            path.down_until = 0.0
+            path.last_used = monotonic()
+
+    def failed(self, config):
+        """
+        记录一次失败的通道建立，路径在fail_timeout内降级
+
+        Args:
+            config: SSH连接配置
+        """
+        path = self._by_config[config]
+        with self._lock:
+            path.down_until = monotonic() + self.fail_timeout
+            path.last_used = monotonic()
@@ -0,0 +1,186 @@
+"""
+Unix域套接字转发模块
+
+paramiko只实现了TCP端口转发，该模块在paramiko.Transport上补充OpenSSH的Unix域套接字转发扩展：
+direct-streamlocal@openssh.com通道(本地转发到远程Unix域套接字)和streamlocal-forward@openssh.com
+全局请求(远程Unix域套接字转发到本地)。
+
+约定：端口为None且主机为路径(包含'/')的地址表示Unix域套接字。
+"""
+import threading
+import time
+from functools import partial
+
+from paramiko import Channel, Transport, SSHException
+from paramiko.common import (cMSG_CHANNEL_OPEN, cMSG_CHANNEL_OPEN_SUCCESS, cMSG_CHANNEL_OPEN_FAILURE,
+                             MSG_CHANNEL_OPEN, OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED)
+from paramiko.message import Message
+
+DIRECT_STREAMLOCAL = 'direct-streamlocal@openssh.com'
+FORWARDED_STREAMLOCAL = 'forwarded-streamlocal@openssh.com'
+STREAMLOCAL_FORWARD = 'streamlocal-forward@openssh.com'
+CANCEL_STREAMLOCAL_FORWARD = 'cancel-streamlocal-forward@openssh.com'
+
+# 回调表({远程套接字路径: 回调})保存在传输通道自身的属性上：回调通常经由分发器引用传输通道，
+# 放在以传输通道为键的全局表中会使传输通道永远无法回收
+_HANDLERS_ATTR = '_streamlocal_handlers'
+_handlers_lock = threading.Lock()
+
+
+def _handlers(transport: Transport) -> dict:
+    """
+    传输通道上的streamlocal转发回调表，未请求过转发时为空字典
+    """
+    return getattr(transport, _HANDLERS_ATTR, {})
+
+
+def unix_path(host, port) -> str | None:
+    """
+    判断地址是否表示Unix域套接字
+
+    Args:
+        host: 主机或套接字路径
+        port: 端口，None表示可能为Unix域套接字
+
+    Returns:
+        str | None: 套接字路径，不是Unix域套接字时返回None
+    """
+    if port is None and isinstance(host, str) and '/' in host:
+        return host
+    return None
+
+
+def open_streamlocal_channel(transport: Transport, socket_path: str, timeout: float = None) -> Channel:
+    """
+    打开到远程Unix域套接字的direct-streamlocal@openssh.com通道
+
+    与Transport.open_channel相同的流程，只是通道打开报文的内容不同。
+
+    Args:
+        transport: SSH传输通道
+        socket_path: 远程Unix域套接字路径
+        timeout: 等待服务器应答的超时时间(秒)，默认为transport.channel_timeout
+
+    Returns:
+        Channel: 打开的通道
+
+    Raises:
+        paramiko.ChannelException: 服务器拒绝打开通道
+        SSHException: 传输通道已断开或打开超时
+    """
+    if not transport.active:
+        raise SSHException('SSH session not active')
+    timeout = transport.channel_timeout if timeout is None else timeout
+    with transport.lock:
+        window_size = transport._sanitize_window_size(None)
+        max_packet_size = transport._sanitize_packet_size(None)
+        chanid = transport._next_channel()
+        m = Message()
+        m.add_byte(cMSG_CHANNEL_OPEN)
+        m.add_string(DIRECT_STREAMLOCAL)
+        m.add_int(chanid)
+        m.add_int(window_size)
+        m.add_int(max_packet_size)
+        m.add_string(socket_path)
+        m.add_string('')  # reserved
+        m.add_int(0)  # reserved
+        chan = Channel(chanid)
+        transport._channels.put(chanid, chan)
+        transport.channel_events[chanid] = event = threading.Event()
+        transport.channels_seen[chanid] = True
+        chan._set_transport(transport)
+        chan._set_window(window_size, max_packet_size)
+    transport._send_user_message(m)
+    deadline = time.monotonic() + timeout
+    while not event.wait(0.1):
+        if not transport.active:
+            raise transport.get_exception() or SSHException('Unable to open channel.')
+        if time.monotonic() > deadline:
+            raise SSHException('Timeout opening channel.')
+    chan = transport._channels.get(chanid)
+    if chan is None:
+        raise transport.get_exception() or SSHException('Unable to open channel.')
+    return chan
+
+
+def request_streamlocal_forward(transport: Transport, socket_path: str, handler):
+    """
+    请求服务器在远程Unix域套接字上监听，并把每个forwarded-streamlocal@openssh.com通道交给handler
+
+    Args:
+        transport: SSH传输通道
+        socket_path: 远程Unix域套接字路径
+        handler: 回调 handler(通道, 来源地址'', (套接字路径, None))，与request_port_forward的回调参数一致
+
+    Raises:
+        SSHException: 服务器拒绝请求
+    """
+    with _handlers_lock:
+        handlers = getattr(transport, _HANDLERS_ATTR, None)
+        if handlers is None:
+            handlers = {}
+            setattr(transport, _HANDLERS_ATTR, handlers)
+            original = transport._handler_table[MSG_CHANNEL_OPEN]
+            transport._handler_table[MSG_CHANNEL_OPEN] = partial(_parse_channel_open, transport, original)
+        # 先登记回调，避免请求成功后立即到达的通道找不到归属
+        handlers[socket_path] = handler
+    if transport.global_request(STREAMLOCAL_FORWARD, (socket_path,), wait=True) is None:
+        with _handlers_lock:
+            if handlers.get(socket_path) is handler: handlers.pop(socket_path)
+        raise SSHException(f'streamlocal-forward {socket_path} 被服务器拒绝')
+
+
+def cancel_streamlocal_forward(transport: Transport, socket_path: str):
+    """
+    取消远程Unix域套接字转发
+
+    Args:
+        transport: SSH传输通道
+        socket_path: 远程Unix域套接字路径
+    """
+    with _handlers_lock:
+        _handlers(transport).pop(socket_path, None)
+    if transport.is_active():
+        transport.global_request(CANCEL_STREAMLOCAL_FORWARD, (socket_path,), wait=True)
+
+
+def _parse_channel_open(transport: Transport, original, m: Message):
+    """
+    传输线程中的MSG_CHANNEL_OPEN处理：接收forwarded-streamlocal@openssh.com通道，其他类型交给paramiko
+    """
+    kind = m.get_text()
+    if kind != FORWARDED_STREAMLOCAL:
+        m.rewind()
+        return original(m)
+    chanid = m.get_int()
+    initial_window_size = m.get_int()
+    max_packet_size = m.get_int()
+    socket_path = m.get_text()
+    m.get_text()  # reserved
+    handler = _handlers(transport).get(socket_path)
+    if handler is None:
+        reply = Message()
+        reply.add_byte(cMSG_CHANNEL_OPEN_FAILURE)
+        reply.add_int(chanid)
+        reply.add_int(OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED)
+        reply.add_string('')
+        reply.add_string('en')
+        transport._send_message(reply)
+        return
+
+    with transport.lock:
+        my_chanid = transport._next_channel()
+        chan = Channel(my_chanid)
+        transport._channels.put(my_chanid, chan)
+        transport.channels_seen[my_chanid] = True
+        chan._set_transport(transport)
+        chan._set_window(transport.default_window_size, transport.default_max_packet_size)
+        chan._set_remote_channel(chanid, initial_window_size, max_packet_size)
+    reply = Message()
+    reply.add_byte(cMSG_CHANNEL_OPEN_SUCCESS)
+    reply.add_int(chanid)
+    reply.add_int(my_chanid)
+    reply.add_int(transport.default_window_size)
+    reply.add_int(transport.default_max_packet_size)
+    transport._send_message(reply)
+    handler(chan, '', (socket_path, None))
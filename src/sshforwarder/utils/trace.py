@@ -0,0 +1,203 @@
+"""
+连接生命周期追踪模块
+
+提供ConnectionTrace和TraceRing类。每个转发连接记录接入、SOCKS5协商、通道建立、双向首字节和关闭等
+阶段的时间戳及字节数，记录保存在固定大小的环形缓冲区中，可按耗时、目标、转发器查询并导出为JSON Lines。
+写入只有一次原子计数和一次列表赋值，开销足以在生产环境常开。
+"""
+import itertools
+import json
+from time import monotonic, time
+from typing import IO
+
+
+class ConnectionTrace:
+    """
+    单个连接的生命周期记录
+
+    时间戳均为time.monotonic()，0表示该阶段未发生。
+
+    Attributes:
+        forwarder (str): 转发器名称
+        client: 源端地址
+        destination: 目标地址
+        via (str): 经过的SSH主机
+        accepted (float): 接入时间
+        negotiated (float): SOCKS5协商完成时间
+        open_requested (float): 发起通道/连接建立的时间
+        open_confirmed (float): 通道/连接建立完成的时间
+        first_up (float): 源端到目标端的首字节时间
+        first_down (float): 目标端到源端的首字节时间
+        closed (float): 关闭时间
+        close_reason (str): 关闭原因
+        bytes_up (int): 源端到目标端的字节数
+        bytes_down (int): 目标端到源端的字节数
+    """
+    __slots__ = ('forwarder', 'client', 'destination', 'via', 'accepted', 'negotiated',
+                 'open_requested', 'open_confirmed', 'first_up', 'first_down', 'closed', 'close_reason',
+                 'bytes_up', 'bytes_down')
+
+    PHASES = ('accepted', 'negotiated', 'open_requested', 'open_confirmed', 'first_up', 'first_down', 'closed')
+
+    def __init__(self, forwarder: str, client):
+        self.forwarder = forwarder
+        self.client = client
+        self.destination = None
+        self.via = None
+        self.accepted = monotonic()
+        self.negotiated = 0.0
+        self.open_requested = 0.0
+        self.open_confirmed = 0.0
+        self.first_up = 0.0
+        self.first_down = 0.0
+        self.closed = 0.0
+        self.close_reason = None
+        self.bytes_up = 0
+        self.bytes_down = 0
+
+    def close(self, reason: str):
+        """
+        记录连接关闭，只记录第一次
+
+        Args:
+            reason: 关闭原因
+        """
+        if not self.closed:
+            self.closed = monotonic()
+            self.close_reason = reason
+
+    def elapsed(self, phase: str, since: str = 'accepted') -> float | None:
+        """
+        两个阶段之间的耗时
+
+        Args:
+            phase: 结束阶段
+            since: 起始阶段，默认为接入
+
+        Returns:
+            float | None: 耗时(秒)，任一阶段未发生时返回None
+        """
+        end, start = getattr(self, phase), getattr(self, since)
+        if not end or not start: return None
+        return end - start
+
+    def to_dict(self, wall_offset: float = 0.0) -> dict:
+        """
+        转换为字典
+
+        Args:
+            wall_offset: 加到时间戳上的偏移，用于换算为Unix时间
+
+        Returns:
+            dict: 记录内容，未发生的阶段为None
+        """
+        record = {name: getattr(self, name) for name in self.__slots__}
+        for phase in self.PHASES:
+            record[phase] = record[phase] + wall_offset if record[phase] else None
+        for name in ('client', 'destination'):
+            if isinstance(record[name], tuple): record[name] = '%s:%s' % record[name][:2]
+        return record
+
+
+class TraceRing:
+    """
+    固定大小的连接记录环形缓冲区
+
+    新记录在连接接入时写入，覆盖最旧的记录；进行中的连接同样可查询。
+
+    Attributes:
+        size (int): 缓冲区大小
+    """
+    def __init__(self, size: int = 4096):
+        """
+        初始化环形缓冲区
+
+        Args:
+            size: 缓冲区大小
+        """
+        self.size = size
+        self._records = [None] * size
+        self._counter = itertools.count()
+        self._wall_offset = time() - monotonic()
+
+    def start(self, forwarder: str, client) -> ConnectionTrace:
+        """
+        为新接入的连接创建记录
+
+        Args:
+            forwarder: 转发器名称
+            client: 源端地址
+
+        Returns:
+            ConnectionTrace: 新的连接记录
+        """
+        trace = ConnectionTrace(forwarder, client)
+        self._records[next(self._counter) % self.size] = trace
+        return trace
+
+    def records(self) -> list[ConnectionTrace]:
+        """
+        当前缓冲区中的所有记录
+
+        Returns:
+            list[ConnectionTrace]: 按接入时间排序的记录
+        """
+        return sorted((_ for _ in self._records if _ is not None), key=lambda trace: trace.accepted)
+
+    def slowest(self, n: int = 10, phase: str = 'open_confirmed', since: str = 'accepted') -> list[ConnectionTrace]:
+        """
+        某阶段耗时最长的记录
+
+        Args:
+            n: 返回的记录数
+            phase: 结束阶段，默认为通道建立完成
+            since: 起始阶段，默认为接入
+
+        Returns:
+            list[ConnectionTrace]: 耗时从长到短的记录
+        """
+        timed = [(trace.elapsed(phase, since), trace) for trace in self.records()]
+        timed = [_ for _ in timed if _[0] is not None]
+        timed.sort(key=lambda _: _[0], reverse=True)
+        return [trace for _, trace in timed[:n]]
+
+    def by_destination(self, destination) -> list[ConnectionTrace]:
+        """
+        按目标地址查询
+
+        Args:
+            destination: 目标地址(host, port)，或只给出host
+
+        Returns:
+            list[ConnectionTrace]: 匹配的记录
+        """
+        return [trace for trace in self.records()
+                if trace.destination == destination
+                or (isinstance(trace.destination, tuple) and trace.destination[0] == destination)]
+
+    def by_forwarder(self, forwarder: str) -> list[ConnectionTrace]:
+        """
+        按转发器名称查询
+
+        Args:
+            forwarder: 转发器名称或其子串
+
+        Returns:
+            list[ConnectionTrace]: 匹配的记录
+        """
+        return [trace for trace in self.records() if forwarder in trace.forwarder]
+
+    def dump_jsonl(self, fp: IO[str], records: list[ConnectionTrace] = None):
+        """
+        以JSON Lines格式导出记录，时间戳为Unix时间
+
+        Args:
+            fp: 文本文件对象
+            records: 要导出的记录，默认为全部
+        """
+        for trace in self.records() if records is None else records:
+            fp.write(json.dumps(trace.to_dict(self._wall_offset), ensure_ascii=False, default=str))
+            fp.write('\n')
+
+
+default_trace_ring = TraceRing()  # 所有转发器默认共用的缓冲区
@@ -40,9 +40,10 @@ class ResourceAgent:
             self.resource = resource_class(*args, **kwargs)
         else:
             # 为外部资源创建代理类，重写close和shutdown方法为空操作
+            # 以外部资源的实际类型为基类，保留子类重写的行为
             ExternalResource = type(
                 'ExternalResource', 
-                (resource_class,),
+                (type(resource),),
                 {"close": lambda _: None, "shutdown": lambda _: None}
             )
             self.resource = ExternalResource.__new__(ExternalResource)
@@ -61,6 +62,21 @@ class ResourceAgent:
         """
         return self.resource
 
+def format_address(address) -> str:
+    """
+    格式化连接地址
+
+    Args:
+        address: (host, port, ...)形式的地址，或其他任意地址
+
+    Returns:
+        str: host:port 形式的字符串，端口为None时(Unix域套接字)只返回host
+    """
+    if isinstance(address, tuple) and len(address) >= 2:
+        if address[1] is None: return str(address[0])
+        return '%s:%s' % address[:2]
+    return str(address)
+
 def parse_cleartext_payload(data, print_len: int = 16) -> str:
     """
     解析明文或常见协议数据，返回可读的字符串表示
@@ -0,0 +1,9 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'slow: 运行时间较长的浸泡/集成测试，使用 -m "not slow" 跳过')
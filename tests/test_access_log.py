@@ -0,0 +1,204 @@
+import errno
+import io
+import json
+import shutil
+import socket
+import threading
+import time
+from concurrent.futures import Future
+from time import monotonic
+from types import SimpleNamespace
+
+from sshforwarder.fowarder.base import Forwarder
+from sshforwarder.utils import AccessLog, ConnectionTrace
+
+
+class Collector:
+    def __init__(self):
+        self.records = []
+
+    def record(self, trace):
+        self.records.append(trace)
+
+
+def forwarder():
+    f = Forwarder()
+    f.trace_ring = None
+    f.access_log = Collector()
+    return f
+
+
+def reasons(f):
+    return [trace.close_reason for trace in f.access_log.records]
+
+
+def test_pending_paths_are_logged():
+    f = forwarder()
+    f.pending_limit = 1
+    socks = [socket.socketpair() for _ in range(3)]
+    traces = [f._start_trace(('127.0.0.1', port)) for port in range(3)]
+    f._hold(socks[0][0], None, traces[0], deadline=monotonic() - 1)
+    f._hold(socks[1][0], None, traces[1])
+    assert reasons(f) == ['pending_full']
+    f._expire_pending()
+    assert reasons(f) == ['pending_full', 'pending_expired']
+    f._hold(socks[2][0], None, traces[2])
+    f.close()
+    assert reasons(f) == ['pending_full', 'pending_expired', 'forwarder_closed']
+    for a, b in socks: b.close()
+
+
+def test_each_trace_is_logged_once():
+    f = forwarder()
+    trace = f._start_trace('c')
+    f._finish_trace(trace, 'rejected')
+    f._finish_trace(trace, 'forwarder_closed')
+    f._finish_trace(None, 'rejected')
+    assert reasons(f) == ['rejected']
+    f.close()
+
+
+def test_accept_loop_logs_failed_connects():
+    class Failing(Forwarder):
+        def __init__(self):
+            super().__init__()
+            self.accepted = 0
+
+        def _from(self):
+            self.accepted += 1
+            if self.accepted > 2: self.exit_event.set()
+            a, b = socket.socketpair()
+            b.close()
+            return a, ('127.0.0.1', self.accepted)
+
+        def _to(self, f, trace=None):
+            if self.accepted == 1: return None, None
+            raise OSError('refused')
+
+        def _forward_failed(self):
+            pass
+
+    f = Failing()
+    f.trace_ring = None
+    f.access_log = Collector()
+    f.forward()
+    assert reasons(f) == ['rejected', 'connect_failed: OSError', 'connect_failed: OSError']
+    f.close()
+
+
+def test_worker_connect_timeout_is_logged():
+    class Timing(Forwarder):
+        connect_in_worker = True
+
+        def _to(self, f, trace=None):
+            raise TimeoutError()
+
+    f = Timing()
+    f.trace_ring = None
+    f.access_log = Collector()
+    a, b = socket.socketpair()
+    f._connect_handler(a, ('127.0.0.1', 1), f._start_trace(('127.0.0.1', 1)))
+    assert reasons(f) == ['connect_timeout'] and a.fileno() == -1
+    b.close()
+    f.close()
+
+
+def test_format_error_is_counted_and_writer_survives(tmp_path):
+    log = AccessLog(str(tmp_path / 'access.log'), flush_interval=0.01)
+    bad = ConnectionTrace('Local', ('127.0.0.1', 1))
+    bad.destination = ('only-host',)  # '%s:%s' 格式化失败
+    good = ConnectionTrace('Local', ('127.0.0.1', 2))
+    good.close('source_eof')
+    log.record(bad)
+    log.record(good)
+    log.close()
+    lines = (tmp_path / 'access.log').read_text().splitlines()
+    assert log.errors == 1 and log.written == 1
+    assert json.loads(lines[0])['client'] == '127.0.0.1:2'
+
+
+class Reconnecting(Forwarder):
+    """
+    传输通道由测试控制何时就绪的转发器
+    """
+    def __init__(self):
+        super().__init__()
+        self.trace_ring = None
+        self.access_log = Collector()
+        self.future = Future()
+        self.transport_manager = SimpleNamespace(get=lambda config, block=True: self.future)
+        self.connected = []
+        self.done = threading.Event()
+
+    def _to(self, f, trace=None):
+        self.connected.append(f)
+        self.done.set()
+        return None, None
+
+
+def test_held_client_is_replayed_when_transport_comes_up():
+    f = Reconnecting()
+    a, b = socket.socketpair()
+    f._hold(a, ('127.0.0.1', 1), f._start_trace(('127.0.0.1', 1)))
+    f._reconnect('cfg')
+    assert not f.connected
+    f.future.set_result(object())
+    assert f.done.wait(5)
+    assert f.connected == [a] and not f._pending
+    f.close()
+    assert reasons(f) == ['rejected']
+    b.close()
+
+
+def test_replay_after_executor_shutdown_rejects_instead_of_raising():
+    f = Reconnecting()
+    a, b = socket.socketpair()
+    f._hold(a, ('127.0.0.1', 1), f._start_trace(('127.0.0.1', 1)))
+    f.thread_pool_executor.shutdown()  # close()与完成回调竞争
+    f._replay_pending()
+    assert a.fileno() == -1 and reasons(f) == ['forwarder_closed'] and not f.connected
+    f.close()
+    b.close()
+
+
+class FullDisk(io.StringIO):
+    def write(self, data):
+        raise OSError(errno.ENOSPC, 'No space left on device')
+
+
+def test_write_error_drops_the_batch_and_writer_survives(tmp_path):
+    log = AccessLog(str(tmp_path / 'access.log'), flush_interval=0.01)
+    log._fp.close()
+    log._fp = FullDisk()
+    first = ConnectionTrace('Local', ('127.0.0.1', 1))
+    first.close('source_eof')
+    log.record(first)
+    deadline = monotonic() + 5
+    while not log.write_errors and monotonic() < deadline: time.sleep(0.01)
+    assert log.write_errors == 1 and log._writer.is_alive()
+    second = ConnectionTrace('Local', ('127.0.0.1', 2))
+    second.close('source_eof')
+    log.record(second)  # 下一批重新打开文件
+    log.close()
+    lines = (tmp_path / 'access.log').read_text().splitlines()
+    assert log.written == 1 and [json.loads(_)['client'] for _ in lines] == ['127.0.0.1:2']
+
+
+def test_rotate_error_keeps_the_writer_alive(tmp_path):
+    directory = tmp_path / 'logs'
+    directory.mkdir()
+    log = AccessLog(str(directory / 'access.log'), max_bytes=1, flush_interval=0.01)
+    for port in range(2):
+        trace = ConnectionTrace('Local', ('127.0.0.1', port))
+        trace.close('source_eof')
+        log.record(trace)
+        deadline = monotonic() + 5
+        while log.written + log.write_errors <= port and monotonic() < deadline: time.sleep(0.01)
+    shutil.rmtree(directory)  # 目录被删除，轮转失败
+    trace = ConnectionTrace('Local', ('127.0.0.1', 9))
+    trace.close('source_eof')
+    log.record(trace)
+    deadline = monotonic() + 5
+    while not log.write_errors and monotonic() < deadline: time.sleep(0.01)
+    assert log.write_errors == 1 and log._writer.is_alive()
+    log.close()
@@ -0,0 +1,58 @@
+import pytest
+
+from sshforwarder.utils import TrafficCapture, read_capture
+from sshforwarder.utils.capture import UP, DOWN, OPEN, CLOSE, RECORD
+
+
+def capture(tmp_path, **kwargs):
+    return TrafficCapture(str(tmp_path / 'cap.bin'), **kwargs)
+
+
+def test_records_round_trip(tmp_path):
+    cap = capture(tmp_path, capacity=4096, snaplen=8)
+    connection = cap.session('Local', ('127.0.0.1', 5000), ('example', 80))
+    cap.record(connection, UP, b'GET / HTTP/1.1\r\n')
+    cap.record(connection, DOWN, b'ok')
+    cap.end(connection)
+    cap.close()
+    records = list(read_capture(cap.path))
+    assert [r['direction'] for r in records] == [OPEN, UP, DOWN, CLOSE]
+    assert records[0]['meta']['destination'] == ['example', 80]
+    assert records[1]['length'] == 16 and records[1]['payload'] == b'GET / HT'  # 截断到snaplen
+    assert records[2]['payload'] == b'ok'
+
+
+@pytest.mark.parametrize('sizes', [[100], [37, 250, 1, 999, 64], [0, 1000]])
+def test_ring_wrap_keeps_newest_records_in_order(tmp_path, sizes):
+    cap = capture(tmp_path, capacity=4096, snaplen=1024)
+    written = []
+    for i in range(300):
+        payload = bytes([i % 256]) * sizes[i % len(sizes)]
+        cap.record(i, UP, payload)
+        written.append((i, payload))
+        if i % 7 == 0: cap._drain()  # 分多批写入，覆盖不同的回绕位置
+    cap.close()
+    records = list(read_capture(cap.path))
+    assert records, '回绕后应保留最新的记录'
+    # 读出的记录是写入序列的一个后缀，且没有越过数据区
+    assert [(r['connection'], r['payload']) for r in records] == written[-len(records):]
+    assert sum(RECORD.size + len(r['payload']) for r in records) <= cap.capacity
+
+
+def test_full_queue_drops_and_counts(tmp_path):
+    cap = capture(tmp_path, capacity=4096, queue_limit=2)
+    cap._closed.set()  # 停住写线程，队列不再被消费
+    cap._writer.join()
+    for i in range(5):
+        cap.record(1, UP, b'x')
+    assert cap.dropped == 3
+    cap._closed.clear()
+    cap.close()
+
+
+def test_session_filters_destinations(tmp_path):
+    cap = capture(tmp_path, capacity=4096, destinations={'db', ('web', 443)})
+    assert cap.session('Local', None, ('db', 5432)) is not None
+    assert cap.session('Local', None, ('web', 443)) is not None
+    assert cap.session('Local', None, ('web', 80)) is None
+    cap.close()
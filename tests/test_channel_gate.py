@@ -0,0 +1,139 @@
+import gc
+import threading
+import time
+
+from sshforwarder.manager.channel_gate import ChannelGate
+
+
+class FakeTransport:
+    def __init__(self):
+        self.active = True
+        self.unlinked = []
+
+    def is_active(self):
+        return self.active
+
+    def _unlink_channel(self, chanid):
+        self.unlinked.append(chanid)
+
+
+class FakeChannel:
+    def __init__(self, chanid):
+        self.chanid = chanid
+        self.closed = False
+
+    def get_id(self):
+        return self.chanid
+
+
+def open_channel(gate, chanid):
+    assert gate.try_acquire()
+    channel = FakeChannel(chanid)
+    gate.release(channel)
+    return channel
+
+
+def test_max_channels_counts_registered_channels():
+    gate = ChannelGate('t', max_channels=2)
+    transport = FakeTransport()
+    gate.attach(transport)
+    channels = [open_channel(gate, 0), open_channel(gate, 1)]
+    assert not gate.try_acquire()
+    transport._unlink_channel(0)
+    assert transport.unlinked == [0]  # 原始的_unlink_channel仍被调用
+    assert gate.stats()['channels'] == 1 and gate.try_acquire()
+    gate.release()  # 打开失败
+    assert gate.opening == 0 and gate.stats()['channels'] == 1
+    del channels
+
+
+def test_collected_channel_is_forgotten_once():
+    gate = ChannelGate('t', max_channels=1)
+    transport = FakeTransport()
+    gate.attach(transport)
+    channel = open_channel(gate, 7)
+    transport._unlink_channel(7)
+    replacement = open_channel(gate, 7)  # 通道编号被复用
+    del channel
+    gc.collect()
+    assert gate.stats()['channels'] == 1  # 旧通道被回收不影响新通道
+    del replacement
+    gc.collect()
+    assert gate.stats()['channels'] == 0
+
+
+def test_channel_closed_before_release_is_not_counted():
+    gate = ChannelGate('t', max_channels=1)
+    assert gate.try_acquire()
+    channel = FakeChannel(0)
+    channel.closed = True
+    gate.release(channel)
+    assert gate.stats()['channels'] == 0
+
+
+def test_waiter_wakes_on_channel_close_in_fifo_order():
+    gate = ChannelGate('t', max_channels=1)
+    transport = FakeTransport()
+    gate.attach(transport)
+    channel = open_channel(gate, 0)
+    order, held = [], []
+
+    def wait(name):
+        if gate.acquire(transport, 5):
+            order.append(name)
+            held.append(FakeChannel(len(order)))
+            gate.release(held[-1])
+
+    first = threading.Thread(target=wait, args=('first',))
+    first.start()
+    while not gate.stats()['queued']: time.sleep(0.001)
+    second = threading.Thread(target=wait, args=('second',))
+    second.start()
+    while gate.stats()['queued'] < 2: time.sleep(0.001)
+    assert not gate.try_acquire()  # 已有排队者时不插队
+    transport._unlink_channel(0)
+    first.join(1)
+    assert order == ['first']
+    transport._unlink_channel(1)
+    second.join(1)
+    assert order == ['first', 'second'] and gate.stats()['waited'] == 2
+    del channel
+
+
+def test_spill_runs_outside_the_lock_and_retries_on_notify():
+    gate = ChannelGate('t', max_opening=1)
+    transport = FakeTransport()
+    assert gate.try_acquire()
+    attempts = []
+
+    def spill():
+        # 锁外调用：其他线程可以同时进入闸门
+        checker = threading.Thread(target=gate.stats)
+        checker.start()
+        checker.join(1)
+        assert not checker.is_alive()
+        attempts.append(1)
+        if len(attempts) == 1:
+            threading.Timer(0.05, gate.notify).start()  # 分流目标稍后就绪
+            return False
+        return True
+
+    assert gate.acquire(transport, 5, spill)
+    assert len(attempts) == 2 and gate.opening == 1
+
+
+def test_acquire_times_out():
+    gate = ChannelGate('t', max_opening=1)
+    assert gate.try_acquire()
+    assert not gate.acquire(FakeTransport(), 0.05)
+    assert gate.timeouts == 1 and gate.stats()['queued'] == 0
+
+
+def test_retire_only_when_idle_long_enough():
+    gate = ChannelGate('t')
+    channel = open_channel(gate, 0)
+    assert not gate.retire(0)
+    gate.closed(0)
+    assert not gate.retire(60)
+    assert gate.retire(0) and not gate.try_acquire()
+    del channel
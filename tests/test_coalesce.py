@@ -0,0 +1,100 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from sshforwarder.fowarder.base import Forwarder
+
+
+class Idle(Forwarder):
+    def _from(self): raise RuntimeError
+
+
+@pytest.fixture
+def source():
+    writer, f = socket.socketpair()
+    yield writer, f
+    writer.close()
+    f.close()
+
+
+def send_later(writer, data, delay=0.05):
+    timer = threading.Timer(delay, writer.sendall, (data,))
+    timer.start()
+    return timer
+
+
+def make_forwarder(**kwargs):
+    forwarder = Idle()
+    for k, v in kwargs.items(): setattr(forwarder, k, v)
+    return forwarder
+
+
+def test_merges_arrived_data_up_to_the_limit(source):
+    writer, f = source
+    writer.sendall(b'abc')
+    writer.sendall(b'defghij')
+    time.sleep(0.01)
+    forwarder = make_forwarder(coalesce_bytes=8)
+    assert forwarder._coalesce(f, b'0') == b'0abcdefg'
+    assert f.recv(16) == b'hij'  # 超出上限的数据留给下一次写入
+
+
+def test_request_response_does_not_wait(source):
+    writer, f = source
+    late = send_later(writer, b'late')
+    forwarder = make_forwarder(coalesce_bytes=1024, coalesce_delay=1)
+    start = time.monotonic()
+    assert forwarder._coalesce(f, b'request') == b'request'
+    assert time.monotonic() - start < 0.05
+    late.join()
+
+
+def test_streaming_waits_for_following_data(source):
+    writer, f = source
+    send_later(writer, b'-next')
+    forwarder = make_forwarder(coalesce_bytes=1024, coalesce_delay=1)
+    assert forwarder._coalesce(f, b'first', streaming=True) == b'first-next'
+
+
+def test_streaming_wait_is_bounded_by_delay(source):
+    _, f = source
+    forwarder = make_forwarder(coalesce_bytes=1024, coalesce_delay=0.05)
+    start = time.monotonic()
+    assert forwarder._coalesce(f, b'first', streaming=True) == b'first'
+    assert 0.04 <= time.monotonic() - start < 0.5
+
+
+def test_zero_delay_only_merges_arrived_data(source):
+    writer, f = source
+    writer.sendall(b'-now')
+    time.sleep(0.01)
+    late = send_later(writer, b'-late')
+    forwarder = make_forwarder(coalesce_bytes=1024, coalesce_delay=0)
+    assert forwarder._coalesce(f, b'first', streaming=True) == b'first-now'
+    late.join()
+
+
+def test_flush_predicate_stops_merging(source):
+    writer, f = source
+    forwarder = make_forwarder(coalesce_bytes=1024, coalesce_delay=1,
+                               coalesce_flush=lambda chunk: chunk.endswith(b'\n'))
+    writer.sendall(b'b')
+    time.sleep(0.01)
+    assert forwarder._coalesce(f, b'a\n', streaming=True) == b'a\n'
+    writer.sendall(b'\n')
+    time.sleep(0.01)
+    start = time.monotonic()
+    assert forwarder._coalesce(f, b'a', streaming=True) == b'ab\n'
+    assert time.monotonic() - start < 0.5  # 不再等待后续数据
+
+
+def test_source_close_ends_merging(source):
+    writer, f = source
+    writer.sendall(b'-tail')
+    writer.close()
+    forwarder = make_forwarder(coalesce_bytes=1024, coalesce_delay=1)
+    start = time.monotonic()
+    assert forwarder._coalesce(f, b'first', streaming=True) == b'first-tail'
+    assert time.monotonic() - start < 0.5
@@ -0,0 +1,82 @@
+import os
+
+import pytest
+
+from sshforwarder.config import ForwardConfig, SSHConfig
+from sshforwarder.fowarder import LocalForwarder
+from sshforwarder.fowarder.base import Forwarder
+from sshforwarder.manager.base import Manager
+from sshforwarder.utils import CompressionAdvisor
+from sshforwarder.utils.compression_advisor import estimate_compressibility
+
+from test_local_forwarder import GatedTransportManager
+from test_multi_local_forwarder import free_port
+
+TEXT = b'GET /index.html HTTP/1.1\r\nHost: example.com\r\nAccept: text/html\r\n\r\n' * 64
+RANDOM = os.urandom(len(TEXT))
+TEXT_DEST, RANDOM_DEST = ('10.0.0.1', 80), ('10.0.0.2', 443)
+
+
+class TwoTransports:
+    """
+    为默认配置和压缩配置分别提供已就绪的传输通道
+    """
+    def get(self, config=None, block=True):
+        transport = 'compressed' if config.compression is True else 'plain'
+        return transport if block else Manager._resolved(transport)
+
+
+def advised(*samples):
+    advisor = CompressionAdvisor()
+    for destination, data in samples:
+        sampler = advisor.sampler(destination)
+        for i in range(0, len(data), 1000): sampler.feed(data[i:i + 1000])
+        sampler.finish()
+    return advisor
+
+
+def forwarder_with(advisor):
+    forwarder = Forwarder()
+    forwarder.transport_manager = TwoTransports()
+    forwarder.compression_advisor = advisor
+    return forwarder
+
+
+def test_estimate_compressibility():
+    assert estimate_compressibility(TEXT) < 0.1
+    assert estimate_compressibility(RANDOM) > 0.95
+    assert estimate_compressibility(b'') == 1.0
+
+
+def test_samples_pick_the_matching_transport():
+    forwarder = forwarder_with(advised((TEXT_DEST, TEXT), (RANDOM_DEST, RANDOM)))
+    config = SSHConfig('h', 'u', None, compression='adaptive')
+    assert forwarder._placed_transport(config, TEXT_DEST) == 'compressed'
+    assert forwarder._placed_transport(config, RANDOM_DEST) == 'plain'
+    assert forwarder._placed_transport(config, ('10.0.0.3', 22)) == 'plain'  # 尚无样本
+    forwarder.close()
+
+
+def test_small_samples_are_ignored():
+    advisor = advised((TEXT_DEST, TEXT[:100]))
+    assert not advisor.should_compress(TEXT_DEST)
+
+
+@pytest.mark.parametrize('compression, transport', [(True, 'compressed'), (False, 'plain')])
+def test_fixed_compression_bypasses_the_advisor(compression, transport):
+    forwarder = forwarder_with(advised((TEXT_DEST, TEXT), (RANDOM_DEST, RANDOM)))
+    config = SSHConfig('h', 'u', None, compression=compression)
+    assert forwarder._placed_transport(config, TEXT_DEST) == transport
+    assert forwarder._placed_transport(config, RANDOM_DEST) == transport
+    forwarder.close()
+
+
+@pytest.mark.parametrize('compression, advisor', [('adaptive', True), (True, False), (False, False)])
+def test_local_forwarder_only_samples_in_adaptive_mode(compression, advisor):
+    config = ForwardConfig(free_port(), 80, SSHConfig('127.0.0.1', 'u', None, compression=compression),
+                           local_host='127.0.0.1')
+    forwarder = LocalForwarder(config, transport_manager=GatedTransportManager())
+    try:
+        assert (forwarder.compression_advisor is not None) is advisor
+    finally:
+        forwarder.close()
@@ -0,0 +1,124 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+from paramiko import ChannelException
+
+from sshforwarder.fowarder import DynamicForwarder
+from sshforwarder.manager.base import Manager
+from sshforwarder.utils import DestinationCache, destination_cache
+
+DEST = ('10.0.0.1', 443)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def cache_with_clock(monkeypatch, **kwargs):
+    clock = Clock()
+    monkeypatch.setattr(destination_cache, 'monotonic', clock)
+    return DestinationCache(**kwargs), clock
+
+
+def expiry(cache, destination=DEST):
+    return cache._entries[destination][0]
+
+
+def test_concurrent_burst_does_not_escalate(monkeypatch):
+    cache, clock = cache_with_clock(monkeypatch, ttl=5, max_ttl=300)
+    threads = [threading.Thread(target=cache.failed, args=(DEST, 5)) for _ in range(32)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert cache._entries[DEST][1] == 1
+    assert expiry(cache) == clock.now + 5
+
+
+def test_live_entry_refreshes_code_only(monkeypatch):
+    cache, clock = cache_with_clock(monkeypatch, ttl=5)
+    cache.failed(DEST, 5)
+    clock.now += 1
+    cache.failed(DEST, 4)
+    assert cache.get(DEST) == 4
+    assert expiry(cache) == 1005.0
+    assert cache._entries[DEST][1] == 1
+
+
+def test_failed_probe_after_expiry_escalates(monkeypatch):
+    cache, clock = cache_with_clock(monkeypatch, ttl=5, max_ttl=12)
+    cache.failed(DEST, 5)
+    clock.now += 5
+    assert cache.get(DEST) is None  # 过期后放行探测
+    cache.failed(DEST, 5)
+    assert expiry(cache) == clock.now + 10
+    clock.now += 10
+    cache.failed(DEST, 5)
+    assert expiry(cache) == clock.now + 12  # 不超过max_ttl
+
+
+def test_success_clears_and_lru_evicts(monkeypatch):
+    cache, clock = cache_with_clock(monkeypatch, max_entries=2)
+    cache.failed(DEST, 5)
+    cache.succeeded(DEST)
+    assert cache.get(DEST) is None and len(cache) == 0
+    for port in range(3):
+        cache.failed(('h', port), 5)
+    assert len(cache) == 2 and cache.get(('h', 0)) is None
+
+
+def test_failures_age_out_after_a_quiet_period(monkeypatch):
+    cache, clock = cache_with_clock(monkeypatch, ttl=5, max_ttl=300)
+    cache.failed(DEST, 5)
+    clock.now += 5
+    cache.failed(DEST, 5)
+    assert cache._entries[DEST][1] == 2
+    clock.now += 10 + 10  # 过期后又过了一个TTL
+    cache.failed(DEST, 5)
+    assert cache._entries[DEST][1] == 1 and expiry(cache) == clock.now + 5
+
+
+class FakeSource:
+    def getpeername(self):
+        return '127.0.0.1', 1
+
+
+class FakeSocks5:
+    def __init__(self):
+        self.replies = []
+
+    def reply(self, code):
+        self.replies.append(code)
+
+
+def refusing_forwarder(code):
+    class Refusing:
+        def get(self, config=None, block=True):
+            return Manager._resolved(transport)
+
+        def open_channel(self, *args, **kwargs):
+            raise ChannelException(code, 'refused')
+
+    transport = SimpleNamespace(is_active=lambda: True)
+    forwarder = DynamicForwarder.__new__(DynamicForwarder)
+    forwarder.config = SimpleNamespace(ssh_config=SimpleNamespace(compression=False))
+    forwarder.transport_manager = Refusing()
+    forwarder.transport = transport
+    forwarder.compression_advisor = None
+    forwarder.destination_cache = DestinationCache()
+    forwarder._negotiated = {}
+    return forwarder
+
+
+@pytest.mark.parametrize('code, cached', [(1, False), (2, True), (3, False), (4, False)])
+def test_only_destination_failures_are_cached(code, cached):
+    forwarder = refusing_forwarder(code)
+    socks5 = FakeSocks5()
+    source = FakeSource()
+    forwarder._negotiated[source] = (socks5, DEST)
+    assert forwarder._to(source) == (None, DEST)
+    assert socks5.replies == [DynamicForwarder.OPEN_FAILURE_REPLIES[code]]
+    assert (forwarder.destination_cache.get(DEST) is not None) is cached
@@ -0,0 +1,48 @@
+import socket
+
+import paramiko
+import pytest
+
+from sshforwarder.config import FAST_PROFILE, HandshakeProfile
+from sshforwarder.manager import TransportManager
+
+
+@pytest.fixture
+def transport():
+    a, b = socket.socketpair()
+    yield paramiko.Transport(a)
+    a.close()
+    b.close()
+
+
+def apply(transport, profile, key):
+    transport.disabled_algorithms = TransportManager._disabled_algorithms(transport, profile, key)
+    return transport
+
+
+@pytest.mark.parametrize('key, algorithm', [
+    (paramiko.RSAKey.generate(1024), 'rsa-sha2-256'),
+    (paramiko.ECDSAKey.generate(bits=384), 'ecdsa-sha2-nistp384'),
+    (paramiko.ECDSAKey.generate(bits=521), 'ecdsa-sha2-nistp521'),
+])
+def test_fast_profile_keeps_the_key_algorithm(transport, key, algorithm):
+    apply(transport, FAST_PROFILE, key)
+    assert algorithm in transport.preferred_pubkeys
+    assert 'rsa-sha2-512' not in transport.preferred_pubkeys
+
+
+def test_profile_only_narrows_through_disabled_algorithms(transport):
+    defaults = {name: getattr(paramiko.Transport, f'_preferred_{name}') for name in ('kex', 'keys', 'ciphers', 'macs')}
+    apply(transport, FAST_PROFILE, paramiko.RSAKey.generate(1024))
+    assert set(transport.preferred_kex) == set(FAST_PROFILE.kex) & set(defaults['kex'])
+    assert set(transport.preferred_ciphers) == set(FAST_PROFILE.ciphers)
+    assert set(transport.preferred_macs) == set(FAST_PROFILE.digests)
+    assert transport.preferred_keys[:2] == FAST_PROFILE.key_types
+    for name, value in defaults.items():
+        assert getattr(transport, f'_preferred_{name}') == value  # 优先级列表未被改写
+
+
+def test_unsupported_or_unusable_lists_are_ignored(transport):
+    profile = HandshakeProfile(ciphers=('no-such-cipher',), pubkeys=('ssh-ed25519',))
+    disabled = TransportManager._disabled_algorithms(transport, profile, paramiko.RSAKey.generate(1024))
+    assert disabled == {}  # 不支持的加密算法不禁用，RSA私钥不可用的签名算法列表不禁用
@@ -0,0 +1,69 @@
+import socket
+
+import pytest
+
+from sshforwarder.utils import DNSCache, happy_eyeballs_connect
+from sshforwarder.utils.happy_eyeballs import interleave
+
+V6 = socket.AF_INET6
+V4 = socket.AF_INET
+
+
+def addr(family, host):
+    return family, socket.SOCK_STREAM, 6, '', (host, 22)
+
+
+def hosts(addresses):
+    return [a[4][0] for a in addresses]
+
+
+def test_interleave_alternates_starting_with_first_family():
+    addresses = [addr(V6, '::1'), addr(V6, '::2'), addr(V6, '::3'), addr(V4, '1.1.1.1'), addr(V4, '2.2.2.2')]
+    assert hosts(interleave(addresses)) == ['::1', '1.1.1.1', '::2', '2.2.2.2', '::3']
+    addresses = [addr(V4, '1.1.1.1'), addr(V6, '::1'), addr(V6, '::2')]
+    assert hosts(interleave(addresses)) == ['1.1.1.1', '::1', '::2']
+
+
+def test_interleave_single_family_and_empty():
+    addresses = [addr(V4, '1.1.1.1'), addr(V4, '2.2.2.2')]
+    assert interleave(addresses) == addresses
+    assert interleave([]) == []
+
+
+def test_dns_cache_reuses_until_invalidated(monkeypatch):
+    calls = []
+
+    def getaddrinfo(host, port, *args):
+        calls.append(host)
+        return [addr(V4, '127.0.0.1')]
+
+    monkeypatch.setattr(socket, 'getaddrinfo', getaddrinfo)
+    cache = DNSCache(ttl=60)
+    assert cache.resolve('example', 22) == cache.resolve('example', 22)
+    assert calls == ['example']
+    cache.invalidate('example', 22)
+    cache.resolve('example', 22)
+    assert calls == ['example', 'example']
+
+
+def test_connect_skips_refused_address():
+    with socket.socket() as closed:
+        closed.bind(('127.0.0.1', 0))
+        refused = closed.getsockname()
+    listener = socket.create_server(('127.0.0.1', 0))
+    cache = DNSCache()
+    cache._entries[('target', 22)] = (float('inf'), [addr(V4, refused[0])[:4] + (refused,),
+                                                     addr(V4, '127.0.0.1')[:4] + (listener.getsockname(),)])
+    with listener, happy_eyeballs_connect('target', 22, timeout=2, delay=1, resolver=cache) as sock:
+        assert sock.getpeername() == listener.getsockname()
+
+
+def test_connect_all_refused_invalidates_cache():
+    with socket.socket() as closed:
+        closed.bind(('127.0.0.1', 0))
+        refused = closed.getsockname()
+    cache = DNSCache()
+    cache._entries[('target', 22)] = (float('inf'), [addr(V4, refused[0])[:4] + (refused,)])
+    with pytest.raises(OSError):
+        happy_eyeballs_connect('target', 22, timeout=2, resolver=cache)
+    assert ('target', 22) not in cache._entries
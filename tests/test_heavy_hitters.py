@@ -0,0 +1,79 @@
+import random
+import socket
+import threading
+
+from sshforwarder.fowarder.base import Forwarder
+from sshforwarder.utils import CountMinSketch, SpaceSaving, TrafficAnalytics, heavy_hitters
+
+
+def test_count_min_never_underestimates():
+    sketch = CountMinSketch(width=64, depth=4)
+    truth = {}
+    rng = random.Random(1)
+    for _ in range(5000):
+        key = rng.randrange(500)
+        sketch.add(key, 3)
+        truth[key] = truth.get(key, 0) + 3
+    assert sketch.total == 15000
+    assert all(sketch.estimate(key) >= count for key, count in truth.items())
+
+
+def test_space_saving_keeps_heavy_keys_with_error_bound():
+    top = SpaceSaving(k=4)
+    for key, count in [('a', 100), ('b', 50), ('c', 10), ('d', 5)]:
+        top.add(key, count)
+    for i in range(20):
+        top.add(f'noise{i}', 1)
+    items = {key: (count, error) for key, count, error in top.top()}
+    assert list(items)[:2] == ['a', 'b'] and items['a'] == (100, 0)
+    for key, (count, error) in items.items():
+        assert count - error >= 0
+    assert len(top.top(2)) == 2
+
+
+def test_progress_lands_in_the_window_it_flowed(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(heavy_hitters, 'time', lambda: now[0])
+    analytics = TrafficAnalytics(window=10)
+    analytics.add(('10.0.0.1', 5000), ('db', 5432), 300, connections=0)
+    now[0] += 10
+    analytics.add(('10.0.0.1', 5000), ('db', 5432), 200, connections=0)
+    analytics.add(('10.0.0.1', 5000), ('db', 5432), 0)
+    assert analytics.previous['bytes'] == 300 and analytics.previous['connections'] == 0
+    current = analytics.snapshot()
+    assert current['bytes'] == 200 and current['connections'] == 1
+    assert current['clients'] == [('10.0.0.1', 200)]
+
+
+class Recording(Forwarder):
+    progress_bytes = 1000
+
+    def __init__(self):
+        super().__init__()
+        self.progress, self.closed = [], []
+
+    def _connection_progress(self, f_a, t_a, nbytes):
+        self.progress.append(nbytes)
+
+    def _connection_closed(self, f_a, t_a, bytes_up, bytes_down, reason):
+        self.closed.append((bytes_up, bytes_down, reason))
+
+
+def test_relay_loop_reports_progress_before_close():
+    forwarder = Recording()
+    forwarder.trace_ring = None
+    client, f = socket.socketpair()
+    t, server = socket.socketpair()
+    handler = threading.Thread(target=forwarder._connection_handler, args=(f, 'c', t, 's'))
+    handler.start()
+    for _ in range(5):
+        client.sendall(b'x' * 600)
+        received = 0
+        while received < 600: received += len(server.recv(4096))
+    client.close()
+    handler.join(5)
+    assert sum(forwarder.progress) == 3000
+    assert len(forwarder.progress) >= 2  # 转发过程中已分批报告
+    assert forwarder.closed == [(3000, 0, 'source_eof')]
+    server.close()
+    forwarder.close()
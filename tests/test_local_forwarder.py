@@ -0,0 +1,74 @@
+import socket
+import threading
+import time
+
+from sshforwarder.config import ForwardConfig, SSHConfig
+from sshforwarder.fowarder import LocalForwarder
+from sshforwarder.manager import TransportManager
+
+from test_multi_local_forwarder import free_port, recv_exactly, tag_server
+
+
+class FakeTransport:
+    def is_active(self):
+        return True
+
+    def _unlink_channel(self, chanid):
+        pass
+
+    def close(self):
+        pass
+
+
+class SocketChannel(socket.socket):
+    """
+    代替SSH通道的TCP连接，提供闸门登记通道需要的接口
+    """
+    closed = False
+
+    def get_id(self):
+        return self.fileno()
+
+
+class GatedTransportManager(TransportManager):
+    """
+    使用真实通道打开闸门的传输管理器，打开请求在open_resume置位前阻塞
+    """
+    def __init__(self):
+        super().__init__()
+        self.open_resume = threading.Event()
+
+    def _create(self, config=None):
+        return FakeTransport()
+
+    def _open(self, transport, kind, src_addr, dest_addr, timeout):
+        self.open_resume.wait(5)
+        return SocketChannel(fileno=socket.create_connection(dest_addr).detach())
+
+
+def test_full_gate_does_not_block_accepts():
+    target = tag_server(b'A')
+    manager = GatedTransportManager()
+    config = ForwardConfig(free_port(), target.getsockname()[1], SSHConfig('127.0.0.1', 'u', None, max_opening=1),
+                           local_host='127.0.0.1', remote_host='127.0.0.1')
+    forwarder = LocalForwarder(config, transport_manager=manager)
+    forwarder.trace_ring = None
+    thread = threading.Thread(target=forwarder.forward, daemon=True)
+    thread.start()
+    clients = []
+    try:
+        for _ in range(3):
+            clients.append(socket.create_connection(('127.0.0.1', config.local_port), timeout=5))
+        # 第一个打开请求占用名额，另外两个客户端已被接收并在闸门中排队
+        deadline = time.monotonic() + 2
+        while time.monotonic() < deadline and manager.channel_stats().get(str(config.ssh_config), {}).get('queued') != 2:
+            time.sleep(0.01)
+        assert manager.channel_stats()[str(config.ssh_config)]['queued'] == 2
+        manager.open_resume.set()
+        assert [recv_exactly(c, 1) for c in clients] == [b'A'] * 3
+    finally:
+        for c in clients: c.close()
+        manager.open_resume.set()
+        forwarder.close()
+        target.close()
+    thread.join(5)
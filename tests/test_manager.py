@@ -0,0 +1,81 @@
+import threading
+import time
+
+import pytest
+
+from sshforwarder.manager.base import Manager
+
+
+class CountingManager(Manager):
+    def __init__(self, delay=0.1, fail=False):
+        super().__init__()
+        self.delay = delay
+        self.fail = fail
+        self.created = 0
+        self.lock = threading.Lock()
+
+    def _create(self, config=None):
+        with self.lock:
+            self.created += 1
+        time.sleep(self.delay)
+        if self.fail: raise ConnectionError('boom')
+        return object()
+
+    def _validate(self, v):
+        return v is not None
+
+    def _close(self, v):
+        pass
+
+
+def _concurrent(manager, n=16, **kwargs):
+    results, errors = [], []
+    barrier = threading.Barrier(n)
+
+    def run():
+        barrier.wait()
+        try:
+            results.append(manager.get('key', **kwargs))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run) for _ in range(n)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    return results, errors
+
+
+def test_concurrent_get_creates_once():
+    manager = CountingManager()
+    results, errors = _concurrent(manager)
+    assert not errors
+    assert manager.created == 1
+    assert len({id(_) for _ in results}) == 1
+    assert manager.get('key') is results[0]
+
+
+def test_concurrent_get_shares_exception_and_retries():
+    manager = CountingManager(fail=True)
+    results, errors = _concurrent(manager)
+    assert not results and len(errors) == 16
+    assert manager.created == 1
+    manager.fail = False
+    assert manager.get('key') is not None
+    assert manager.created == 2
+
+
+def test_non_blocking_get_returns_shared_future():
+    manager = CountingManager(delay=0.2)
+    first = manager.get('key', block=False)
+    second = manager.get('key', block=False)
+    assert first is second
+    assert not first.done()
+    assert first.result(timeout=2) is manager.get('key')
+    assert manager.created == 1
+    assert manager.get('key', block=False).done()
+
+
+def test_falsy_config_is_not_cached():
+    manager = CountingManager(delay=0)
+    assert manager.get() is not manager.get()
+    assert manager.created == 2
@@ -0,0 +1,43 @@
+import io
+import threading
+
+from sshforwarder.fowarder.base import Forwarder
+from sshforwarder.utils import StackSizeThreadPoolExecutor, connection_memory_estimate
+from sshforwarder.utils import memory
+from sshforwarder.utils.memory import LOW_MEMORY_STACK_SIZE
+
+
+def test_stack_size_is_scoped_to_the_pool():
+    before = threading.stack_size()
+    with StackSizeThreadPoolExecutor(4, stack_size=LOW_MEMORY_STACK_SIZE) as executor:
+        list(executor.map(lambda _: None, range(4)))
+        assert len(executor._threads) > 0
+        # 工作线程创建之后进程全局设置已恢复
+        assert threading.stack_size() == before
+
+
+def test_estimate_follows_configured_stack_size():
+    small = connection_memory_estimate(LOW_MEMORY_STACK_SIZE, samples=16)
+    assert small['stack_reserved'] == LOW_MEMORY_STACK_SIZE
+    assert 0 < small['stack_resident'] <= LOW_MEMORY_STACK_SIZE
+    assert small['sockets'] > 0 and small['state'] > 0
+    assert small['resident_total'] == sum(small[k] for k in
+                                          ('stack_resident', 'state', 'sockets', 'relay_buffer'))
+
+
+def test_forwarder_applies_stack_size_to_its_own_pool():
+    class Idle(Forwarder):
+        def _from(self): raise RuntimeError
+
+    forwarder = Idle()
+    forwarder.stack_size = LOW_MEMORY_STACK_SIZE
+    forwarder.exit_event.set()
+    forwarder.forward()
+    assert forwarder.thread_pool_executor.stack_size == LOW_MEMORY_STACK_SIZE
+    forwarder.close()
+
+
+def test_rss_uses_the_system_page_size(monkeypatch):
+    monkeypatch.setattr(memory, 'open', lambda path: io.StringIO('100 10 5 1 0 20 0\n'), raising=False)
+    monkeypatch.setattr(memory.os, 'sysconf', lambda name: 65536 if name == 'SC_PAGE_SIZE' else 0)
+    assert memory._rss() == 10 * 65536
@@ -0,0 +1,140 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from sshforwarder.config import SSHConfig
+from sshforwarder.fowarder import MultiLocalForwarder
+from sshforwarder.manager.base import Manager
+
+
+class FakeTransport:
+    def is_active(self):
+        return True
+
+
+class FakeTransportManager:
+    """
+    以直连TCP代替SSH通道的传输管理器，记录每次打开的目标地址
+    """
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.transport = FakeTransport()
+        self.opened = []
+
+    def get(self, config=None, block=True):
+        return self.transport if block else Manager._resolved(self.transport)
+
+    def open_channel(self, config, kind, src_addr, dest_addr, timeout=5, transport=None):
+        self.opened.append(dest_addr)
+        if self.delay and len(self.opened) == 1: time.sleep(self.delay)  # 第一个打开请求很慢
+        return socket.create_connection(dest_addr)
+
+    def close(self):
+        pass
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def tag_server(tag: bytes):
+    """
+    先发送自己的标签再回显的目标服务
+    """
+    listener = socket.create_server(('127.0.0.1', 0))
+
+    def serve(conn):
+        with conn:
+            conn.sendall(tag)
+            while data := conn.recv(1024):
+                conn.sendall(data)
+
+    def accept():
+        while True:
+            try:
+                conn, _ = listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=serve, args=(conn,), daemon=True).start()
+
+    threading.Thread(target=accept, daemon=True).start()
+    return listener
+
+
+def recv_exactly(sock, n):
+    data = b''
+    while len(data) < n:
+        chunk = sock.recv(n - len(data))
+        if not chunk: break
+        data += chunk
+    return data
+
+
+@pytest.fixture
+def targets():
+    servers = [tag_server(b'A'), tag_server(b'B')]
+    yield [s.getsockname()[1] for s in servers]
+    for s in servers: s.close()
+
+
+def start(mappings, transport_manager):
+    forwarder = MultiLocalForwarder(SSHConfig('127.0.0.1', 'u', None), mappings, local_host='127.0.0.1',
+                                    transport_manager=transport_manager)
+    forwarder.trace_ring = None
+    thread = threading.Thread(target=forwarder.forward, daemon=True)
+    thread.start()
+    return forwarder, thread
+
+
+def test_each_port_routes_to_its_own_target(targets):
+    local = [free_port(), free_port()]
+    manager = FakeTransportManager()
+    forwarder, thread = start([(local[0], '127.0.0.1', targets[0]), (local[1], '127.0.0.1', targets[1])], manager)
+    try:
+        for port, tag in ((local[1], b'B'), (local[0], b'A'), (local[1], b'B')):
+            with socket.create_connection(('127.0.0.1', port), timeout=5) as c:
+                assert recv_exactly(c, 1) == tag
+                c.sendall(b'ping')
+                assert recv_exactly(c, 4) == b'ping'
+        assert manager.opened == [('127.0.0.1', targets[1]), ('127.0.0.1', targets[0]), ('127.0.0.1', targets[1])]
+    finally:
+        forwarder.close()
+    thread.join(5)
+    assert not thread.is_alive()
+    for port in local:
+        with pytest.raises(OSError):
+            socket.create_connection(('127.0.0.1', port), timeout=1)
+
+
+def test_port_list_forwards_to_the_same_port():
+    forwarder = MultiLocalForwarder(SSHConfig('127.0.0.1', 'u', None), [free_port(), free_port()],
+                                    remote_host='10.0.0.1', local_host='127.0.0.1',
+                                    transport_manager=FakeTransportManager())
+    try:
+        assert forwarder.routes == {port: ('10.0.0.1', port) for port in forwarder.routes}
+        assert len(forwarder.local_sockets) == 2
+    finally:
+        forwarder.close()
+    assert all(s.fileno() == -1 for s in forwarder.local_sockets)
+
+
+def test_slow_open_does_not_block_other_ports(targets):
+    local = [free_port(), free_port()]
+    manager = FakeTransportManager(delay=1)
+    forwarder, thread = start([(local[0], '127.0.0.1', targets[0]), (local[1], '127.0.0.1', targets[1])], manager)
+    try:
+        slow = socket.create_connection(('127.0.0.1', local[0]), timeout=5)
+        while not manager.opened: time.sleep(0.001)
+        start_time = time.monotonic()
+        with socket.create_connection(('127.0.0.1', local[1]), timeout=5) as c:
+            assert recv_exactly(c, 1) == b'B'
+        assert time.monotonic() - start_time < 0.5
+        assert recv_exactly(slow, 1) == b'A'
+        slow.close()
+    finally:
+        forwarder.close()
+    thread.join(5)
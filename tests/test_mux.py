@@ -0,0 +1,138 @@
+import socket
+import threading
+import time
+
+import pytest
+from paramiko import ChannelException
+
+from sshforwarder.config import SSHConfig
+from sshforwarder.manager import MuxServer, MuxTransportManager, TransportManager
+from sshforwarder.manager.mux_manager import MuxTransport
+
+CONFIG = SSHConfig('10.0.0.1', 'u', None)
+REFUSED = ('10.0.0.2', 80)
+
+
+class FakeTransport:
+    """
+    以socketpair代替SSH通道的传输通道：记录远程端口转发的回调和取消请求
+    """
+    def __init__(self):
+        self.active = True
+        self.remote_ends = []
+        self.forwards = {}
+        self.cancelled = []
+
+    def is_active(self):
+        return self.active
+
+    def request_port_forward(self, address, port, handler=None):
+        port = port or 2222
+        self.forwards[port] = handler
+        return port
+
+    def global_request(self, kind, data=None, wait=True):
+        self.cancelled.append((kind, data))
+
+    def close(self):
+        self.active = False
+
+
+class FakeTransportManager(TransportManager):
+    def _create(self, config=None):
+        return FakeTransport()
+
+    def open_channel(self, config, kind, src_addr, dest_addr, timeout=5, transport=None):
+        if dest_addr == REFUSED: raise ChannelException(2, 'Connect failed')
+        channel, remote = socket.socketpair()
+        self.get(config).remote_ends.append((kind, dest_addr, remote))
+        return channel
+
+
+@pytest.fixture
+def mux(tmp_path):
+    manager = FakeTransportManager()
+    server = MuxServer(str(tmp_path / 'mux.sock'), [CONFIG], manager)
+    thread = threading.Thread(target=server.serve, daemon=True)
+    thread.start()
+    yield server, manager
+    server.close()
+    thread.join(5)
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_open_passes_a_connected_socket(mux):
+    server, manager = mux
+    client = MuxTransportManager(server.path)
+    sock = client.open_channel(CONFIG, 'direct-tcpip', ('127.0.0.1', 1), ('10.0.0.3', 443))
+    assert isinstance(sock, socket.socket)  # 通过SCM_RIGHTS收到的套接字
+    kind, dest, remote = manager.get(CONFIG).remote_ends[0]
+    assert (kind, dest) == ('direct-tcpip', ('10.0.0.3', 443))
+    sock.sendall(b'ping')
+    assert remote.recv(4) == b'ping'
+    remote.sendall(b'pong')
+    assert sock.recv(4) == b'pong'
+    # 客户端断开后服务端结束转发并关闭通道
+    sock.close()
+    remote.settimeout(5)
+    assert remote.recv(1) == b''
+    client.close()
+
+
+def test_open_failure_carries_the_channel_error_code(mux):
+    server, _ = mux
+    client = MuxTransportManager(server.path)
+    with pytest.raises(ChannelException) as e:
+        client.open_channel(CONFIG, 'direct-tcpip', ('127.0.0.1', 1), REFUSED)
+    assert e.value.code == 2
+    client.close()
+
+
+def test_unknown_host_is_rejected(mux):
+    server, _ = mux
+    with pytest.raises(ConnectionError):
+        MuxTransport(server.path, SSHConfig('10.9.9.9', 'u', None))
+
+
+def test_remote_forward_delivers_channels_and_cancels(mux):
+    server, manager = mux
+    client = MuxTransport(server.path, CONFIG)
+    received, delivered = [], threading.Event()
+
+    def handler(sock, origin, server_address):
+        received.append((sock, origin, server_address))
+        delivered.set()
+
+    port = client.request_port_forward('127.0.0.1', 0, handler)
+    transport = manager.get(CONFIG)
+    assert port == 2222
+    wait_for(lambda: port in transport.forwards)
+    channel, peer = socket.socketpair()
+    transport.forwards[port](channel, ('10.0.0.5', 5555), ('127.0.0.1', port))
+    assert delivered.wait(5)
+    sock, origin, server_address = received[0]
+    assert origin == ('10.0.0.5', 5555) and server_address == ('127.0.0.1', port)
+    sock.sendall(b'hi')
+    assert peer.recv(2) == b'hi'
+    client.global_request('cancel-tcpip-forward', ('127.0.0.1', port))
+    wait_for(lambda: ('cancel-tcpip-forward', ('127.0.0.1', port)) in transport.cancelled)
+    sock.close()
+    peer.close()
+    client.close()
+
+
+def test_server_shutdown_is_seen_by_clients(mux):
+    server, _ = mux
+    client = MuxTransport(server.path, CONFIG)
+    assert client.is_active()
+    server.close()
+    wait_for(lambda: not client.is_active())
+    with pytest.raises(OSError):
+        MuxTransport(server.path, CONFIG)
+    client.close()
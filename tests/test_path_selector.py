@@ -0,0 +1,73 @@
+import threading
+
+import paramiko
+import pytest
+
+from sshforwarder.config import ForwardConfig, SSHConfig
+from sshforwarder.utils import PathSelector
+
+KEY = paramiko.RSAKey.generate(1024)
+A = SSHConfig('10.0.0.1', 'u', KEY)
+B = SSHConfig('10.0.0.2', 'u', KEY)
+C = SSHConfig('10.0.0.3', 'u', KEY)
+
+
+def test_orders_by_latency_over_weight():
+    selector = PathSelector([A, B, C], [1, 4, 1], explore_every=0)
+    assert selector.order() == [A, B, C]  # 尚无样本时按配置顺序
+    selector.succeeded(A, 0.1)
+    selector.succeeded(B, 0.2)  # 0.2 / 4 = 0.05
+    selector.succeeded(C, 0.3)
+    assert selector.order() == [B, A, C]
+
+
+def test_failed_path_goes_last_until_it_succeeds():
+    selector = PathSelector([A, B], explore_every=0)
+    selector.succeeded(A, 0.01)
+    selector.succeeded(B, 0.5)
+    selector.failed(A)
+    assert selector.order() == [B, A]
+    selector.succeeded(A, 0.01)
+    assert selector.order() == [A, B]
+
+
+def test_explores_least_recently_used_path():
+    selector = PathSelector([A, B], explore_every=4)
+    selector.succeeded(B, 0.5)
+    selector.succeeded(A, 0.01)
+    orders = [selector.order() for _ in range(4)]
+    assert orders[:3] == [[A, B]] * 3
+    assert orders[3] == [B, A]
+
+
+@pytest.mark.parametrize('weights', [[1, 0], [1, -2], [1], [1, 1, 1]])
+def test_invalid_weights_are_rejected(weights):
+    with pytest.raises(ValueError):
+        PathSelector([A, B], weights)
+
+
+def test_selection_counter_is_thread_safe():
+    selector = PathSelector([A, B], explore_every=0)
+    threads = [threading.Thread(target=lambda: [selector.order() for _ in range(2000)]) for _ in range(8)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert selector._selections == 16000
+
+
+def test_forward_config_paths():
+    assert ForwardConfig(1, 2, [A, B]).ssh_paths == [A, B]
+    assert ForwardConfig(1, 2, A, ssh_paths=[A, B]).ssh_config is A
+    assert ForwardConfig(1, 2, None, ssh_paths=[A, B]).ssh_config is A
+    with pytest.raises(ValueError):
+        ForwardConfig(1, 2, B, ssh_paths=[A, B])
+    with pytest.raises(ValueError):
+        ForwardConfig(1, 2, [A, B], ssh_paths=[A])
+    with pytest.raises(ValueError):
+        ForwardConfig(1, 2, [A, B], path_weights=[1])
+
+
+@pytest.mark.parametrize('forwarder', ['DynamicForwarder', 'RemoteForwarder'])
+def test_single_path_forwarders_reject_path_lists(forwarder):
+    import sshforwarder
+    with pytest.raises(ValueError):
+        getattr(sshforwarder, forwarder)(ForwardConfig(1, 2, [A, B]))
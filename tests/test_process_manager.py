@@ -0,0 +1,53 @@
+import logging
+import socket
+import time
+
+import paramiko
+
+from sshforwarder.config import ForwardConfig, SSHConfig
+from sshforwarder.fowarder import LocalForwarder
+from sshforwarder.manager import ProcessForwarderManager
+from sshforwarder.manager.process_manager import ForwarderSpec
+
+KEY = paramiko.RSAKey.generate(1024)
+
+
+def test_handoff_drops_instead_of_blocking_when_worker_is_stuck():
+    manager = ProcessForwarderManager(workers=1)
+    parent, child = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    parent.setblocking(False)
+    manager._channels[0] = parent
+    results = []
+    start = time.monotonic()
+    try:
+        for _ in range(10000):
+            a, b = socket.socketpair()
+            results.append(manager._handoff(0, 0, a))
+            b.close()
+            if not results[-1]: break
+    finally:
+        parent.close()
+        child.close()
+    assert time.monotonic() - start < 5
+    assert results[0] and results[-1] is False
+    assert manager.dropped == 1
+
+
+def test_host_placement_skips_and_warns_about_idle_workers(caplog):
+    manager = ProcessForwarderManager(workers=8, placement='host')
+    for ip in ('10.0.0.1', '10.0.0.2'):
+        config = ForwardConfig(0, 22, SSHConfig(ip, 'u', KEY))
+        manager._specs.append(ForwarderSpec(LocalForwarder, config, socket.socket()))
+    spawned = []
+    manager._spawn = spawned.append
+    with caplog.at_level(logging.WARNING):
+        manager.start()
+    assert spawned == sorted(manager._assigned_workers())
+    assert 1 <= len(spawned) <= 2
+    assert '没有分配到SSH主机' in caplog.text
+    for spec in manager._specs: spec.listener.close()
+
+
+def test_hash_placement_uses_all_workers():
+    manager = ProcessForwarderManager(workers=4, placement='hash')
+    assert manager._assigned_workers() == {0, 1, 2, 3}
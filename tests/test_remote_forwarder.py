@@ -0,0 +1,160 @@
+import logging
+import socket
+import threading
+import time
+from types import SimpleNamespace
+
+from sshforwarder.config import UpstreamConfig
+from sshforwarder.fowarder import RemoteForwarder
+from sshforwarder.manager import UpstreamPool, SocketManager
+from sshforwarder.manager.dispatcher_manager import RemoteForwardDispatcher
+
+
+class FakeDispatcher:
+    def __init__(self):
+        self.transport = object()
+        self.registered = []
+        self.calls = 0
+
+    def register(self, address, port):
+        self.calls += 1
+        time.sleep(0.05)
+        if self.registered: raise OSError('端口已被占用')
+        self.registered.append(port)
+        return port, object()
+
+
+def test_concurrent_forward_failed_registers_once():
+    new = FakeDispatcher()
+    forwarder = RemoteForwarder.__new__(RemoteForwarder)
+    forwarder.config = SimpleNamespace(ssh_config='cfg', remote_host='localhost', remote_port=8080)
+    forwarder.logger = logging.getLogger('test')
+    forwarder.transport_manager = SimpleNamespace(dispatcher_manager=SimpleNamespace(get=lambda config: new))
+    forwarder.dispatcher = FakeDispatcher()
+    forwarder._rebind_lock = threading.Lock()
+
+    threads = [threading.Thread(target=forwarder._forward_failed) for _ in range(8)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert new.calls == 1 and new.registered == [8080]
+    assert forwarder.remote_port == 8080
+    assert forwarder.dispatcher is new
+
+
+def test_expired_idle_connections_are_pruned_and_topped_up():
+    listener = socket.create_server(('127.0.0.1', 0))
+    address = listener.getsockname()
+    pool = UpstreamPool(UpstreamConfig([address], idle_timeout=30), SocketManager())
+    try:
+        upstream = pool.upstreams[0]
+        expired = [socket.socket() for _ in range(2)]
+        fresh = socket.socket()
+        now = time.monotonic()
+        upstream.idle.extend([(expired[0], now - 60), (expired[1], now - 31), (fresh, now)])
+        pool._prune_idle(upstream)
+        assert [sock for sock, _ in upstream.idle] == [fresh]
+        assert all(sock.fileno() == -1 for sock in expired)
+    finally:
+        pool.close()
+        listener.close()
+
+
+def test_idle_connections_are_handed_out_once_under_concurrent_pruning():
+    listener = socket.create_server(('127.0.0.1', 0), backlog=256)
+    address = listener.getsockname()
+    pool = UpstreamPool(UpstreamConfig([address], idle_timeout=30), SocketManager())
+    upstream = pool.upstreams[0]
+    now = time.monotonic()
+    fresh = [socket.create_connection(address) for _ in range(64)]
+    upstream.idle.extend((sock, now) for sock in fresh)
+    acquired, stop = [], threading.Event()
+
+    def prune():
+        while not stop.is_set(): pool._prune_idle(upstream)
+
+    def acquire():
+        for _ in range(8): acquired.append(pool._pop_idle(upstream))
+
+    pruner = threading.Thread(target=prune)
+    pruner.start()
+    workers = [threading.Thread(target=acquire) for _ in range(8)]
+    try:
+        for t in workers: t.start()
+        for t in workers: t.join()
+    finally:
+        stop.set()
+        pruner.join()
+        pool.close()
+        listener.close()
+    # 每个空闲连接只交给一个使用者，且都未被健康检查关闭
+    assert sorted(map(id, acquired)) == sorted(map(id, fresh))
+    assert all(sock.fileno() != -1 for sock in acquired)
+    for sock in fresh: sock.close()
+
+
+class FakeTransport:
+    def __init__(self):
+        self.next_port = 40000
+        self.handlers = []
+        self.requests = []
+
+    def is_active(self):
+        return True
+
+    def request_port_forward(self, address, port, handler=None):
+        self.handlers.append(handler)
+        if port == 0:
+            port, self.next_port = self.next_port, self.next_port + 1
+        return port
+
+    def global_request(self, kind, data=None, wait=True):
+        self.requests.append((kind, data))
+
+
+class FakeChannel:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_dispatcher_routes_each_channel_to_its_own_forward():
+    transport = FakeTransport()
+    dispatcher = RemoteForwardDispatcher(transport)
+    _, first = dispatcher.register('127.0.0.1', 8080)
+    _, second = dispatcher.register('127.0.0.1', 9090)
+    assigned, third = dispatcher.register('127.0.0.1', 0)
+    _, unix = dispatcher.register('/run/app.sock', None)
+    assert assigned == 40000
+    # 所有转发共用同一个回调，按绑定端口(或套接字路径)区分
+    assert len({id(h.__self__) for h in transport.handlers}) == 1
+    channels = [FakeChannel() for _ in range(4)]
+    handler = transport.handlers[-1]
+    handler(channels[0], ('10.0.0.1', 1), ('127.0.0.1', 9090))
+    handler(channels[1], ('10.0.0.2', 2), ('127.0.0.1', 8080))
+    handler(channels[2], ('10.0.0.3', 3), ('127.0.0.1', 40000))
+    handler(channels[3], '', ('/run/app.sock', None))
+    assert first.get_nowait() == (channels[1], ('10.0.0.2', 2))
+    assert second.get_nowait() == (channels[0], ('10.0.0.1', 1))
+    assert third.get_nowait() == (channels[2], ('10.0.0.3', 3))
+    assert unix.get_nowait() == (channels[3], '')
+    assert not any(c.closed for c in channels)
+
+
+def test_dispatcher_unregister_only_cancels_its_own_forward():
+    transport = FakeTransport()
+    dispatcher = RemoteForwardDispatcher(transport)
+    _, first = dispatcher.register('127.0.0.1', 8080)
+    _, second = dispatcher.register('127.0.0.1', 9090)
+    dispatcher.unregister('127.0.0.1', 8080)
+    assert first.get_nowait() is None  # 唤醒该转发器
+    assert transport.requests == [('cancel-tcpip-forward', ('127.0.0.1', 8080))]
+    late, kept = FakeChannel(), FakeChannel()
+    transport.handlers[0](late, ('10.0.0.1', 1), ('127.0.0.1', 8080))
+    transport.handlers[0](kept, ('10.0.0.2', 2), ('127.0.0.1', 9090))
+    assert late.closed and not kept.closed
+    assert second.get_nowait() == (kept, ('10.0.0.2', 2))
+    assert dispatcher.has_routes()
+    dispatcher.unregister('127.0.0.1', 9090)
+    assert not dispatcher.has_routes()
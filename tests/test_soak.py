@@ -0,0 +1,43 @@
+import importlib.util
+import os
+
+import pytest
+
+from conftest import ROOT
+
+_spec = importlib.util.spec_from_file_location('soak_dynamic_forwarder',
+                                               os.path.join(ROOT, 'examples', 'soak_dynamic_forwarder.py'))
+soak = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(soak)
+
+
+def metrics(threads, rss_kib=1000):
+    return {'threads': threads, 'rss_kib': rss_kib}
+
+
+def test_final_over_limit_is_a_leak():
+    failed = soak.find_leaks(metrics(10), [metrics(10)], metrics(40), tolerance=0.2, slack=16)
+    assert len(failed) == 1 and failed[0].startswith('threads')
+
+
+def test_steady_growth_within_limit_is_a_leak():
+    # 最终值仍在容差内，但每个检查点都在上涨
+    samples = [metrics(10 + i) for i in range(1, 12)]
+    failed = soak.find_leaks(metrics(10), samples, metrics(23), tolerance=0.2, slack=16)
+    assert len(failed) == 1 and 'checkpoint' in failed[0]
+
+
+def test_single_spike_is_not_a_leak():
+    samples = [metrics(10), metrics(10), metrics(25), metrics(10), metrics(11), metrics(10)]
+    assert soak.find_leaks(metrics(10), samples, metrics(11), tolerance=0.2, slack=16) == []
+
+
+def test_checkpoints_take_segment_medians():
+    assert soak.checkpoints([1, 9, 2, 3, 8, 4, 5, 7], 4) == [9, 3, 8, 7]
+    assert soak.checkpoints([1, 2], 4) == [1, 2]
+
+
+@pytest.mark.slow
+def test_soak_dynamic_forwarder_does_not_leak():
+    baseline, samples, final = soak.run_soak(3000, 16, warmup=0.2, sample_interval=0.5, settle=2, verbose=False)
+    assert soak.find_leaks(baseline, samples, final, tolerance=0.5, slack=16) == []
@@ -0,0 +1,174 @@
+import gc
+import socket
+import threading
+import weakref
+
+import paramiko
+import pytest
+from paramiko.common import MSG_CHANNEL_OPEN, cMSG_CHANNEL_OPEN
+from paramiko.message import Message
+
+from sshforwarder.manager.dispatcher_manager import RemoteForwardDispatcher
+from sshforwarder.utils import (unix_path, format_address, open_streamlocal_channel, request_streamlocal_forward,
+                                cancel_streamlocal_forward)
+from sshforwarder.utils.streamlocal import FORWARDED_STREAMLOCAL, _handlers
+
+HOST_KEY = paramiko.RSAKey.generate(1024)
+
+
+class StubServer(paramiko.ServerInterface):
+    """
+    替身服务器：记录direct-streamlocal的目标路径和streamlocal全局请求
+    """
+    def __init__(self, accept=True):
+        self.accept = accept
+        self.opened = []
+        self.requests = []
+
+    def get_allowed_auths(self, username):
+        return 'none'
+
+    def check_auth_none(self, username):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'direct-streamlocal@openssh.com' and self.accept:
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_CONNECT_FAILED
+
+    def check_global_request(self, kind, m):
+        self.requests.append((kind, m.get_text()))
+        return self.accept
+
+
+def record_streamlocal_path(transport, server):
+    # paramiko不把通道打开请求的附加字段交给ServerInterface，这里在服务器端截取
+    original = transport._handler_table[MSG_CHANNEL_OPEN]
+
+    def parse(m):
+        if m.get_text() == 'direct-streamlocal@openssh.com':
+            m.get_int(), m.get_int(), m.get_int()
+            server.opened.append(m.get_text())
+        m.rewind()
+        original(m)
+
+    transport._handler_table[MSG_CHANNEL_OPEN] = parse
+
+
+@pytest.fixture
+def pair(request):
+    server = StubServer(getattr(request, 'param', True))
+    a, b = socket.socketpair()
+    server_transport = paramiko.Transport(b)
+    server_transport.add_server_key(HOST_KEY)
+    record_streamlocal_path(server_transport, server)
+    threading.Thread(target=server_transport.start_server, kwargs={'server': server}, daemon=True).start()
+    client = paramiko.Transport(a)
+    client.start_client(timeout=5)
+    client.auth_none('u')
+    yield client, server_transport, server
+    client.close()
+    server_transport.close()
+
+
+def open_forwarded(transport, path) -> paramiko.Channel | None:
+    """
+    服务器端打开forwarded-streamlocal@openssh.com通道，被拒绝时返回None
+    """
+    with transport.lock:
+        chanid = transport._next_channel()
+        m = Message()
+        m.add_byte(cMSG_CHANNEL_OPEN)
+        m.add_string(FORWARDED_STREAMLOCAL)
+        m.add_int(chanid)
+        m.add_int(transport.default_window_size)
+        m.add_int(transport.default_max_packet_size)
+        m.add_string(path)
+        m.add_string('')
+        chan = paramiko.Channel(chanid)
+        transport._channels.put(chanid, chan)
+        event = transport.channel_events[chanid] = threading.Event()
+        transport.channels_seen[chanid] = True
+        chan._set_transport(transport)
+        chan._set_window(transport.default_window_size, transport.default_max_packet_size)
+    transport._send_user_message(m)
+    event.wait(5)
+    return transport._channels.get(chanid)
+
+
+def test_unix_path_and_format_address():
+    assert unix_path('/run/app.sock', None) == '/run/app.sock'
+    assert unix_path('localhost', None) is None
+    assert unix_path('/run/app.sock', 22) is None
+    assert format_address(('/run/app.sock', None)) == '/run/app.sock'
+    assert format_address(('127.0.0.1', 22)) == '127.0.0.1:22'
+
+
+def test_direct_streamlocal_open_success(pair):
+    client, server_transport, server = pair
+    chan = open_streamlocal_channel(client, '/run/app.sock', timeout=5)
+    peer = server_transport.accept(5)
+    assert server.opened == ['/run/app.sock']
+    peer.sendall(b'hello')
+    assert chan.recv(5) == b'hello'
+    chan.close()
+
+
+@pytest.mark.parametrize('pair', [False], indirect=True)
+def test_direct_streamlocal_open_failure(pair):
+    client, _, server = pair
+    with pytest.raises(paramiko.ChannelException):
+        open_streamlocal_channel(client, '/run/missing.sock', timeout=5)
+    assert server.opened == ['/run/missing.sock']
+
+
+def test_streamlocal_forward_dispatch_and_cancel(pair):
+    client, server_transport, server = pair
+    received = []
+    handled = threading.Event()
+
+    def handler(chan, origin, destination):
+        received.append((chan, origin, destination))  # 持有通道，paramiko只弱引用通道
+        chan.sendall(b'pong')
+        handled.set()
+
+    request_streamlocal_forward(client, '/run/remote.sock', handler)
+    assert server.requests == [('streamlocal-forward@openssh.com', '/run/remote.sock')]
+    peer = open_forwarded(server_transport, '/run/remote.sock')
+    assert peer is not None and handled.wait(5)
+    assert [r[1:] for r in received] == [('', ('/run/remote.sock', None))]
+    assert peer.recv(4) == b'pong'
+    assert open_forwarded(server_transport, '/run/unknown.sock') is None  # 未登记的路径被拒绝
+
+    cancel_streamlocal_forward(client, '/run/remote.sock')
+    assert server.requests[-1] == ('cancel-streamlocal-forward@openssh.com', '/run/remote.sock')
+    assert open_forwarded(server_transport, '/run/remote.sock') is None
+
+
+@pytest.mark.parametrize('pair', [False], indirect=True)
+def test_rejected_forward_is_unregistered(pair):
+    client, _, _ = pair
+    with pytest.raises(paramiko.SSHException):
+        request_streamlocal_forward(client, '/run/remote.sock', lambda *args: None)
+    assert '/run/remote.sock' not in _handlers(client)
+
+
+def test_transport_with_streamlocal_forward_is_collectable():
+    server = StubServer()
+    a, b = socket.socketpair()
+    server_transport = paramiko.Transport(b)
+    server_transport.add_server_key(HOST_KEY)
+    threading.Thread(target=server_transport.start_server, kwargs={'server': server}, daemon=True).start()
+    client = paramiko.Transport(a)
+    client.start_client(timeout=5)
+    client.auth_none('u')
+    dispatcher = RemoteForwardDispatcher(client)  # 回调经由分发器引用传输通道
+    dispatcher.register('/run/remote.sock', None)
+    ref = weakref.ref(client)
+    client.close()
+    server_transport.close()
+    client.join(5)
+    server_transport.join(5)
+    del client, dispatcher, server_transport
+    gc.collect()
+    assert ref() is None
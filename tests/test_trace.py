@@ -0,0 +1,81 @@
+import io
+import json
+
+import pytest
+
+from sshforwarder.utils import trace as trace_module
+from sshforwarder.utils.trace import TraceRing
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(trace_module, 'monotonic', clock)
+    return clock
+
+
+def connection(ring, clock, forwarder, destination, open_delay, client=('127.0.0.1', 5000)):
+    trace = ring.start(forwarder, client)
+    trace.destination = destination
+    trace.open_requested = clock.now
+    trace.open_confirmed = clock.now + open_delay
+    clock.now += 1
+    return trace
+
+
+def test_slowest_orders_by_phase_duration(clock):
+    ring = TraceRing(8)
+    fast = connection(ring, clock, 'Local', ('10.0.0.1', 80), 0.1)
+    slow = connection(ring, clock, 'Local', ('10.0.0.2', 80), 2.0)
+    middle = connection(ring, clock, 'Local', ('10.0.0.3', 80), 0.5)
+    pending = ring.start('Local', ('127.0.0.1', 1))  # 通道尚未建立，没有耗时
+    assert ring.slowest() == [slow, middle, fast]
+    assert ring.slowest(2) == [slow, middle]
+    assert pending not in ring.slowest(10, 'open_confirmed', 'open_requested')
+
+
+def test_grouping_by_destination_and_forwarder(clock):
+    ring = TraceRing(8)
+    a = connection(ring, clock, 'LocalForwarder[:8080]', ('10.0.0.1', 80), 0.1)
+    b = connection(ring, clock, 'DynamicForwarder[:1080]', ('10.0.0.1', 443), 0.1)
+    c = connection(ring, clock, 'DynamicForwarder[:1080]', ('10.0.0.2', 443), 0.1)
+    assert ring.by_destination(('10.0.0.1', 80)) == [a]
+    assert ring.by_destination('10.0.0.1') == [a, b]  # 只给出host
+    assert ring.by_forwarder('DynamicForwarder') == [b, c]
+    assert ring.by_forwarder(':8080') == [a]
+
+
+def test_ring_overwrites_the_oldest_records(clock):
+    ring = TraceRing(3)
+    traces = [connection(ring, clock, 'Local', ('10.0.0.1', port), 0.1) for port in range(5)]
+    assert ring.records() == traces[2:]
+
+
+def test_dump_jsonl_round_trip(clock):
+    ring = TraceRing(4)
+    trace = connection(ring, clock, 'Local', ('10.0.0.1', 80), 0.25)
+    trace.bytes_up, trace.bytes_down = 10, 20
+    trace.close('source_eof')
+    open_trace = connection(ring, clock, 'Local', ('10.0.0.2', 80), 0.5)
+    fp = io.StringIO()
+    ring.dump_jsonl(fp)
+    lines = fp.getvalue().splitlines()
+    assert len(lines) == 2
+    first = json.loads(lines[0])
+    assert first['client'] == '127.0.0.1:5000' and first['destination'] == '10.0.0.1:80'
+    assert first['close_reason'] == 'source_eof' and (first['bytes_up'], first['bytes_down']) == (10, 20)
+    assert first['open_confirmed'] - first['open_requested'] == pytest.approx(0.25)
+    assert first['accepted'] == pytest.approx(trace.accepted + ring._wall_offset)  # Unix时间
+    assert first['negotiated'] is None
+    assert json.loads(lines[1])['closed'] is None
+    fp = io.StringIO()
+    ring.dump_jsonl(fp, [open_trace])
+    assert json.loads(fp.getvalue())['destination'] == '10.0.0.2:80'
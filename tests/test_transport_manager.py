@@ -0,0 +1,211 @@
+import socket
+import threading
+
+import paramiko
+import pytest
+
+from sshforwarder.config import SSHConfig
+from sshforwarder.manager import TransportManager, transport_manager
+from sshforwarder.manager.dispatcher_manager import RemoteForwardDispatcher
+
+
+class FakeTransport:
+    def __init__(self):
+        self.active = True
+        self._channels = {}
+
+    def is_active(self):
+        return self.active
+
+    def close(self):
+        self.active = False
+
+
+class FakeTransportManager(TransportManager):
+    def __init__(self):
+        super().__init__()
+        self.opened = []
+        self.open_started = threading.Event()
+        self.open_resume = threading.Event()
+        self.open_resume.set()
+        self.exit_event.set()  # 测试中手动调用回收检查，回收线程启动后立即退出
+
+    def _create(self, config=None):
+        return FakeTransport()
+
+    def _open(self, transport, kind, src_addr, dest_addr, timeout):
+        self.open_started.set()
+        self.open_resume.wait(5)
+        self.opened.append(transport)
+        return object()
+
+
+def make_config(**kwargs):
+    return SSHConfig('127.0.0.1', 'u', None, **kwargs)
+
+
+def test_idle_time_is_tracked_per_opened_transport():
+    manager = FakeTransportManager()
+    config = make_config(compression='adaptive', idle_timeout=0)
+    compressed = manager.get(config.compressed())
+    base = manager.get(config)
+    manager._last_used[base] = manager._last_used[compressed] = 0
+    manager.open_channel(config, 'direct-tcpip', ('127.0.0.1', 1), ('127.0.0.1', 2), transport=compressed)
+    assert manager.opened == [compressed]
+    assert manager._last_used[compressed] > 0 and manager._last_used[base] == 0
+
+
+def test_reaper_does_not_release_a_transport_being_opened():
+    manager = FakeTransportManager()
+    config = make_config(idle_timeout=0)
+    transport = manager.get(config)
+    manager.open_resume.clear()
+    thread = threading.Thread(target=manager.open_channel,
+                              args=(config, 'direct-tcpip', ('127.0.0.1', 1), ('127.0.0.1', 2)))
+    thread.start()
+    assert manager.open_started.wait(5)
+    assert not manager._release(config, transport, 'test', manager._idle)
+    manager.open_resume.set()
+    thread.join(5)
+    assert manager._release(config, transport, 'test', manager._idle)
+    assert not transport.is_active() and manager.released == 1
+
+
+def test_released_transport_is_not_reused():
+    manager = FakeTransportManager()
+    config = make_config(idle_timeout=0)
+    stale = manager.get(config)
+    assert manager._release(config, stale, 'test', manager._idle)
+    # 调用者在释放前选定了该传输通道
+    manager.open_channel(config, 'direct-tcpip', ('127.0.0.1', 1), ('127.0.0.1', 2), transport=stale)
+    assert manager.opened == [manager.get(config)] and manager.opened[0] is not stale
+
+
+def test_remote_forward_keeps_transport_in_use():
+    manager = FakeTransportManager()
+    config = make_config(idle_timeout=0)
+    transport = manager.get(config)
+    dispatcher = manager.dispatcher_manager.get(config)
+    assert isinstance(dispatcher, RemoteForwardDispatcher) and not dispatcher.has_routes()
+    dispatcher._routes[8080] = object()
+    assert manager.dispatcher_manager.has_routes(config, transport)
+    assert not manager.dispatcher_manager.has_routes(config, FakeTransport())
+    assert not manager._release(config, transport, 'test', manager._idle)
+
+
+HOST_KEY = paramiko.RSAKey.generate(1024)
+CLIENT_KEY = paramiko.RSAKey.generate(1024)
+
+
+class StubServer(paramiko.ServerInterface):
+    """
+    替身SSH服务器：accept为False时拒绝公钥认证，jump为True时把direct-tcpip通道当作下一跳
+    """
+    def __init__(self, accept=True, jump=None):
+        self.accept = accept
+        self.jump = jump
+
+    def get_allowed_auths(self, username):
+        return 'publickey'
+
+    def check_auth_publickey(self, username, key):
+        return paramiko.AUTH_SUCCESSFUL if self.accept else paramiko.AUTH_FAILED
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED if self.jump else paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_direct_tcpip_request(self, chanid, origin, destination):
+        return paramiko.OPEN_SUCCEEDED if self.jump else paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+
+def serve(sock, server, transports):
+    transport = paramiko.Transport(sock)
+    transports.append(transport)
+    transport.add_server_key(HOST_KEY)
+    try:
+        transport.start_server(server=server)
+    except (paramiko.SSHException, EOFError, OSError):
+        return  # 客户端提前断开
+    if server.jump is not None:
+        channel = transport.accept(5)
+        if channel is not None: serve(channel, server.jump, transports)
+
+
+@pytest.fixture
+def ssh_server():
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen()
+    servers, transports = [], []
+
+    def accept():
+        while True:
+            try:
+                sock, _ = listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=serve, args=(sock, servers[0], transports), daemon=True).start()
+
+    threading.Thread(target=accept, daemon=True).start()
+    yield listener.getsockname()[1], servers
+    listener.close()
+    for t in transports: t.close()
+
+
+class RecordingTransport(paramiko.Transport):
+    created = []
+
+    def __init__(self, sock, *args, **kwargs):
+        super().__init__(sock, *args, **kwargs)
+        self.created.append(self)
+
+
+def create_once(port, monkeypatch, hops=1):
+    RecordingTransport.created = []
+    monkeypatch.setattr(transport_manager, 'Transport', RecordingTransport)
+    manager = TransportManager()
+    original = RecordingTransport.auth_publickey
+
+    def auth_publickey(self, *args, **kwargs):
+        try:
+            return original(self, *args, **kwargs)
+        except paramiko.AuthenticationException:
+            manager.exit_event.set()  # 只尝试一次
+            raise
+
+    monkeypatch.setattr(RecordingTransport, 'auth_publickey', auth_publickey)
+    jump = [('127.0.0.1', 'u', CLIENT_KEY, None, port)] * (hops - 1)
+    config = SSHConfig('127.0.0.1', 'u', CLIENT_KEY, jump or None, port)
+    assert manager._create(config) is None
+    return RecordingTransport.created
+
+
+def test_failed_auth_closes_the_transport_and_socket(ssh_server, monkeypatch):
+    port, servers = ssh_server
+    servers.append(StubServer(accept=False))
+    created = create_once(port, monkeypatch)
+    assert len(created) == 1
+    transport = created[0]
+    transport.join(5)
+    assert not transport.is_active() and not transport.is_alive()
+    assert transport.sock.fileno() == -1
+
+
+def test_failed_later_hop_closes_the_authenticated_jump(ssh_server, monkeypatch):
+    port, servers = ssh_server
+    servers.append(StubServer(jump=StubServer(accept=False)))
+    created = create_once(port, monkeypatch, hops=2)
+    assert len(created) == 2
+    jump, target = created
+    for transport in created: transport.join(5)
+    assert not jump.is_active() and not target.is_active()
+    assert jump.sock.fileno() == -1 and target.sock.closed
+
+
+def test_failed_key_exchange_closes_the_socket():
+    manager = TransportManager()
+    a, b = socket.socketpair()
+    b.close()  # 对端立即断开，密钥交换失败
+    with pytest.raises((paramiko.SSHException, EOFError)):
+        manager._handshake(a, SSHConfig('127.0.0.1', 'u', CLIENT_KEY), False)
+    assert a.fileno() == -1